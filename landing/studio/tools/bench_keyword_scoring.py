@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+Benchmark: keyword scoring and near-duplicate grouping on synthetic keywords.
+
+Builds N keywords per run from the LANGUAGE_CONFIG word lists (seeds,
+question prefixes, high-intent words, shuffled word order, so many are
+near-duplicates of each other) and times:
+
+- the previous per-keyword scorer (word lists lower-cased on every call,
+  a generator per list), kept here for comparison
+- score_all with the per-language KeywordMatcher
+- group_near_duplicates (MinHash LSH over word sets)
+
+Scores of both scorers are checked to be identical.
+
+Usage (from landing/studio/tools/):
+  python bench_keyword_scoring.py
+  python bench_keyword_scoring.py --keywords 300000 --similarity 0.6
+"""
+
+import argparse
+import random
+import time
+
+from keyword_research import (
+    DEFAULT_SIMILARITY,
+    LANGUAGE_CONFIG,
+    KeywordResult,
+    group_near_duplicates,
+    score_all,
+)
+
+SOURCES = ["suggest", "suggest+prefix", "suggest+alphabet", "suggest+expand"]
+
+
+def score_keyword_previous(kw: KeywordResult, config: dict) -> float:
+    """score_keyword before KeywordMatcher."""
+    score = 0.0
+    text = kw.keyword.lower()
+
+    wc = kw.word_count
+    if 4 <= wc <= 8:
+        score += 3.0
+    elif 3 <= wc <= 10:
+        score += 1.5
+    elif wc < 3:
+        score += 0.5
+
+    question_words = config["question_prefixes"]
+    if any(text.startswith(q.lower()) for q in question_words):
+        score += 2.0
+        kw.intent_type = "question"
+    elif any(q.lower() in text for q in question_words):
+        score += 1.0
+
+    high_intent = config["high_intent_words"]
+    matches = sum(1 for w in high_intent if w.lower() in text)
+    score += min(matches * 1.0, 3.0)
+
+    if wc >= 5:
+        score += 0.5
+
+    if kw.source == "suggest+prefix":
+        score += 0.5
+
+    return round(min(score, 10.0), 1)
+
+
+def synthetic_keywords(count: int, rng: random.Random) -> list[KeywordResult]:
+    langs = list(LANGUAGE_CONFIG)
+    results = []
+    for _ in range(count):
+        lang = rng.choice(langs)
+        config = LANGUAGE_CONFIG[lang]
+        seed = rng.choice(rng.choice(list(config["seed_keywords"].values())))
+        words = seed.split()
+        words += rng.sample(config["high_intent_words"], rng.randint(0, 2))
+        if rng.random() < 0.3:
+            rng.shuffle(words)
+        if rng.random() < 0.4:
+            words.insert(0, rng.choice(config["question_prefixes"]))
+        keyword = " ".join(words)
+        results.append(
+            KeywordResult(
+                keyword=keyword,
+                lang=lang,
+                country=config["country_code"],
+                source=rng.choice(SOURCES),
+                seed=seed,
+                word_count=len(keyword.split()),
+            )
+        )
+    return results
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Keyword scoring / near-duplicate benchmark")
+    parser.add_argument("--keywords", type=int, default=100_000, help="Synthetic keywords")
+    parser.add_argument("--similarity", type=float, default=DEFAULT_SIMILARITY)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    keywords = synthetic_keywords(args.keywords, random.Random(args.seed))
+    print(f"{len(keywords)} synthetic keywords, {len({k.keyword for k in keywords})} distinct")
+
+    def previous(results):
+        for kw in results:
+            kw.score = score_keyword_previous(kw, LANGUAGE_CONFIG.get(kw.lang, LANGUAGE_CONFIG["EN"]))
+        results.sort(key=lambda k: (-k.score, k.lang, k.keyword))
+        return [(k.keyword, k.score, k.intent_type) for k in results]
+
+    expected, previous_s = timed(previous, [KeywordResult(**vars(k)) for k in keywords])
+    scored, batch_s = timed(score_all, keywords)
+    assert [(k.keyword, k.score, k.intent_type) for k in scored] == expected, "scores differ"
+    variants, group_s = timed(group_near_duplicates, scored, args.similarity)
+
+    print(f"{'Stage':<28}  {'seconds':>8}  {'keywords/s':>11}")
+    for name, seconds in (
+        ("score (previous)", previous_s),
+        ("score_all (KeywordMatcher)", batch_s),
+        (f"near-duplicates @ {args.similarity}", group_s),
+    ):
+        print(f"{name:<28}  {seconds:>8.3f}  {len(keywords) / seconds:>11.0f}")
+    print(f"{variants} variants, {len(keywords) - variants} group heads")
+
+
+if __name__ == "__main__":
+    main()
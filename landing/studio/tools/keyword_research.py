@@ -8,16 +8,49 @@ Usage:
   python keyword_research.py --lang ALL --output json
   python keyword_research.py --lang EN,DE,PL --min-score 3
   python keyword_research.py --lang ALL --cluster back-pain --output both
+  python keyword_research.py --lang ALL --rate 4 --concurrency 8
+  python keyword_research.py --lang ALL --suggest-url http://127.0.0.1:8765/complete/search
+  python keyword_research.py --lang ALL --cluster eye-strain --offline
+  python keyword_research.py --lang PL --depth 3 --alphabet --budget 1500
+  python keyword_research.py --lang ALL --cluster back-pain,eye-strain --resume
+
+Every (language, cluster) pair runs as its own pipeline, all at once; their
+queries share one worker pool and one token-bucket rate limit, which halves
+on HTTP 429 and recovers gradually.
+Test runs can point --suggest-url at suggest_stub.py instead of Google.
+
+Responses are cached in keyword_cache.db for --cache-ttl hours (default a
+week), so re-runs only fetch new or expired queries; --offline uses the
+cache alone.
+
+--depth 2+ feeds the suggestions back in as queries, breadth-first, never
+repeating a query, best-scoring branches first within each level, until
+--budget queries per language and cluster have been spent.
+
+Keywords with nearly the same words ("back pain desk job" / "desk job back
+pain") are marked variant_of the best-scoring one; --drop-variants keeps
+only that one.
+
+Each finished pipeline is appended to keywords_output.jsonl (and .csv) and
+recorded in keywords_output.checkpoint.jsonl; after a crash, --resume skips
+the recorded pipelines. At the end the JSONL is merged into
+keywords_output.json / .csv in score order.
 """
 
 import argparse
 import asyncio
 import csv
+import hashlib
 import json
 import logging
+import os
 import random
+import re
+import sqlite3
+import struct
 import sys
 import time
+from contextlib import contextmanager
 from dataclasses import dataclass, field, asdict
 from pathlib import Path
 
@@ -40,6 +73,8 @@ logging.basicConfig(
     ],
 )
 log = logging.getLogger("kw-research")
+# One line per request would bury the progress log
+logging.getLogger("httpx").setLevel(logging.WARNING)
 
 # ─── User-Agent rotation ───
 
@@ -196,25 +231,49 @@ class KeywordResult:
     keyword: str
     lang: str
     country: str
-    source: str  # "suggest" | "suggest+prefix"
+    source: str  # "suggest" | "suggest+prefix" | "suggest+alphabet" | "suggest+expand"
     seed: str
     score: float = 0.0
     intent_type: str = "informational"
     word_count: int = 0
+    variant_of: str = ""  # best-scoring keyword of its near-duplicate group
 
 
 # ─── Google Suggest scraper ───
 
+SUGGEST_URL = "https://suggestqueries.google.com/complete/search"
+
+# A query is retried this many times on 429 / network errors before it is dropped
+MAX_ATTEMPTS = 5
+
+
+class RateLimited(Exception):
+    """HTTP 429 from the suggest endpoint."""
+
+    def __init__(self, retry_after: float | None):
+        super().__init__(f"rate limited (Retry-After: {retry_after})")
+        self.retry_after = retry_after
+
+
+def _retry_after(resp: httpx.Response) -> float | None:
+    try:
+        return float(resp.headers.get("Retry-After", ""))
+    except ValueError:
+        return None
+
 
 async def fetch_suggestions(
     client: httpx.AsyncClient,
     query: str,
     lang_code: str,
     country_code: str,
-    retries: int = 3,
+    url: str = SUGGEST_URL,
 ) -> list[str]:
-    """Fetch Google Suggest completions for a query."""
-    url = "https://suggestqueries.google.com/complete/search"
+    """Fetch Google Suggest completions for a query.
+
+    Raises RateLimited on 429 and httpx/JSON errors as they are; retries and
+    backoff are up to the Scheduler.
+    """
     params = {
         "q": query,
         "hl": lang_code,
@@ -222,211 +281,893 @@ async def fetch_suggestions(
         "client": "firefox",
     }
     headers = {"User-Agent": random.choice(USER_AGENTS)}
+    resp = await client.get(url, params=params, headers=headers, timeout=10)
+    if resp.status_code == 429:
+        raise RateLimited(_retry_after(resp))
+    resp.raise_for_status()
+    data = resp.json()
+    # Response format: [query, [suggestions], ...]
+    if isinstance(data, list) and len(data) >= 2 and isinstance(data[1], list):
+        return [s for s in data[1] if isinstance(s, str) and s.strip()]
+    return []
 
-    for attempt in range(1, retries + 1):
-        try:
-            resp = await client.get(url, params=params, headers=headers, timeout=10)
-            if resp.status_code == 429:
-                wait = 2 ** attempt + random.uniform(0, 1)
-                log.warning(f"Rate limited, waiting {wait:.1f}s (attempt {attempt})")
-                await asyncio.sleep(wait)
+
+@dataclass
+class Query:
+    lang: str
+    seed: str  # the seed keyword this query descends from
+    text: str
+    source: str
+    depth: int = 1
+    attempts: int = 0
+    failed: bool = False  # gave up after MAX_ATTEMPTS or an unexpected error
+
+
+# Letters appended to seeds by --alphabet ("seed a", "seed b", ...)
+LATIN_ALPHABET = "abcdefghijklmnopqrstuvwxyz"
+ALPHABETS = {
+    "RU": "абвгдежзиклмнопрстуфхцчшэюя",
+    "JA": "あかさたなはまやらわ",
+    "KO": "ㄱㄴㄷㄹㅁㅂㅅㅇㅈㅊㅋㅌㅍㅎ",
+    "ZH": "",
+}
+
+
+def normalize(text: str) -> str:
+    """Frontier key: case- and whitespace-insensitive."""
+    return " ".join(text.lower().split())
+
+
+def build_queries(langs: list[str], cluster: str, alphabet: bool = False) -> list[Query]:
+    """Every (lang, seed, prefix) query, in the order results are merged."""
+    queries: list[Query] = []
+    for lang_key in langs:
+        config = LANGUAGE_CONFIG.get(lang_key)
+        if not config:
+            log.warning(f"Unknown language: {lang_key}, skipping")
+            continue
+        seeds = config["seed_keywords"].get(cluster, [])
+        if not seeds:
+            log.warning(f"[{lang_key}] No seed keywords for cluster '{cluster}'")
+            continue
+        prefixes = config["question_prefixes"]
+        letters = ALPHABETS.get(lang_key, LATIN_ALPHABET) if alphabet else ""
+        variants = 1 + len(prefixes) + len(letters)
+        log.info(f"[{lang_key}] {len(seeds)} seeds × {variants} variants = {len(seeds) * variants} queries")
+        for seed in seeds:
+            queries.append(Query(lang_key, seed, seed, "suggest"))
+            queries.extend(Query(lang_key, seed, f"{prefix} {seed}", "suggest+prefix") for prefix in prefixes)
+            queries.extend(Query(lang_key, seed, f"{seed} {letter}", "suggest+alphabet") for letter in letters)
+    return queries
+
+
+def expand_queries(
+    parents: list[Query], suggestions: list[list[str]], frontier: set[tuple[str, str]]
+) -> list[Query]:
+    """Next breadth-first level: suggestions not queried yet, best-scoring first.
+
+    ``frontier`` holds the (lang, normalized text) of every query so far and
+    is updated with the returned ones. score_keyword is the heuristic, so
+    when the budget cuts a level short, the weakest branches are dropped.
+    """
+    scored: list[tuple[float, Query]] = []
+    for parent, found in zip(parents, suggestions):
+        config = LANGUAGE_CONFIG[parent.lang]
+        for kw in found:
+            key = (parent.lang, normalize(kw))
+            if key in frontier or len(key[1]) < 3:
                 continue
-            resp.raise_for_status()
-            data = resp.json()
-            # Response format: [query, [suggestions], ...]
-            if isinstance(data, list) and len(data) >= 2:
-                return [s for s in data[1] if isinstance(s, str) and s.strip()]
-            return []
-        except (httpx.HTTPError, json.JSONDecodeError) as e:
-            if attempt < retries:
-                wait = 2 ** attempt + random.uniform(0, 1)
-                log.warning(f"Error fetching '{query}': {e}, retry in {wait:.1f}s")
-                await asyncio.sleep(wait)
-            else:
-                log.error(f"Failed after {retries} attempts: '{query}': {e}")
-                return []
+            frontier.add(key)
+            child = Query(parent.lang, parent.seed, kw.strip(), "suggest+expand", parent.depth + 1)
+            estimate = KeywordResult(
+                keyword=child.text,
+                lang=child.lang,
+                country=config["country_code"],
+                source=child.source,
+                seed=child.seed,
+                word_count=len(child.text.split()),
+            )
+            scored.append((score_keyword(estimate, config), child))
+    # Stable sort: ties keep the (deterministic) order they were found in
+    scored.sort(key=lambda item: -item[0])
+    return [child for _, child in scored]
+
+
+class TokenBucket:
+    """Request rate limiter shared by all workers, with AIMD adaptation.
+
+    Tokens refill at ``rate`` per second up to ``burst``. A 429 halves the
+    rate (down to ``min_rate``) and pauses everyone for Retry-After; every
+    success adds back a small step, up to the configured ``max_rate``.
+    429s for requests sent before the last cut belong to the same burst and
+    do not cut again, so a full pool of workers hitting the limit together
+    halves the rate once rather than once per worker.
+    """
+
+    def __init__(self, rate: float, burst: float = 1.0, min_rate: float = 0.1):
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._last_cut = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self) -> float:
+        """Wait for a token; returns when it was granted (for slow_down)."""
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return now
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def slow_down(self, retry_after: float | None, sent_at: float):
+        if sent_at < self._last_cut:
+            return
+        now = time.monotonic()
+        self._last_cut = now
+        self._refill(now)
+        self.rate = max(self.rate / 2, self.min_rate)
+        self._tokens = 0
+        pause = retry_after if retry_after is not None else 1 / self.rate
+        self._paused_until = max(self._paused_until, now + pause)
+
+    def speed_up(self):
+        if self.rate < self.max_rate:
+            self._refill(time.monotonic())
+            self.rate = min(self.rate + self.max_rate / 50, self.max_rate)
+
+
+class Progress:
+    """Periodic progress log: done/total, throughput, ETA, 429s and errors.
+
+    ``total`` grows as pipelines schedule further depths, so the ETA covers
+    the queries known so far.
+    """
+
+    def __init__(self, total: int, bucket: TokenBucket, interval: float = 5.0):
+        self.total = total
+        self.done = 0
+        self.rate_limited = 0
+        self.failed = 0
+        self._bucket = bucket
+        self._interval = interval
+        self._start = time.monotonic()
+        self._last_log = self._start
+
+    def update(self):
+        self.done += 1
+        now = time.monotonic()
+        if self.done == self.total or now - self._last_log >= self._interval:
+            self._last_log = now
+            self.log(now)
+
+    def log(self, now: float):
+        elapsed = now - self._start
+        throughput = self.done / elapsed if elapsed else 0.0
+        eta = (self.total - self.done) / throughput if throughput else 0.0
+        log.info(
+            f"Progress: {self.done}/{self.total} ({self.done / self.total:.0%}), "
+            f"{throughput:.2f} q/s, ETA {int(eta // 60)}:{int(eta % 60):02d}, "
+            f"limit {self._bucket.rate:.2f} req/s, 429s {self.rate_limited}, failed {self.failed}"
+        )
 
-    return []
 
+class Scheduler:
+    """One worker pool and token bucket shared by all (language, cluster) pipelines.
+
+    Pipelines await fetch() concurrently; their queries are interleaved in a
+    single queue served by ``concurrency`` workers. Fetched responses are
+    stored in ``cache`` as they arrive, so an interrupted run keeps what it
+    already got.
+    """
+
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        rate: float,
+        concurrency: int,
+        url: str = SUGGEST_URL,
+        cache: "SuggestionCache | None" = None,
+    ):
+        self.client = client
+        self.bucket = TokenBucket(rate)
+        self.progress = Progress(0, self.bucket)
+        self.concurrency = max(concurrency, 1)
+        self.url = url
+        self.cache = cache
+        self._pending: asyncio.Queue = asyncio.Queue()
+        self._workers: list[asyncio.Task] = []
+
+    async def __aenter__(self):
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        return self
+
+    async def __aexit__(self, *exc_info):
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+
+    async def fetch(self, queries: list[Query]) -> list[list[str]]:
+        """Suggestions per query, in order; a query that still fails after
+        MAX_ATTEMPTS contributes an empty list and is marked ``failed``."""
+        loop = asyncio.get_running_loop()
+        futures = [loop.create_future() for _ in queries]
+        self.progress.total += len(queries)
+        for item in zip(queries, futures):
+            self._pending.put_nowait(item)
+        return list(await asyncio.gather(*futures))
+
+    async def _worker(self):
+        bucket, progress = self.bucket, self.progress
+        while True:
+            query, future = await self._pending.get()
+            config = LANGUAGE_CONFIG[query.lang]
+            sent_at = await bucket.acquire()
+            try:
+                found = await fetch_suggestions(
+                    self.client, query.text, config["lang_code"], config["country_code"], self.url
+                )
+            except (RateLimited, httpx.HTTPError, json.JSONDecodeError) as e:
+                query.attempts += 1
+                if isinstance(e, RateLimited):
+                    progress.rate_limited += 1
+                    bucket.slow_down(e.retry_after, sent_at)
+                    log.warning(f"Rate limited, limit now {bucket.rate:.2f} req/s")
+                if query.attempts < MAX_ATTEMPTS:
+                    if not isinstance(e, RateLimited):
+                        log.warning(f"Error fetching '{query.text}': {e}, will retry")
+                    self._pending.put_nowait((query, future))
+                else:
+                    log.error(f"Failed after {MAX_ATTEMPTS} attempts: '{query.text}': {e}")
+                    self._fail(query, future)
+                continue
+            except Exception:
+                # Anything else would kill the worker and leave fetch() waiting
+                log.exception(f"Unexpected error fetching '{query.text}'")
+                self._fail(query, future)
+                continue
+
+            bucket.speed_up()
+            if self.cache:
+                try:
+                    self.cache.put(query.text, config["lang_code"], config["country_code"], found)
+                except sqlite3.Error as e:
+                    log.warning(f"Could not cache '{query.text}': {e}")
+            self._resolve(future, found)
 
-async def scrape_language(
-    client: httpx.AsyncClient,
-    lang_key: str,
-    config: dict,
-    cluster: str,
-    delay: float = 1.5,
-) -> list[KeywordResult]:
-    """Scrape all suggestions for one language."""
-    seeds = config["seed_keywords"].get(cluster, [])
-    if not seeds:
-        log.warning(f"[{lang_key}] No seed keywords for cluster '{cluster}'")
-        return []
-
-    lang_code = config["lang_code"]
-    country_code = config["country_code"]
-    prefixes = config["question_prefixes"]
-    results: list[KeywordResult] = []
-    seen: set[str] = set()
+    def _fail(self, query: Query, future: asyncio.Future):
+        query.failed = True
+        self.progress.failed += 1
+        self._resolve(future, [])
 
-    def add_result(kw: str, source: str, seed: str):
-        key = kw.lower().strip()
-        if key in seen or len(key) < 3:
-            return
-        seen.add(key)
-        results.append(
-            KeywordResult(
-                keyword=kw.strip(),
-                lang=lang_key,
-                country=country_code,
-                source=source,
-                seed=seed,
-                word_count=len(kw.split()),
+    def _resolve(self, future: asyncio.Future, found: list[str]):
+        self.progress.update()
+        # The pipeline awaiting it may have been cancelled
+        if not future.done():
+            future.set_result(found)
+
+
+def collect_results(queries: list[Query], suggestions: list[list[str]]) -> list[KeywordResult]:
+    """Unique keywords per language, first occurrence in query order wins."""
+    results: list[KeywordResult] = []
+    seen: set[tuple[str, str]] = set()
+    for query, found in zip(queries, suggestions):
+        country_code = LANGUAGE_CONFIG[query.lang]["country_code"]
+        for kw in found:
+            key = kw.lower().strip()
+            if (query.lang, key) in seen or len(key) < 3:
+                continue
+            seen.add((query.lang, key))
+            results.append(
+                KeywordResult(
+                    keyword=kw.strip(),
+                    lang=query.lang,
+                    country=country_code,
+                    source=query.source,
+                    seed=query.seed,
+                    word_count=len(kw.split()),
+                )
             )
+    return results
+
+
+# ─── Suggestion cache ───
+
+CACHE_FILE = Path(__file__).parent / "keyword_cache.db"
+DEFAULT_CACHE_TTL_HOURS = 7 * 24
+
+
+def cache_key(query: str, lang_code: str, country_code: str) -> str:
+    return hashlib.sha256(f"{query}\0{lang_code}\0{country_code}".encode()).hexdigest()
+
+
+class SuggestionCache:
+    """Suggest responses on disk (SQLite), keyed by hash of (query, hl, gl).
+
+    Entries older than the TTL are misses and get overwritten when the
+    query is fetched again; an empty suggestion list is cached too.
+    """
+
+    def __init__(self, path: Path, ttl_hours: float):
+        self.path = path
+        self.ttl = ttl_hours * 3600
+        self.hits = 0
+        self.misses = 0
+        self._db = sqlite3.connect(path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS suggestions ("
+            "key TEXT PRIMARY KEY, query TEXT NOT NULL, hl TEXT NOT NULL, gl TEXT NOT NULL, "
+            "suggestions TEXT NOT NULL, fetched_at REAL NOT NULL)"
+        )
+        self._db.commit()
+
+    def get(self, query: str, lang_code: str, country_code: str) -> list[str] | None:
+        row = self._db.execute(
+            "SELECT suggestions FROM suggestions WHERE key = ? AND fetched_at >= ?",
+            (cache_key(query, lang_code, country_code), time.time() - self.ttl),
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, query: str, lang_code: str, country_code: str, suggestions: list[str]):
+        self._db.execute(
+            "INSERT OR REPLACE INTO suggestions VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                cache_key(query, lang_code, country_code),
+                query,
+                lang_code,
+                country_code,
+                json.dumps(suggestions, ensure_ascii=False),
+                time.time(),
+            ),
         )
+        self._db.commit()
 
-    total_queries = len(seeds) + len(seeds) * len(prefixes)
-    log.info(f"[{lang_key}] Starting: {len(seeds)} seeds × {len(prefixes)+1} variants = ~{total_queries} queries")
-
-    for seed in seeds:
-        # Direct seed query
-        suggestions = await fetch_suggestions(client, seed, lang_code, country_code)
-        for s in suggestions:
-            add_result(s, "suggest", seed)
-        await asyncio.sleep(delay + random.uniform(0, 0.5))
-
-        # Prefix-expanded queries (question words)
-        for prefix in prefixes:
-            query = f"{prefix} {seed}"
-            suggestions = await fetch_suggestions(client, query, lang_code, country_code)
-            for s in suggestions:
-                add_result(s, "suggest+prefix", seed)
-            await asyncio.sleep(delay + random.uniform(0, 0.5))
-
-    log.info(f"[{lang_key}] Collected {len(results)} unique keywords")
-    return results
+    def close(self):
+        self._db.close()
 
 
 # ─── Scoring ───
 
 
+class KeywordMatcher:
+    """A language's scoring word lists, lower-cased once.
+
+    Tuples let str.startswith / str.__contains__ do the matching in C
+    instead of a generator per keyword.
+    """
+
+    def __init__(self, config: dict):
+        self.question_prefixes = tuple(q.lower() for q in config["question_prefixes"])
+        self.high_intent = tuple(w.lower() for w in config["high_intent_words"])
+
+    def score(self, kw: KeywordResult) -> float:
+        """Score a keyword 0-10 based on relevance signals."""
+        score = 0.0
+        text = kw.keyword.lower()
+
+        # Word count: prefer 4-8 words (long-tail sweet spot)
+        wc = kw.word_count
+        if 4 <= wc <= 8:
+            score += 3.0
+        elif 3 <= wc <= 10:
+            score += 1.5
+        elif wc < 3:
+            score += 0.5
+
+        # Question word bonus
+        if text.startswith(self.question_prefixes):
+            score += 2.0
+            kw.intent_type = "question"
+        elif any(map(text.__contains__, self.question_prefixes)):
+            score += 1.0
+
+        # High-intent words
+        matches = sum(map(text.__contains__, self.high_intent))
+        score += min(matches * 1.0, 3.0)
+
+        # Bonus for longer, more specific phrases
+        if wc >= 5:
+            score += 0.5
+
+        # Prefix-expanded source is slightly more targeted
+        if kw.source == "suggest+prefix":
+            score += 0.5
+
+        return round(min(score, 10.0), 1)
+
+
+_matchers: dict[int, tuple[dict, KeywordMatcher]] = {}
+
+
+def matcher_for(config: dict) -> KeywordMatcher:
+    cached = _matchers.get(id(config))
+    if cached is None or cached[0] is not config:
+        cached = _matchers[id(config)] = (config, KeywordMatcher(config))
+    return cached[1]
+
+
 def score_keyword(kw: KeywordResult, config: dict) -> float:
     """Score a keyword 0-10 based on relevance signals."""
-    score = 0.0
-    text = kw.keyword.lower()
-
-    # Word count: prefer 4-8 words (long-tail sweet spot)
-    wc = kw.word_count
-    if 4 <= wc <= 8:
-        score += 3.0
-    elif 3 <= wc <= 10:
-        score += 1.5
-    elif wc < 3:
-        score += 0.5
-
-    # Question word bonus
-    question_words = config["question_prefixes"]
-    if any(text.startswith(q.lower()) for q in question_words):
-        score += 2.0
-        kw.intent_type = "question"
-    elif any(q.lower() in text for q in question_words):
-        score += 1.0
-
-    # High-intent words
-    high_intent = config["high_intent_words"]
-    matches = sum(1 for w in high_intent if w.lower() in text)
-    score += min(matches * 1.0, 3.0)
-
-    # Bonus for longer, more specific phrases
-    if wc >= 5:
-        score += 0.5
-
-    # Prefix-expanded source is slightly more targeted
-    if kw.source == "suggest+prefix":
-        score += 0.5
-
-    return round(min(score, 10.0), 1)
+    return matcher_for(config).score(kw)
 
 
 def score_all(results: list[KeywordResult]) -> list[KeywordResult]:
     """Score and sort all keywords."""
+    matchers: dict[str, KeywordMatcher] = {}
     for kw in results:
-        config = LANGUAGE_CONFIG.get(kw.lang, LANGUAGE_CONFIG["EN"])
-        kw.score = score_keyword(kw, config)
+        matcher = matchers.get(kw.lang)
+        if matcher is None:
+            matcher = matchers[kw.lang] = matcher_for(LANGUAGE_CONFIG.get(kw.lang, LANGUAGE_CONFIG["EN"]))
+        kw.score = matcher.score(kw)
     results.sort(key=lambda k: (-k.score, k.lang, k.keyword))
     return results
 
 
+# ─── Near-duplicate grouping ───
+
+# Jaccard similarity of word sets at which two keywords are variants
+DEFAULT_SIMILARITY = 0.75
+
+# MinHash signature of BANDS × ROWS 16-bit values (one blake2b digest per
+# word); keywords sharing all ROWS values of any band are compared exactly
+MINHASH_BANDS = 8
+MINHASH_ROWS = 2
+
+_TOKEN_RE = re.compile(r"\w+")
+_SIGNATURE = struct.Struct(f"<{MINHASH_BANDS * MINHASH_ROWS}H")
+
+
+def _tokens(keyword: str) -> frozenset[str]:
+    return frozenset(_TOKEN_RE.findall(keyword.lower()))
+
+
+def group_near_duplicates(results: list[KeywordResult], similarity: float = DEFAULT_SIMILARITY) -> int:
+    """Mark keywords that are word-level variants of a better one.
+
+    "back pain desk job" and "desk job back pain" share every word, so
+    the later one gets ``variant_of`` = the earlier one. ``results`` must
+    already be in score order (score_all): each keyword is compared, via
+    MinHash LSH buckets, only with the group heads before it, so the head
+    is the best-scoring keyword of its group. Returns the number of variants.
+    """
+    word_hashes: dict[str, tuple[int, ...]] = {}
+    heads: list[tuple[KeywordResult, frozenset[str]]] = []
+    buckets: dict[tuple, list[int]] = {}
+    # Same language and word set (e.g. reordered words): same head, no search
+    exact: dict[tuple[str, frozenset[str]], KeywordResult] = {}
+    variants = 0
+    for kw in results:
+        kw.variant_of = ""
+        tokens = _tokens(kw.keyword)
+        if not tokens:
+            continue
+        head = exact.get((kw.lang, tokens))
+        if head:
+            kw.variant_of = head.keyword
+            variants += 1
+            continue
+        hashes = []
+        for token in tokens:
+            h = word_hashes.get(token)
+            if h is None:
+                digest = hashlib.blake2b(token.encode(), digest_size=_SIGNATURE.size).digest()
+                h = word_hashes[token] = _SIGNATURE.unpack(digest)
+            hashes.append(h)
+        signature = tuple(map(min, *hashes)) if len(hashes) > 1 else hashes[0]
+        keys = [
+            (kw.lang, band, signature[band * MINHASH_ROWS:(band + 1) * MINHASH_ROWS])
+            for band in range(MINHASH_BANDS)
+        ]
+
+        # |a & b| / |a | b| >= similarity needs the sizes within that ratio too
+        size = len(tokens)
+        min_size, max_size = size * similarity, size / similarity
+        head = None
+        checked: set[int] = set()
+        for key in keys:
+            for index in buckets.get(key, ()):
+                if index in checked:
+                    continue
+                checked.add(index)
+                candidate, candidate_tokens = heads[index]
+                if not min_size <= len(candidate_tokens) <= max_size:
+                    continue
+                if len(tokens & candidate_tokens) >= similarity * len(tokens | candidate_tokens):
+                    head = candidate
+                    break
+            if head:
+                break
+
+        if head:
+            kw.variant_of = head.keyword
+            variants += 1
+            exact[kw.lang, tokens] = head
+        else:
+            for key in keys:
+                buckets.setdefault(key, []).append(len(heads))
+            heads.append((kw, tokens))
+            exact[kw.lang, tokens] = kw
+    return variants
+
+
 # ─── Output ───
 
 OUTPUT_DIR = Path(__file__).parent
+JSON_FILE = "keywords_output.json"
+CSV_FILE = "keywords_output.csv"
+# Written while the run goes; JSON_FILE is merged from it at the end
+JSONL_FILE = "keywords_output.jsonl"
+CHECKPOINT_FILE = "keywords_output.checkpoint.jsonl"
+
+CSV_COLUMNS = ["keyword", "lang", "country", "score", "intent_type", "word_count", "source", "seed", "variant_of"]
+
 
+def _csv_row(r: KeywordResult) -> list:
+    return [r.keyword, r.lang, r.country, r.score, r.intent_type, r.word_count, r.source, r.seed, r.variant_of]
 
-def write_json(results: list[KeywordResult], filename: str = "keywords_output.json"):
+
+def write_json(results: list[KeywordResult], filename: str = JSON_FILE):
+    """Same document as json.dumps(..., indent=2), written one keyword at a time."""
     path = OUTPUT_DIR / filename
-    data = {
+    head = {
         "generated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
         "total_keywords": len(results),
-        "languages": list(set(r.lang for r in results)),
-        "keywords": [asdict(r) for r in results],
+        "languages": sorted(set(r.lang for r in results)),
     }
-    path.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding="utf-8")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(json.dumps(head, ensure_ascii=False, indent=2)[:-2])  # up to the closing "\n}"
+        f.write(',\n  "keywords": [')
+        for i, r in enumerate(results):
+            f.write(",\n    " if i else "\n    ")
+            f.write(json.dumps(asdict(r), ensure_ascii=False, indent=2).replace("\n", "\n    "))
+        f.write("\n  ]\n}" if results else "]\n}")
     log.info(f"JSON saved: {path} ({len(results)} keywords)")
 
 
-def write_csv(results: list[KeywordResult], filename: str = "keywords_output.csv"):
+def write_csv(results: list[KeywordResult], filename: str = CSV_FILE):
     path = OUTPUT_DIR / filename
     with open(path, "w", newline="", encoding="utf-8-sig") as f:
         writer = csv.writer(f)
-        writer.writerow(["keyword", "lang", "country", "score", "intent_type", "word_count", "source", "seed"])
+        writer.writerow(CSV_COLUMNS)
         for r in results:
-            writer.writerow([r.keyword, r.lang, r.country, r.score, r.intent_type, r.word_count, r.source, r.seed])
+            writer.writerow(_csv_row(r))
     log.info(f"CSV saved: {path} ({len(results)} keywords)")
 
 
+def _read_jsonl(path: Path) -> list[dict]:
+    """Records of a JSONL file; a line cut short by a crash is skipped."""
+    records = []
+    if path.exists():
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+    return records
+
+
+def _sync(f):
+    f.flush()
+    os.fsync(f.fileno())
+
+
+@contextmanager
+def _replacing(path: Path, **open_args):
+    """Write a file next to ``path`` and move it over ``path`` once synced."""
+    open_args.setdefault("encoding", "utf-8")
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w", **open_args) as f:
+        yield f
+        _sync(f)
+    os.replace(tmp_path, path)
+
+
+class ResultStream:
+    """Results appended to JSONL_FILE (and CSV_FILE) per finished (lang, cluster).
+
+    A pipeline's rows reach the disk before its line in CHECKPOINT_FILE, so
+    after a crash --resume keeps exactly the checkpointed pipelines, drops
+    any rows written after the last checkpoint and skips finished work.
+    The kept rows replace the old files atomically before the checkpoint is
+    rewritten, so a crash during resume loses nothing. Pipelines with
+    failed queries stream their rows without a checkpoint line, so the next
+    --resume runs them again. Without --resume all three files start empty.
+    """
+
+    def __init__(self, write_csv_rows: bool, resume: bool, output_dir: Path = OUTPUT_DIR):
+        self.jsonl_path = output_dir / JSONL_FILE
+        self.csv_path = output_dir / CSV_FILE
+        self.checkpoint_path = output_dir / CHECKPOINT_FILE
+        self.done: set[tuple[str, str]] = set()
+        if resume:
+            checkpoints = _read_jsonl(self.checkpoint_path)
+            self.done = {(c["lang"], c["cluster"]) for c in checkpoints}
+            records = [r for r in _read_jsonl(self.jsonl_path) if (r["lang"], r["cluster"]) in self.done]
+            with _replacing(self.jsonl_path) as f:
+                for record in records:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            if write_csv_rows:
+                with _replacing(self.csv_path, newline="", encoding="utf-8-sig") as f:
+                    writer = csv.writer(f)
+                    writer.writerow(CSV_COLUMNS)
+                    for record in records:
+                        writer.writerow(_csv_row(_result(record)))
+            # Only now: the old checkpoint still matches the kept rows, and
+            # a line cut short by a crash is dropped before appending
+            with _replacing(self.checkpoint_path) as f:
+                for checkpoint in checkpoints:
+                    f.write(json.dumps(checkpoint) + "\n")
+        else:
+            self.checkpoint_path.unlink(missing_ok=True)
+            self.jsonl_path.write_text("", encoding="utf-8")
+            if write_csv_rows:
+                with open(self.csv_path, "w", newline="", encoding="utf-8-sig") as f:
+                    csv.writer(f).writerow(CSV_COLUMNS)
+
+        self._jsonl = open(self.jsonl_path, "a", encoding="utf-8")
+        self._csv_file = None
+        if write_csv_rows:
+            self._csv_file = open(self.csv_path, "a", newline="", encoding="utf-8-sig")
+            self._csv = csv.writer(self._csv_file)
+        self._checkpoint = open(self.checkpoint_path, "a", encoding="utf-8")
+
+    def append(self, lang: str, cluster: str, results: list[KeywordResult], checkpoint: bool = True):
+        for r in results:
+            self._jsonl.write(json.dumps({**asdict(r), "cluster": cluster}, ensure_ascii=False) + "\n")
+        _sync(self._jsonl)
+        if self._csv_file:
+            for r in results:
+                self._csv.writerow(_csv_row(r))
+            _sync(self._csv_file)
+        if not checkpoint:
+            log.info(f"[{lang}] {cluster}: {len(results)} keywords written, not checkpointed")
+            return
+        self._checkpoint.write(json.dumps({"lang": lang, "cluster": cluster, "keywords": len(results)}) + "\n")
+        _sync(self._checkpoint)
+        self.done.add((lang, cluster))
+        log.info(f"[{lang}] {cluster}: {len(results)} keywords written")
+
+    def close(self):
+        self._jsonl.close()
+        self._checkpoint.close()
+        if self._csv_file:
+            self._csv_file.close()
+
+
+def _result(record: dict) -> KeywordResult:
+    return KeywordResult(**{k: v for k, v in record.items() if k != "cluster"})
+
+
+def merge_results(jsonl_path: Path) -> list[KeywordResult]:
+    """All streamed results in score order, one entry per (lang, keyword).
+
+    A keyword found by several clusters keeps its best-scoring entry.
+    """
+    records = _read_jsonl(jsonl_path)
+    records.sort(key=lambda r: (-r["score"], r["lang"], r["keyword"]))
+    results: list[KeywordResult] = []
+    seen: set[tuple[str, str]] = set()
+    for record in records:
+        key = (record["lang"], record["keyword"].lower())
+        if key not in seen:
+            seen.add(key)
+            results.append(_result(record))
+    return results
+
+
 # ─── Main ───
 
 
-async def run(langs: list[str], cluster: str, min_score: float, delay: float):
-    all_results: list[KeywordResult] = []
+@dataclass
+class PipelineOptions:
+    min_score: float = 0
+    offline: bool = False
+    depth: int = 1
+    budget: int = 0  # queries per (lang, cluster), 0 = no limit
+    alphabet: bool = False
+    similarity: float = DEFAULT_SIMILARITY
+    drop_variants: bool = False
+
+
+async def fetch_level(scheduler: Scheduler, queries: list[Query], offline: bool) -> list[list[str]]:
+    """Suggestions for one level of queries: from the cache, else fetched.
+
+    Offline, cache misses are marked ``failed`` like queries that could not
+    be fetched, so their pipeline is not checkpointed and --resume runs it
+    again.
+    """
+    cache = scheduler.cache
+    suggestions: list[list[str]] = [[] for _ in queries]
+    missing: list[int] = []
+    for index, query in enumerate(queries):
+        config = LANGUAGE_CONFIG[query.lang]
+        cached = cache.get(query.text, config["lang_code"], config["country_code"]) if cache else None
+        if cached is None:
+            missing.append(index)
+        else:
+            suggestions[index] = cached
+
+    if offline:
+        for index in missing:
+            queries[index].failed = True
+        if missing:
+            log.warning(f"Offline: {len(missing)} queries not in cache, skipped")
+    elif missing:
+        to_fetch = [queries[index] for index in missing]
+        fetched = await scheduler.fetch(to_fetch)
+        for index, found in zip(missing, fetched):
+            suggestions[index] = found
+    return suggestions
+
+
+async def run_pipeline(
+    scheduler: Scheduler, lang: str, cluster: str, options: PipelineOptions
+) -> tuple[list[KeywordResult], int]:
+    """Scrape, expand, score and group one (lang, cluster).
+
+    Returns the results and the number of queries that failed.
+    """
+    level = build_queries([lang], cluster, options.alphabet)
+    frontier = {(q.lang, normalize(q.text)) for q in level}
+    queries: list[Query] = []
+    suggestions: list[list[str]] = []
+
+    # Level by level, so the budget always goes to the best-scoring
+    # branches of the level and the result does not depend on timing
+    for current in range(1, options.depth + 1):
+        if options.budget:
+            remaining = options.budget - len(queries)
+            if len(level) > remaining:
+                log.info(f"[{lang}] Depth {current}: budget left for {remaining} of {len(level)} queries")
+                level = level[:remaining]
+        if not level:
+            break
+        log.info(f"[{lang}] Depth {current}: {len(level)} queries")
+        found = await fetch_level(scheduler, level, options.offline)
+        queries += level
+        suggestions += found
+        if current < options.depth:
+            level = expand_queries(level, found, frontier)
+
+    results = collect_results(queries, suggestions)
+    log.info(f"[{lang}] Collected {len(results)} unique keywords")
+
+    score_all(results)
+
+    if options.similarity > 0:
+        variants = group_near_duplicates(results, options.similarity)
+        log.info(f"[{lang}] Near-duplicates: {variants} variants (similarity={options.similarity})")
+        if options.drop_variants:
+            results = [r for r in results if not r.variant_of]
+
+    if options.min_score > 0:
+        before = len(results)
+        results = [r for r in results if r.score >= options.min_score]
+        log.info(f"[{lang}] Filtered: {before} → {len(results)} (min_score={options.min_score})")
+
+    return results, sum(q.failed for q in queries)
+
+
+async def run(
+    langs: list[str],
+    clusters: list[str],
+    stream: ResultStream,
+    options: PipelineOptions,
+    rate: float,
+    concurrency: int,
+    url: str = SUGGEST_URL,
+    cache: SuggestionCache | None = None,
+):
+    """Run every unfinished (lang, cluster) pipeline concurrently, streaming
+    each one's results as soon as it is done."""
+    units = [(lang, cluster) for cluster in clusters for lang in langs if (lang, cluster) not in stream.done]
+    skipped = len(langs) * len(clusters) - len(units)
+    if skipped:
+        log.info(f"Resume: {skipped} (lang, cluster) pipelines already done, {len(units)} to go")
+    if not units:
+        return
+    log.info(f"Scheduling {len(units)} pipelines: {concurrency} workers, up to {rate:.2f} req/s")
 
     async with httpx.AsyncClient(follow_redirects=True) as client:
-        for lang_key in langs:
-            config = LANGUAGE_CONFIG.get(lang_key)
-            if not config:
-                log.warning(f"Unknown language: {lang_key}, skipping")
-                continue
-            results = await scrape_language(client, lang_key, config, cluster, delay)
-            all_results.extend(results)
+        async with Scheduler(client, rate, concurrency, url, cache) as scheduler:
 
-    score_all(all_results)
+            async def run_unit(lang: str, cluster: str):
+                results, failed = await run_pipeline(scheduler, lang, cluster, options)
+                if failed:
+                    log.warning(f"[{lang}] {cluster}: {failed} queries failed, --resume will run it again")
+                stream.append(lang, cluster, results, checkpoint=not failed)
 
-    if min_score > 0:
-        before = len(all_results)
-        all_results = [r for r in all_results if r.score >= min_score]
-        log.info(f"Filtered: {before} → {len(all_results)} (min_score={min_score})")
+            await asyncio.gather(*(run_unit(lang, cluster) for lang, cluster in units))
 
-    return all_results
+    if cache:
+        log.info(f"Cache: {cache.hits} hits, {cache.misses} misses ({cache.path.name})")
 
 
 def main():
     parser = argparse.ArgumentParser(description="HealthDesk Keyword Research Pipeline")
     parser.add_argument("--lang", default="ALL", help="Languages: ALL, PL, EN,DE,PL etc.")
-    parser.add_argument("--cluster", default="back-pain", help="Keyword cluster name")
+    parser.add_argument("--cluster", default="back-pain", help="Keyword clusters: back-pain, eye-strain,ergonomics etc.")
     parser.add_argument("--output", default="both", choices=["json", "csv", "both"], help="Output format")
     parser.add_argument("--min-score", type=float, default=0, help="Minimum score filter")
-    parser.add_argument("--delay", type=float, default=1.5, help="Delay between requests (seconds)")
+    parser.add_argument("--rate", type=float, default=2.0,
+                        help="Max requests per second across all workers (lowered automatically on 429)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Requests in flight at once")
+    parser.add_argument("--delay", type=float, help="Seconds between requests (same as --rate 1/DELAY)")
+    parser.add_argument("--suggest-url", default=SUGGEST_URL,
+                        help="Suggest endpoint, e.g. a local suggest_stub.py server")
+    parser.add_argument("--cache-ttl", type=float, default=DEFAULT_CACHE_TTL_HOURS,
+                        help="Reuse cached suggestions younger than this many hours (0 = refetch all)")
+    parser.add_argument("--cache-file", type=Path, default=CACHE_FILE, help="Suggestion cache (SQLite)")
+    parser.add_argument("--no-cache", action="store_true", help="Neither read nor write the cache")
+    parser.add_argument("--offline", action="store_true",
+                        help="Use cached suggestions only, make no network requests")
+    parser.add_argument("--depth", type=int, default=1,
+                        help="Expansion depth: 1 = seeds and prefixes, 2+ = also query the suggestions")
+    parser.add_argument("--budget", type=int, default=500,
+                        help="Max queries per language and cluster, all depths (0 = no limit)")
+    parser.add_argument("--alphabet", action="store_true", help="Also query 'seed a', 'seed b', ...")
+    parser.add_argument("--similarity", type=float, default=DEFAULT_SIMILARITY,
+                        help="Word-set Jaccard at which keywords are grouped as variants (0 = off)")
+    parser.add_argument("--drop-variants", action="store_true",
+                        help="Keep only the best-scoring keyword of each near-duplicate group")
+    parser.add_argument("--resume", action="store_true",
+                        help="Keep the results of the last run and skip its finished (lang, cluster) pairs")
     args = parser.parse_args()
+    rate = 1 / args.delay if args.delay else args.rate
+    if args.offline and args.no_cache:
+        parser.error("--offline needs the cache")
+    options = PipelineOptions(
+        min_score=args.min_score,
+        offline=args.offline,
+        depth=args.depth,
+        budget=args.budget,
+        alphabet=args.alphabet,
+        similarity=args.similarity,
+        drop_variants=args.drop_variants,
+    )
 
     # Parse languages
     if args.lang.upper() == "ALL":
         langs = list(LANGUAGE_CONFIG.keys())
     else:
         langs = [l.strip().upper() for l in args.lang.split(",")]
+    clusters = [c.strip() for c in args.cluster.split(",")]
 
-    log.info(f"Starting keyword research: langs={langs}, cluster={args.cluster}, min_score={args.min_score}")
+    log.info(f"Starting keyword research: langs={langs}, clusters={clusters}, min_score={args.min_score}")
     start = time.time()
 
-    results = asyncio.run(run(langs, args.cluster, args.min_score, args.delay))
+    # --offline serves whatever is cached, however old
+    cache = None if args.no_cache else SuggestionCache(
+        args.cache_file, float("inf") if args.offline else args.cache_ttl
+    )
+    stream = ResultStream(args.output in ("csv", "both"), args.resume)
+    try:
+        asyncio.run(run(langs, clusters, stream, options, rate, args.concurrency, args.suggest_url, cache))
+    finally:
+        stream.close()
+        if cache:
+            cache.close()
+
+    # Merge the streamed results into the final, score-ordered outputs
+    results = merge_results(stream.jsonl_path)
 
     elapsed = time.time() - start
     log.info(f"Done in {elapsed:.1f}s — {len(results)} keywords total")
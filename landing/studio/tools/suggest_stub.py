@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the Google Suggest endpoint, for testing keyword_research.py
+without touching Google.
+
+Answers GET /complete/search?q=...&client=firefox with the same JSON shape
+([query, [suggestions]]), after an optional latency. Above --limit requests
+per second (sliding 1 s window) it answers 429 with a Retry-After header.
+
+Usage:
+  python suggest_stub.py --port 8765 --latency 0.2 --limit 5
+  python keyword_research.py --lang ALL --suggest-url http://127.0.0.1:8765/complete/search
+"""
+
+import argparse
+import json
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+SUFFIXES = ["ćwiczenia", "przyczyny", "leczenie", "w pracy", "przy komputerze", "domowe sposoby"]
+
+
+class Stats:
+    def __init__(self, limit: float):
+        self.limit = limit
+        self.window: deque[float] = deque()
+        self.served = 0
+        self.rejected = 0
+        self.lock = threading.Lock()
+
+    def admit(self) -> bool:
+        """Count the request and decide whether it is over the rate limit."""
+        now = time.monotonic()
+        with self.lock:
+            while self.window and self.window[0] <= now - 1:
+                self.window.popleft()
+            if self.limit and len(self.window) >= self.limit:
+                self.rejected += 1
+                return False
+            self.window.append(now)
+            self.served += 1
+            return True
+
+
+def make_handler(stats: Stats, latency: float, retry_after: float):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path != "/complete/search":
+                self.send_error(404)
+                return
+            if not stats.admit():
+                self.send_response(429)
+                self.send_header("Retry-After", f"{retry_after:g}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            if latency:
+                time.sleep(latency)
+            query = parse_qs(url.query).get("q", [""])[0]
+            body = json.dumps([query, [f"{query} {suffix}" for suffix in SUFFIXES]]).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Google Suggest stub")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds per response")
+    parser.add_argument("--limit", type=float, default=0,
+                        help="Requests per second before answering 429 (0 = no limit)")
+    parser.add_argument("--retry-after", type=float, default=1, help="Retry-After sent with 429")
+    args = parser.parse_args()
+
+    stats = Stats(args.limit)
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(stats, args.latency, args.retry_after))
+    print(f"Suggest stub on http://127.0.0.1:{args.port}/complete/search")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"Served {stats.served}, rejected {stats.rejected} with 429")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,332 @@
+"""Tests for keyword_research.py, against an in-process suggest endpoint.
+
+Run from this directory:
+  python -m pytest test_keyword_research.py
+"""
+
+import asyncio
+import json
+
+import httpx
+import pytest
+
+import keyword_research as kr
+
+SEEDS = kr.LANGUAGE_CONFIG["EN"]["seed_keywords"]["eye-strain"]
+
+
+def suggest(request: httpx.Request) -> httpx.Response:
+    """Suggest endpoint answering "<q> tips" and "<q> app" for every query."""
+    query = request.url.params["q"]
+    return httpx.Response(200, json=[query, [f"{query} tips", f"{query} app"]])
+
+
+def refuse(request: httpx.Request) -> httpx.Response:
+    raise AssertionError(f"unexpected request: {request.url}")
+
+
+@pytest.fixture
+def transport(monkeypatch):
+    """Route the pipeline's httpx client through a mock transport.
+
+    ``.requested`` lists the queries sent; set ``.handler`` to change the
+    responses.
+    """
+
+    class Transport(httpx.AsyncBaseTransport):
+        handler = staticmethod(suggest)
+        requested: list[str] = []
+
+        async def handle_async_request(self, request):
+            self.requested.append(request.url.params["q"])
+            return self.handler(request)
+
+    mock = Transport()
+    real_client = httpx.AsyncClient
+    monkeypatch.setattr(
+        kr.httpx, "AsyncClient", lambda **kwargs: real_client(transport=mock, **kwargs)
+    )
+    return mock
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = kr.SuggestionCache(tmp_path / "cache.db", ttl_hours=1)
+    yield cache
+    cache.close()
+
+
+def run(stream, cache=None, **options):
+    asyncio.run(
+        kr.run(["EN"], ["eye-strain"], stream, kr.PipelineOptions(**options), 1000, 4, cache=cache)
+    )
+
+
+def checkpoints(tmp_path) -> list[dict]:
+    path = tmp_path / kr.CHECKPOINT_FILE
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+def fetch_all(handler, queries: list[kr.Query], rate: float = 1000) -> list[list[str]]:
+    async def go():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            async with kr.Scheduler(client, rate, 4) as scheduler:
+                return await scheduler.fetch(queries)
+
+    return asyncio.run(go())
+
+
+def queries(*texts: str) -> list[kr.Query]:
+    return [kr.Query("EN", text, text, "suggest") for text in texts]
+
+
+# ─── Rate limiter and scheduler ───
+
+
+def test_429s_from_one_burst_halve_the_rate_once():
+    bucket = kr.TokenBucket(8.0, min_rate=1.0)
+    sent_at = kr.time.monotonic()
+    for _ in range(4):
+        bucket.slow_down(0, sent_at)
+    assert bucket.rate == 4.0
+
+    bucket.slow_down(0, kr.time.monotonic())
+    bucket.slow_down(0, kr.time.monotonic())
+    bucket.slow_down(0, kr.time.monotonic())
+    assert bucket.rate == 1.0  # min_rate
+
+
+def test_successes_restore_the_rate_gradually():
+    bucket = kr.TokenBucket(10.0)
+    bucket.slow_down(0, kr.time.monotonic())
+    bucket.speed_up()
+    assert bucket.rate == pytest.approx(5.2)
+    for _ in range(100):
+        bucket.speed_up()
+    assert bucket.rate == 10.0
+
+
+def test_acquire_waits_out_the_retry_after_pause():
+    async def go():
+        bucket = kr.TokenBucket(1000.0)
+        bucket.slow_down(0.2, await bucket.acquire())
+        start = kr.time.monotonic()
+        await bucket.acquire()
+        return kr.time.monotonic() - start
+
+    assert asyncio.run(go()) >= 0.19
+
+
+def test_scheduler_returns_suggestions_in_query_order():
+    texts = [f"query {i}" for i in range(20)]
+    assert fetch_all(suggest, queries(*texts)) == [[f"{t} tips", f"{t} app"] for t in texts]
+
+
+def test_scheduler_retries_rate_limited_queries():
+    answered = set()
+
+    def limited_once(request):
+        query = request.url.params["q"]
+        if query not in answered:
+            answered.add(query)
+            return httpx.Response(429, headers={"Retry-After": "0"})
+        return suggest(request)
+
+    batch = queries("neck pain", "dry eyes")
+    assert fetch_all(limited_once, batch) == [
+        ["neck pain tips", "neck pain app"],
+        ["dry eyes tips", "dry eyes app"],
+    ]
+    assert [q.attempts for q in batch] == [1, 1]
+    assert not any(q.failed for q in batch)
+
+
+def test_scheduler_gives_up_after_max_attempts(monkeypatch):
+    monkeypatch.setattr(kr, "MAX_ATTEMPTS", 2)
+
+    def broken(request):
+        if request.url.params["q"] == "broken":
+            return httpx.Response(500)
+        if request.url.params["q"] == "bug":
+            raise RuntimeError("handler bug")
+        return suggest(request)
+
+    batch = queries("broken", "bug", "fine")
+    assert fetch_all(broken, batch) == [[], [], ["fine tips", "fine app"]]
+    assert [q.failed for q in batch] == [True, True, False]
+    assert [q.attempts for q in batch] == [2, 0, 0]
+
+
+# ─── Suggestion cache ───
+
+
+def test_cache_serves_entries_until_the_ttl(cache, monkeypatch):
+    cache.put("eye strain", "en", "us", ["eye strain tips"])
+    assert cache.get("eye strain", "en", "us") == ["eye strain tips"]
+    assert cache.get("eye strain", "de", "de") is None
+
+    now = kr.time.time()
+    monkeypatch.setattr(kr.time, "time", lambda: now + 3601)
+    assert cache.get("eye strain", "en", "us") is None
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_cached_queries_are_not_fetched_again(tmp_path, transport, cache):
+    run(kr.ResultStream(False, False, tmp_path), cache)
+    fetched = len(transport.requested)
+    assert fetched == len(kr.build_queries(["EN"], "eye-strain"))
+
+    transport.handler = staticmethod(refuse)
+    run(kr.ResultStream(False, False, tmp_path), cache)
+    assert len(transport.requested) == fetched
+
+
+def test_offline_cache_misses_are_retried_by_resume(tmp_path, transport, cache):
+    cache.put(SEEDS[0], "en", "us", [f"{SEEDS[0]} tips"])
+    transport.handler = staticmethod(refuse)
+    stream = kr.ResultStream(False, False, tmp_path)
+    run(stream, cache, offline=True)
+    stream.close()
+    assert checkpoints(tmp_path) == []
+    assert transport.requested == []
+
+    transport.handler = staticmethod(suggest)
+    stream = kr.ResultStream(False, True, tmp_path)
+    run(stream, cache)
+    stream.close()
+    assert [c["cluster"] for c in checkpoints(tmp_path)] == ["eye-strain"]
+
+
+# ─── Breadth-first expansion ───
+
+
+def test_expansion_stays_within_the_budget(tmp_path, transport):
+    first_level = len(kr.build_queries(["EN"], "eye-strain"))
+    run(kr.ResultStream(False, False, tmp_path), depth=3, budget=first_level + 10)
+    assert len(transport.requested) == first_level + 10
+    expanded = transport.requested[first_level:]
+    assert all(q.endswith((" tips", " app")) for q in expanded)
+
+
+def test_expansion_never_repeats_a_query(tmp_path, transport):
+    def same_suggestions(request):
+        query = request.url.params["q"]
+        # The seed again, a case/space variant of another query, and one new keyword
+        return httpx.Response(200, json=[query, [SEEDS[0], f"  {SEEDS[1].upper()} ", "Eye Strain App"]])
+
+    transport.handler = staticmethod(same_suggestions)
+    run(kr.ResultStream(False, False, tmp_path), depth=3, budget=0)
+    normalized = [kr.normalize(q) for q in transport.requested]
+    assert len(normalized) == len(set(normalized))
+    assert normalized.count("eye strain app") == 1
+    assert len(transport.requested) == len(kr.build_queries(["EN"], "eye-strain")) + 1
+
+
+def test_budget_keeps_the_best_scoring_branches():
+    parents = queries("desk", "neck")
+    found = [["desk stretch"], ["how to fix neck pain at work app"]]
+    frontier = {("EN", "desk"), ("EN", "neck")}
+    children = kr.expand_queries(parents, found, frontier)
+    assert [c.text for c in children] == ["how to fix neck pain at work app", "desk stretch"]
+    assert [c.depth for c in children] == [2, 2]
+    assert ("EN", "desk stretch") in frontier
+
+
+# ─── Scoring and near-duplicates ───
+
+
+def result(keyword: str, lang: str = "EN", source: str = "suggest") -> kr.KeywordResult:
+    return kr.KeywordResult(keyword, lang, "us", source, "seed", word_count=len(keyword.split()))
+
+
+def test_scoring_signals():
+    config = kr.LANGUAGE_CONFIG["EN"]
+    question = result("how to stop eye strain at work", source="suggest+prefix")
+    # 4-8 words 3 + question 2 + "how" 1 + 5+ words 0.5 + prefix source 0.5
+    assert kr.score_keyword(question, config) == 7.0
+    assert question.intent_type == "question"
+    assert kr.score_keyword(result("monitor"), config) == 0.5
+
+
+def test_score_all_sorts_by_score_then_language_and_keyword():
+    results = kr.score_all([result("monitor"), result("desk break reminder app"), result("chair")])
+    assert [r.keyword for r in results] == ["desk break reminder app", "chair", "monitor"]
+    assert results[0].score > results[1].score == results[2].score
+
+
+def test_reordered_and_near_identical_keywords_are_grouped():
+    results = kr.score_all([
+        result("back pain desk job"),
+        result("desk job back pain"),
+        result("back pain desk job tips"),
+        result("back pain desk job", lang="DE"),
+        result("standing desk benefits"),
+    ])
+    assert kr.group_near_duplicates(results, similarity=0.75) == 2
+    # The 5-word keyword scores highest, so it heads the group
+    assert {(r.lang, r.keyword): r.variant_of for r in results} == {
+        ("EN", "back pain desk job tips"): "",
+        ("EN", "back pain desk job"): "back pain desk job tips",
+        ("EN", "desk job back pain"): "back pain desk job tips",
+        ("DE", "back pain desk job"): "",
+        ("EN", "standing desk benefits"): "",
+    }
+
+
+# ─── Streaming output and --resume ───
+
+
+def jsonl(tmp_path) -> list[dict]:
+    return kr._read_jsonl(tmp_path / kr.JSONL_FILE)
+
+
+def test_resume_keeps_checkpointed_pipelines_only(tmp_path):
+    stream = kr.ResultStream(True, False, tmp_path)
+    stream.append("EN", "back-pain", [result("neck pain app")])
+    stream.append("EN", "eye-strain", [result("dry eyes app")], checkpoint=False)
+    stream.close()
+    # A crash in the middle of the next pipeline's rows
+    with open(tmp_path / kr.JSONL_FILE, "a", encoding="utf-8") as f:
+        f.write('{"keyword": "cut sh')
+
+    stream = kr.ResultStream(True, True, tmp_path)
+    stream.close()
+    assert stream.done == {("EN", "back-pain")}
+    assert [(r["keyword"], r["cluster"]) for r in jsonl(tmp_path)] == [("neck pain app", "back-pain")]
+    csv_lines = (tmp_path / kr.CSV_FILE).read_text(encoding="utf-8-sig").splitlines()
+    assert csv_lines[0] == ",".join(kr.CSV_COLUMNS)
+    assert [line.split(",")[0] for line in csv_lines[1:]] == ["neck pain app"]
+
+
+def test_resume_skips_finished_pipelines(tmp_path, transport):
+    stream = kr.ResultStream(False, False, tmp_path)
+    run(stream)
+    stream.close()
+    written = jsonl(tmp_path)
+
+    transport.handler = staticmethod(refuse)
+    stream = kr.ResultStream(False, True, tmp_path)
+    run(stream)
+    stream.close()
+    assert jsonl(tmp_path) == written
+    assert len(checkpoints(tmp_path)) == 1
+
+
+def test_without_resume_the_outputs_start_empty(tmp_path):
+    stream = kr.ResultStream(False, False, tmp_path)
+    stream.append("EN", "back-pain", [result("neck pain app")])
+    stream.close()
+    kr.ResultStream(False, False, tmp_path).close()
+    assert jsonl(tmp_path) == []
+    assert checkpoints(tmp_path) == []
+
+
+def test_merge_keeps_the_best_entry_per_keyword(tmp_path):
+    stream = kr.ResultStream(False, False, tmp_path)
+    low, high = result("Desk Break App"), result("desk break app")
+    low.score, high.score = 2.0, 6.0
+    stream.append("EN", "back-pain", [low, result("monitor")])
+    stream.append("EN", "ergonomics", [high])
+    stream.close()
+    merged = kr.merge_results(tmp_path / kr.JSONL_FILE)
+    assert [(r.keyword, r.score) for r in merged] == [("desk break app", 6.0), ("monitor", 0.0)]
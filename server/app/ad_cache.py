@@ -0,0 +1,167 @@
+import asyncio
+import hashlib
+import os
+import random
+import threading
+import time
+from bisect import bisect_right
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from itertools import accumulate
+
+from sqlalchemy import select
+
+from .database import AsyncSessionLocal
+from .models import Ad
+
+# Seconds before a worker reloads the catalog even without an invalidation.
+# Admin edits invalidate only the worker that handled them, so this bounds
+# how long the other uvicorn workers can serve a stale catalog.
+AD_CACHE_TTL = float(os.environ.get("AD_CACHE_TTL", "60"))
+
+# Frequency capping for /api/ads/get: an ad is skipped for a client once it
+# was served AD_FREQUENCY_CAP times within AD_FREQUENCY_WINDOW seconds
+AD_FREQUENCY_CAP = int(os.environ.get("AD_FREQUENCY_CAP", "3"))
+AD_FREQUENCY_WINDOW = float(os.environ.get("AD_FREQUENCY_WINDOW", "3600"))
+# Number of clients whose recent impressions are remembered (LRU)
+AD_FREQUENCY_CLIENTS = int(os.environ.get("AD_FREQUENCY_CLIENTS", "10000"))
+
+
+@dataclass(frozen=True)
+class CatalogSnapshot:
+    ids: tuple[int, ...]
+    weights: tuple[int, ...]
+    payloads: tuple[bytes, ...]  # pre-serialized AdOut JSON per ad
+    desktop_payloads: tuple[bytes, ...]  # pre-serialized DesktopAdOut JSON per ad
+    cumulative: tuple[int, ...]  # running weight totals for single-ad sampling
+    etag: str
+    loaded_at: float
+
+    def weighted_order(self) -> list[bytes]:
+        """All ads in weighted random order (Efraimidis–Spirakis A-Res keys).
+
+        Each ad gets key u ** (1 / weight); sorting by key descending yields a
+        weighted permutation without materializing ``weight`` copies.
+        """
+        keys = [random.random() ** (1.0 / w) for w in self.weights]
+        order = sorted(range(len(keys)), key=keys.__getitem__, reverse=True)
+        return [self.payloads[i] for i in order]
+
+    def ad_etag(self, ad_id: int) -> str:
+        """ETag of a single ad within this catalog version."""
+        return f'"{self.etag[1:17]}-{ad_id}"'
+
+    def weighted_pick(self, exclude: set[int] | frozenset = frozenset()) -> int | None:
+        """Index of one ad drawn by weight in O(log n), skipping ``exclude`` ids."""
+        if not self.ids:
+            return None
+        if exclude and not exclude.isdisjoint(self.ids):
+            allowed = [i for i, ad_id in enumerate(self.ids) if ad_id not in exclude]
+            if not allowed:
+                return None
+            return random.choices(allowed, weights=[self.weights[i] for i in allowed])[0]
+        r = random.random() * self.cumulative[-1]
+        return bisect_right(self.cumulative, r)
+
+
+class AdCatalog:
+    """Process-local cache of active ads, reloaded on invalidation or TTL."""
+
+    def __init__(self, ttl: float):
+        self._ttl = ttl
+        self._snapshot: CatalogSnapshot | None = None
+        self._lock: asyncio.Lock | None = None
+        self._lock_loop = None
+
+    def invalidate(self):
+        self._snapshot = None
+
+    def _fresh(self) -> CatalogSnapshot | None:
+        snapshot = self._snapshot
+        if snapshot and time.monotonic() - snapshot.loaded_at < self._ttl:
+            return snapshot
+        return None
+
+    async def get(self) -> CatalogSnapshot:
+        snapshot = self._fresh()
+        if snapshot:
+            return snapshot
+        loop = asyncio.get_running_loop()
+        if self._lock_loop is not loop:
+            # asyncio locks belong to one loop (test clients start a new one)
+            self._lock, self._lock_loop = asyncio.Lock(), loop
+        async with self._lock:
+            snapshot = self._fresh()
+            if snapshot:
+                return snapshot
+            async with AsyncSessionLocal() as db:
+                ads = (await db.scalars(_ACTIVE_ADS)).all()
+            snapshot = self._snapshot = _build_snapshot(ads)
+            return snapshot
+
+
+_ACTIVE_ADS = select(Ad).where(Ad.is_active == True).order_by(Ad.id)  # noqa: E712
+
+
+def _build_snapshot(ads: list[Ad]) -> CatalogSnapshot:
+    # Imported here: the router module imports this one, and owns the schemas
+    from .routers.ads import AdOut, DesktopAdOut
+
+    payloads = tuple(AdOut.model_validate(ad).model_dump_json().encode() for ad in ads)
+    desktop_payloads = tuple(DesktopAdOut.from_ad(ad).model_dump_json().encode() for ad in ads)
+    ids = tuple(ad.id for ad in ads)
+    weights = tuple(max(ad.weight, 1) for ad in ads)
+    digest = hashlib.sha1()
+    for payload, weight in zip(payloads, weights):
+        digest.update(payload)
+        digest.update(str(weight).encode())
+    return CatalogSnapshot(
+        ids=ids,
+        weights=weights,
+        payloads=payloads,
+        desktop_payloads=desktop_payloads,
+        cumulative=tuple(accumulate(weights)),
+        etag=f'"{digest.hexdigest()}"',
+        loaded_at=time.monotonic(),
+    )
+
+
+class RecentImpressions:
+    """Per-client LRU of recently served ads, used for frequency capping."""
+
+    def __init__(self, cap: int, window: float, max_clients: int):
+        self._cap = cap
+        self._window = window
+        self._max_clients = max_clients
+        self._clients: OrderedDict[str, deque] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def capped(self, client_id: str) -> set[int]:
+        """Ad ids this client has already seen ``cap`` times in the window."""
+        cutoff = time.monotonic() - self._window
+        with self._lock:
+            recent = self._clients.get(client_id)
+            if not recent:
+                return set()
+            while recent and recent[0][1] < cutoff:
+                recent.popleft()
+            counts: dict[int, int] = {}
+            for ad_id, _ in recent:
+                counts[ad_id] = counts.get(ad_id, 0) + 1
+        return {ad_id for ad_id, n in counts.items() if n >= self._cap}
+
+    def record(self, client_id: str, ad_id: int):
+        with self._lock:
+            recent = self._clients.get(client_id)
+            if recent is None:
+                recent = deque(maxlen=self._cap * 16)
+                self._clients[client_id] = recent
+                if len(self._clients) > self._max_clients:
+                    self._clients.popitem(last=False)
+            else:
+                self._clients.move_to_end(client_id)
+            recent.append((ad_id, time.monotonic()))
+
+
+ad_catalog = AdCatalog(AD_CACHE_TTL)
+recent_impressions = RecentImpressions(AD_FREQUENCY_CAP, AD_FREQUENCY_WINDOW, AD_FREQUENCY_CLIENTS)
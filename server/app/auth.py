@@ -1,4 +1,5 @@
 import hashlib
+import hmac
 import os
 from datetime import datetime, timedelta, timezone
 
@@ -13,6 +14,9 @@ SECRET_KEY = os.environ.get("API_SECRET_KEY", "dev-secret-change-me")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_HOURS = 24
 
+# Bearer token for Prometheus scrapers on /metrics (empty = admin session only)
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+
 # Simple SHA256-based password hashing (no bcrypt dependency issues)
 _SALT = "healthdesk-api-salt-2026"
 
@@ -85,3 +89,12 @@ def get_current_admin(request: Request):
             headers={"Location": "/admin/login"},
         )
     return payload
+
+
+def get_metrics_access(request: Request):
+    """Dependency for /metrics: ``Authorization: Bearer <METRICS_TOKEN>`` or an admin session."""
+    if METRICS_TOKEN:
+        expected = f"Bearer {METRICS_TOKEN}".encode()
+        if hmac.compare_digest(request.headers.get("authorization", "").encode(), expected):
+            return None
+    return get_current_admin(request)
@@ -0,0 +1,214 @@
+"""Request body formats accepted by /api/telemetry/batch.
+
+Negotiated from the request headers:
+
+  Content-Encoding: identity | gzip | zstd
+  Content-Type:     application/json | application/msgpack (application/x-msgpack)
+
+Whatever the format, the body decodes to the BatchPayload shape, which is
+checked by hand here instead of building one Pydantic model per event.
+zstd and MessagePack need the optional ``zstandard`` / ``msgpack``
+packages; without them those formats are answered with 415.
+"""
+
+import json
+import os
+import threading
+import zlib
+from json.encoder import c_make_encoder, encode_basestring_ascii
+
+from fastapi import HTTPException, status
+
+try:
+    import msgpack
+except ImportError:  # optional: JSON-only server
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # optional: gzip/identity only
+    zstandard = None
+
+# Max batch body size in bytes, checked before and after decompression
+TELEMETRY_MAX_BATCH_BYTES = int(os.environ.get("TELEMETRY_MAX_BATCH_BYTES", str(1024 * 1024)))
+
+JSON_TYPES = {"application/json"}
+MSGPACK_TYPES = {"application/msgpack", "application/x-msgpack", "application/vnd.msgpack"}
+
+# Payload text, identical to json.dumps(data). json.dumps sets up a new C
+# encoder on every call, which costs more than encoding a small event
+# dict, so one is built here and reused; decoded bodies cannot contain
+# reference cycles, so it skips the cycle check.
+_json_encoder = json.JSONEncoder(check_circular=False)
+if c_make_encoder is not None:
+    _c_encoder = c_make_encoder(
+        None, _json_encoder.default, encode_basestring_ascii, None, ": ", ", ", False, False, True
+    )
+
+    def _encode_payload(data: dict) -> str:
+        return "".join(_c_encoder(data, 0))
+
+else:  # pure-Python json build
+    _encode_payload = _json_encoder.encode
+
+# ZstdDecompressor contexts are costly to create and not thread-safe
+_zstd_local = threading.local()
+
+
+def supported_encodings() -> list[str]:
+    return ["identity", "gzip"] + (["zstd"] if zstandard else [])
+
+
+def supported_types() -> list[str]:
+    return sorted(JSON_TYPES | (MSGPACK_TYPES if msgpack else set()))
+
+
+# ---------------------------------------------------------------------------
+# Bytes -> object
+# ---------------------------------------------------------------------------
+
+
+def _too_large():
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"Batch body larger than {TELEMETRY_MAX_BATCH_BYTES} bytes",
+    )
+
+
+def _bad_body(detail: str):
+    return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=detail)
+
+
+def _zstd_decompressor():
+    decompressor = getattr(_zstd_local, "decompressor", None)
+    if decompressor is None:
+        decompressor = _zstd_local.decompressor = zstandard.ZstdDecompressor()
+    return decompressor
+
+
+def decompress(body: bytes, encoding: str | None) -> bytes:
+    """Undo Content-Encoding, refusing output past TELEMETRY_MAX_BATCH_BYTES."""
+    encoding = (encoding or "identity").strip().lower()
+    limit = TELEMETRY_MAX_BATCH_BYTES
+    if encoding == "identity":
+        return body
+    if encoding in ("gzip", "x-gzip"):
+        inflater = zlib.decompressobj(wbits=31)
+        try:
+            data = inflater.decompress(body, limit + 1)
+        except zlib.error:
+            raise _bad_body("Invalid gzip body")
+        if len(data) > limit:
+            raise _too_large()
+        if not inflater.eof:
+            raise _bad_body("Truncated gzip body")
+        return data
+    if encoding == "zstd" and zstandard:
+        try:
+            size = zstandard.frame_content_size(body)
+        except zstandard.ZstdError:
+            raise _bad_body("Invalid zstd body")
+        if size > limit:
+            raise _too_large()
+        try:
+            # Frames without a content size are decoded into at most `limit` bytes
+            return _zstd_decompressor().decompress(body, max_output_size=limit)
+        except zstandard.ZstdError:
+            raise _bad_body("Invalid or oversized zstd body")
+    raise HTTPException(
+        status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+        detail=f"Content-Encoding must be one of: {', '.join(supported_encodings())}",
+    )
+
+
+def deserialize(data: bytes, content_type: str | None):
+    """Parse JSON or MessagePack according to Content-Type (JSON if missing)."""
+    media_type = (content_type or "application/json").split(";")[0].strip().lower()
+    if media_type in JSON_TYPES:
+        try:
+            return json.loads(data)
+        except ValueError:
+            raise _bad_body("Invalid JSON body")
+    if media_type in MSGPACK_TYPES and msgpack:
+        try:
+            return msgpack.unpackb(data, raw=False, strict_map_key=True)
+        except (ValueError, msgpack.UnpackException):
+            raise _bad_body("Invalid MessagePack body")
+    raise HTTPException(
+        status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+        detail=f"Content-Type must be one of: {', '.join(supported_types())}",
+    )
+
+
+# ---------------------------------------------------------------------------
+# Object -> validated batch
+# ---------------------------------------------------------------------------
+
+
+def _invalid(detail: str):
+    return HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=detail)
+
+
+def _optional_str(obj: dict, key: str) -> str | None:
+    value = obj.get(key)
+    if value is not None and not isinstance(value, str):
+        raise _invalid(f"{key} must be a string")
+    return value
+
+
+def validate_batch(obj) -> dict:
+    """Check the BatchPayload shape and return it as a plain dict.
+
+    Each event comes back as ``{"event_type", "timestamp", "seq", "payload"}``
+    with ``seq`` defaulting to the event's position in the batch and ``data``
+    already serialized to the JSON text stored in the payload column.
+    """
+    if not isinstance(obj, dict):
+        raise _invalid("Batch must be an object")
+    client_id = obj.get("client_id")
+    if not isinstance(client_id, str):
+        raise _invalid("client_id must be a string")
+    events = obj.get("events")
+    if not isinstance(events, list):
+        raise _invalid("events must be a list")
+    checked = []
+    for i, event in enumerate(events):
+        if not isinstance(event, dict):
+            raise _invalid(f"events[{i}].event_type must be a string")
+        event_type = event.get("event_type")
+        if not isinstance(event_type, str):
+            raise _invalid(f"events[{i}].event_type must be a string")
+        timestamp = event.get("timestamp")
+        if timestamp is not None and not isinstance(timestamp, str):
+            raise _invalid(f"events[{i}].timestamp must be a string")
+        data = event.get("data")
+        if data is not None and not isinstance(data, dict):
+            raise _invalid(f"events[{i}].data must be an object")
+        try:
+            payload = _encode_payload(data) if data else None
+        except (TypeError, ValueError):
+            raise _invalid(f"events[{i}].data must be JSON-serializable")
+        seq = event.get("seq")
+        if seq is None:
+            seq = i
+        # bool is an int subclass, but true/false is not a sequence number
+        elif not isinstance(seq, int) or isinstance(seq, bool):
+            raise _invalid(f"events[{i}].seq must be an integer")
+        checked.append(
+            {"event_type": event_type, "timestamp": timestamp, "seq": seq, "payload": payload}
+        )
+    return {
+        "client_id": client_id,
+        "batch_id": _optional_str(obj, "batch_id"),
+        "sent_at": _optional_str(obj, "sent_at"),
+        "app_version": _optional_str(obj, "app_version"),
+        "platform": _optional_str(obj, "platform"),
+        "events": checked,
+    }
+
+
+def decode_batch(body: bytes, content_type: str | None, content_encoding: str | None) -> dict:
+    """Raw request body -> validated batch dict."""
+    if len(body) > TELEMETRY_MAX_BATCH_BYTES:
+        raise _too_large()
+    return validate_batch(deserialize(decompress(body, content_encoding), content_type))
@@ -0,0 +1,479 @@
+"""Cached data of the admin telemetry dashboard.
+
+The dashboard is computed in two sections with their own lifetimes:
+
+- ``history``: everything before today (30-day series, all-time totals and
+  the WAU/MAU and per-key sketches merged up to yesterday). It is keyed by
+  the UTC day, so it is rebuilt when the day rolls over; its TTL only
+  picks up late events for past days (offline batches, skewed clients).
+- ``today``: today's rollup rows, refreshed every DASHBOARD_TODAY_TTL.
+
+Each dashboard panel is folded from the two sections (counter sums and a
+few sketch merges, no queries) once per section refresh. Sections are
+stored in a small SQLite file, so all uvicorn workers share them. A stale
+section is served while the one worker that claims its refresh lease
+recomputes it in a background thread (stale-while-revalidate); only a
+missing or long-expired section is computed inline.
+"""
+
+import base64
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from sqlalchemy import func, select
+
+from .database import DATA_DIR, engine
+from .hll import HyperLogLog
+from .models import DailyDownloadCount, DailyEventCount, DailyPayloadCount
+from .rollups import merged_sketches
+
+log = logging.getLogger("healthdesk.dashboard")
+
+DASHBOARD_CACHE_PATH = Path(
+    os.environ.get("DASHBOARD_CACHE_PATH", DATA_DIR / "dashboard_cache.db")
+)
+# Seconds a section is served as-is
+DASHBOARD_TODAY_TTL = float(os.environ.get("DASHBOARD_TODAY_TTL", "30"))
+DASHBOARD_HISTORY_TTL = float(os.environ.get("DASHBOARD_HISTORY_TTL", "3600"))
+# Seconds past its TTL a section is still served while it is refreshed in
+# the background; older sections are recomputed inline
+DASHBOARD_MAX_STALE = float(os.environ.get("DASHBOARD_MAX_STALE", "600"))
+
+# Seconds a worker owns a refresh before another worker may take it over
+_REFRESH_LEASE = 60.0
+# Sections of past days are pruned after this many seconds
+_KEEP_SECONDS = 2 * 86400
+# Part of every cache key; bump it when the layout of a section changes
+_LAYOUT = 2
+
+
+# ---------------------------------------------------------------------------
+# Section cache
+# ---------------------------------------------------------------------------
+
+
+class SectionCache:
+    """JSON sections in a SQLite file shared by all uvicorn workers."""
+
+    def __init__(self, path: Path):
+        self._path = path
+        self._ready = False
+        # key -> (computed_at, value): sections already decoded by this process
+        self._decoded: dict[str, tuple[float, dict]] = {}
+        self._locks: dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+    @contextmanager
+    def _connect(self):
+        if not self._ready:
+            self._path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self._path, timeout=5, isolation_level=None)
+        try:
+            if not self._ready:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS dashboard_sections ("
+                    " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+                    " computed_at REAL NOT NULL, refresh_until REAL NOT NULL DEFAULT 0)"
+                )
+                self._ready = True
+            yield conn
+        finally:
+            conn.close()
+
+    def get(self, key: str, ttl: float, compute, force: bool = False) -> tuple[dict, float]:
+        """Section ``key`` and its computed_at (epoch seconds).
+
+        ``compute`` is called inline when the section is missing, too old or
+        ``force`` is set, and in a background thread when it is stale.
+        """
+        started = time.time()
+        if not force:
+            with self._connect() as conn:
+                computed_at = self._computed_at(conn, key)
+                if computed_at is not None and started - computed_at < ttl + DASHBOARD_MAX_STALE:
+                    if started - computed_at >= ttl:
+                        self._start_refresh(conn, key, compute, started)
+                    return self._load(conn, key, computed_at), computed_at
+        # One inline compute per key and process: concurrent panel requests
+        # wait for it instead of running the same queries side by side
+        with self._lock(key):
+            with self._connect() as conn:
+                computed_at = self._computed_at(conn, key)
+                if computed_at is not None and computed_at >= started:
+                    return self._load(conn, key, computed_at), computed_at
+            return self._compute(key, compute)
+
+    def _lock(self, key: str) -> threading.Lock:
+        with self._locks_guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+    @staticmethod
+    def _computed_at(conn, key: str) -> float | None:
+        row = conn.execute(
+            "SELECT computed_at FROM dashboard_sections WHERE key = ?", (key,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def _load(self, conn, key: str, computed_at: float) -> dict:
+        decoded = self._decoded.get(key)
+        if decoded and decoded[0] == computed_at:
+            return decoded[1]
+        row = conn.execute(
+            "SELECT value, computed_at FROM dashboard_sections WHERE key = ?", (key,)
+        ).fetchone()
+        value = json.loads(row[0])
+        self._decoded[key] = (row[1], value)
+        return value
+
+    def _start_refresh(self, conn, key: str, compute, now: float):
+        # Whoever moves the lease forward refreshes; the rest serve stale
+        claimed = conn.execute(
+            "UPDATE dashboard_sections SET refresh_until = ? WHERE key = ? AND refresh_until < ?",
+            (now + _REFRESH_LEASE, key, now),
+        ).rowcount
+        if claimed:
+            threading.Thread(
+                target=self._refresh, args=(key, compute), name="dashboard-refresh", daemon=True
+            ).start()
+
+    def _compute(self, key: str, compute) -> tuple[dict, float]:
+        computed_at = time.time()
+        value = compute()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO dashboard_sections (key, value, computed_at)"
+                " VALUES (?, ?, ?)",
+                (key, json.dumps(value, separators=(",", ":")), computed_at),
+            )
+            conn.execute(
+                "DELETE FROM dashboard_sections WHERE computed_at < ?",
+                (computed_at - _KEEP_SECONDS,),
+            )
+        self._decoded[key] = (computed_at, value)
+        for old in [k for k, (at, _) in self._decoded.items() if at < computed_at - _KEEP_SECONDS]:
+            self._decoded.pop(old, None)
+        return value, computed_at
+
+    def _refresh(self, key: str, compute):
+        try:
+            self._compute(key, compute)
+        except Exception:
+            # The lease stays until it expires, which spaces out retries
+            log.exception("Dashboard section %s refresh failed", key)
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM dashboard_sections")
+
+
+section_cache = SectionCache(DASHBOARD_CACHE_PATH)
+
+
+# ---------------------------------------------------------------------------
+# Sections
+# ---------------------------------------------------------------------------
+
+
+def _pack(sketch: HyperLogLog | None) -> str | None:
+    if sketch is None:
+        return None
+    return base64.b64encode(zlib.compress(sketch.to_bytes())).decode()
+
+
+def _union(*packed: str | None) -> HyperLogLog:
+    result = HyperLogLog()
+    for blob in packed:
+        if blob is not None:
+            result.merge(HyperLogLog.from_bytes(zlib.decompress(base64.b64decode(blob))))
+    return result
+
+
+def _sums(conn, model, key_column, *conditions) -> dict[str, int]:
+    query = select(key_column, func.sum(model.count)).where(*conditions).group_by(key_column)
+    return {key: int(total) for key, total in conn.execute(query)}
+
+
+def _days_before(today: str, days: int) -> str:
+    return (datetime.strptime(today, "%Y-%m-%d") - timedelta(days=days)).strftime("%Y-%m-%d")
+
+
+def _payload_counts(conn, *conditions) -> dict[str, dict[str, int]]:
+    """{"event_type.field": {value: events}} from the payload rollup."""
+    counts: dict[str, dict[str, int]] = {}
+    query = (
+        select(
+            DailyPayloadCount.event_type,
+            DailyPayloadCount.field,
+            DailyPayloadCount.value,
+            func.sum(DailyPayloadCount.count),
+        )
+        .where(*conditions)
+        .group_by(DailyPayloadCount.event_type, DailyPayloadCount.field, DailyPayloadCount.value)
+    )
+    for event_type, field, value, count in conn.execute(query):
+        counts.setdefault(f"{event_type}.{field}", {})[value] = int(count)
+    return counts
+
+
+def _payload_totals(conn, *conditions) -> dict[str, dict[str, float]]:
+    """{day: {"event_type.field": sum}} for the numeric payload fields."""
+    totals: dict[str, dict[str, float]] = {}
+    total = func.sum(DailyPayloadCount.total)
+    query = (
+        select(DailyPayloadCount.day, DailyPayloadCount.event_type, DailyPayloadCount.field, total)
+        .where(*conditions)
+        .group_by(DailyPayloadCount.day, DailyPayloadCount.event_type, DailyPayloadCount.field)
+        .having(total != 0)
+    )
+    for day, event_type, field, value in conn.execute(query):
+        value = int(value) if value == int(value) else round(value, 2)
+        totals.setdefault(day, {})[f"{event_type}.{field}"] = value
+    return totals
+
+
+def history_section(conn, today: str) -> dict:
+    """Rollups of the days before ``today``."""
+    yesterday = _days_before(today, 1)
+    week_ago = _days_before(today, 7)
+    month_ago = _days_before(today, 30)
+    return {
+        "event_days": _sums(
+            conn, DailyEventCount, DailyEventCount.day,
+            DailyEventCount.day >= month_ago, DailyEventCount.day < today,
+        ),
+        "event_types": _sums(
+            conn, DailyEventCount, DailyEventCount.event_type, DailyEventCount.day < today
+        ),
+        "download_days": _sums(
+            conn, DailyDownloadCount, DailyDownloadCount.day,
+            DailyDownloadCount.day >= month_ago, DailyDownloadCount.day < today,
+        ),
+        "platforms": _sums(
+            conn, DailyDownloadCount, DailyDownloadCount.platform, DailyDownloadCount.day < today
+        ),
+        "week": _pack(merged_sketches(conn, "all", week_ago, yesterday).get("")),
+        "month": _pack(merged_sketches(conn, "all", month_ago, yesterday).get("")),
+        "event_type_users": {
+            key: _pack(hll)
+            for key, hll in merged_sketches(conn, "event_type", month_ago, yesterday).items()
+        },
+        "app_version_users": {
+            key: _pack(hll)
+            for key, hll in merged_sketches(conn, "app_version", month_ago, yesterday).items()
+        },
+        "payload_values": _payload_counts(
+            conn, DailyPayloadCount.day >= month_ago, DailyPayloadCount.day < today
+        ),
+        "payload_days": _payload_totals(
+            conn, DailyPayloadCount.day >= month_ago, DailyPayloadCount.day < today
+        ),
+    }
+
+
+def today_section(conn, today: str) -> dict:
+    """Rollups of ``today`` only."""
+    return {
+        "event_types": _sums(
+            conn, DailyEventCount, DailyEventCount.event_type, DailyEventCount.day == today
+        ),
+        "platforms": _sums(
+            conn, DailyDownloadCount, DailyDownloadCount.platform, DailyDownloadCount.day == today
+        ),
+        "clients": _pack(merged_sketches(conn, "all", today, today).get("")),
+        "event_type_users": {
+            key: _pack(hll)
+            for key, hll in merged_sketches(conn, "event_type", today, today).items()
+        },
+        "app_version_users": {
+            key: _pack(hll)
+            for key, hll in merged_sketches(conn, "app_version", today, today).items()
+        },
+        "payload_values": _payload_counts(conn, DailyPayloadCount.day == today),
+        "payload_totals": _payload_totals(conn, DailyPayloadCount.day == today).get(today, {}),
+    }
+
+
+def _added(*counts: dict[str, int]) -> dict[str, int]:
+    total: dict[str, int] = {}
+    for part in counts:
+        for key, n in part.items():
+            total[key] = total.get(key, 0) + n
+    return total
+
+
+def _users(history: dict, today: dict, key: str) -> int:
+    return _union(history.get(key), today.get(key)).count()
+
+
+def _sorted_desc(counts: dict[str, int]) -> list[tuple[str, int]]:
+    return sorted(counts.items(), key=lambda kv: -kv[1])
+
+
+# Panels: one block of the dashboard each, served by /admin/api/ (see
+# routers/admin_api.py). Series are lists of [day, count] points.
+
+
+def summary_panel(history: dict, today: dict, day: str) -> dict:
+    return {
+        "dau": _union(today["clients"]).count(),
+        "wau": _union(history["week"], today["clients"]).count(),
+        "mau": _union(history["month"], today["clients"]).count(),
+        "events_today": sum(today["event_types"].values()),
+    }
+
+
+def downloads_panel(history: dict, today: dict, day: str) -> dict:
+    platforms = _added(history["platforms"], today["platforms"])
+    return {
+        "today": sum(today["platforms"].values()),
+        "total": sum(platforms.values()),
+        "by_platform": [
+            {"platform": platform, "count": count} for platform, count in _sorted_desc(platforms)
+        ],
+    }
+
+
+def _series(past_days: dict[str, int], today_counts: dict[str, int], day: str) -> list[list]:
+    points = sorted(past_days.items())
+    today_total = sum(today_counts.values())
+    if today_total:
+        points.append((day, today_total))
+    return [[point_day, count] for point_day, count in points]
+
+
+def events_daily_panel(history: dict, today: dict, day: str) -> dict:
+    return {"points": _series(history["event_days"], today["event_types"], day)}
+
+
+def downloads_daily_panel(history: dict, today: dict, day: str) -> dict:
+    return {"points": _series(history["download_days"], today["platforms"], day)}
+
+
+def common_events_panel(history: dict, today: dict, day: str) -> dict:
+    event_types = _added(history["event_types"], today["event_types"])
+    return {
+        "rows": [
+            {
+                "event_type": event_type,
+                "count": count,
+                "users": _users(history["event_type_users"], today["event_type_users"], event_type),
+            }
+            for event_type, count in _sorted_desc(event_types)[:10]
+        ]
+    }
+
+
+def app_versions_panel(history: dict, today: dict, day: str) -> dict:
+    versions = set(history["app_version_users"]) | set(today["app_version_users"])
+    version_users = {
+        version: _users(history["app_version_users"], today["app_version_users"], version)
+        for version in versions
+    }
+    return {
+        "rows": [
+            {"app_version": version, "users": users}
+            for version, users in _sorted_desc(version_users)[:10]
+        ]
+    }
+
+
+def payload_values_panel(history: dict, today: dict, day: str) -> dict:
+    """Top values of each extracted payload field over the last 30 days."""
+    fields = []
+    for key in sorted(set(history["payload_values"]) | set(today["payload_values"])):
+        values = _added(
+            history["payload_values"].get(key, {}), today["payload_values"].get(key, {})
+        )
+        events = sum(values.values())
+        fields.append({
+            "field": key,
+            "rows": [
+                {"value": value, "count": count, "share": round(count / events * 100, 1)}
+                for value, count in _sorted_desc(values)[:10]
+            ],
+        })
+    return {"fields": fields}
+
+
+def payload_daily_panel(history: dict, today: dict, day: str) -> dict:
+    """Daily sums of the numeric payload fields; points are [day, {field: sum}]."""
+    points = [[point_day, totals] for point_day, totals in sorted(history["payload_days"].items())]
+    if today["payload_totals"]:
+        points.append([day, today["payload_totals"]])
+    return {"points": points}
+
+
+# ---------------------------------------------------------------------------
+# Entry points
+# ---------------------------------------------------------------------------
+
+
+@dataclass(frozen=True)
+class Sections:
+    day: str
+    history: dict
+    today: dict
+    history_at: float
+    today_at: float
+
+    @property
+    def history_version(self) -> str:
+        return f"{self.history_at:.3f}"
+
+    @property
+    def version(self) -> str:
+        """Changes whenever either section is recomputed."""
+        return f"{self.history_at:.3f}-{self.today_at:.3f}"
+
+
+def _computed(section, today: str):
+    def compute() -> dict:
+        with engine.connect() as conn:
+            return section(conn, today)
+
+    return compute
+
+
+def _clock(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime("%H:%M:%S")
+
+
+def load_sections(force: bool = False) -> Sections:
+    """Both sections of the current UTC day; ``force`` recomputes them."""
+    day = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    history, history_at = section_cache.get(
+        f"history:{_LAYOUT}:{day}", DASHBOARD_HISTORY_TTL, _computed(history_section, day), force
+    )
+    today, today_at = section_cache.get(
+        f"today:{_LAYOUT}:{day}", DASHBOARD_TODAY_TTL, _computed(today_section, day), force
+    )
+    return Sections(day, history, today, history_at, today_at)
+
+
+# name -> (sections version, panel): the panels are derived from the
+# sections alone, so each is built once per section refresh
+_panels: dict[str, tuple[str, dict]] = {}
+
+
+def panel(name: str, build, sections: Sections) -> dict:
+    """Panel ``build(history, today, day)`` with the section timestamps added."""
+    memo = _panels.get(name)
+    if memo and memo[0] == sections.version:
+        return memo[1]
+    value = {
+        **build(sections.history, sections.today, sections.day),
+        "today_at": _clock(sections.today_at),
+        "history_at": _clock(sections.history_at),
+    }
+    _panels[name] = (sections.version, value)
+    return value
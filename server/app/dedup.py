@@ -0,0 +1,231 @@
+"""Recently-seen telemetry event keys, for idempotent batch ingestion.
+
+Clients retry batches without knowing whether the first attempt landed,
+so every event gets a key (batch id + sequence number, or a content hash)
+and keys seen within the dedup window are dropped before they reach the
+ingest queue. The set is a rotating pair of Bloom filters: each
+generation covers half the window, lookups check both and inserts go to
+the current one, so memory stays fixed and no database lookup is needed.
+False positives (an unseen event reported as seen) happen at roughly
+TELEMETRY_DEDUP_ERROR_RATE.
+
+The filters are per process, and uvicorn's workers do not share them: a
+retry that lands on another worker passes its filters. So the keys also
+travel with the rows into the group commit, which inserts them into
+``telemetry_dedup_keys`` with insert-or-ignore and keeps only the rows
+whose key was new (``claim_keys``). The table is shared by all workers
+(and hosts, on PostgreSQL), and the insert is part of the same
+transaction as the rows, so an event is stored at most once per window.
+The in-process filters still drop most retries before they are queued.
+"""
+
+import hashlib
+import math
+import os
+import threading
+import time
+
+from sqlalchemy import delete
+
+from .dialect import upsert
+from .models import DedupKey
+
+# Keys remembered per generation (two generations are kept)
+TELEMETRY_DEDUP_CAPACITY = int(os.environ.get("TELEMETRY_DEDUP_CAPACITY", "1000000"))
+TELEMETRY_DEDUP_ERROR_RATE = float(os.environ.get("TELEMETRY_DEDUP_ERROR_RATE", "0.0001"))
+# Seconds a key is guaranteed to be remembered (0 disables deduplication)
+TELEMETRY_DEDUP_WINDOW = float(os.environ.get("TELEMETRY_DEDUP_WINDOW", str(24 * 3600)))
+# Also check keys against telemetry_dedup_keys in the group commit (needed
+# with more than one worker process)
+TELEMETRY_DEDUP_SHARED = os.environ.get("TELEMETRY_DEDUP_SHARED", "1") == "1"
+# Seconds between deletes of expired telemetry_dedup_keys rows
+DEDUP_PRUNE_INTERVAL = 600
+
+# Keys per INSERT statement (2 parameters each)
+_CLAIM_CHUNK = 5000
+
+
+def event_key(
+    client_id: str,
+    batch_id: str | None,
+    seq: int,
+    event_type: str,
+    timestamp: str | None,
+    payload: str | None,
+) -> bytes | None:
+    """Dedup key of one batch event, or None when it cannot be identified.
+
+    With a batch id the key is (client, batch, seq). Without one it is a
+    hash of the event content, which is only distinctive when the client
+    sent its own timestamp.
+    """
+    if batch_id is not None:
+        raw = f"b\0{client_id}\0{batch_id}\0{seq}"
+    elif timestamp is not None:
+        raw = f"c\0{client_id}\0{event_type}\0{timestamp}\0{payload or ''}"
+    else:
+        return None
+    return hashlib.blake2b(raw.encode(), digest_size=16).digest()
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over 16-byte digests (double hashing)."""
+
+    def __init__(self, capacity: int, error_rate: float):
+        bits = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.num_bits = max(bits, 64)
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.num_bits + 7) // 8)
+
+    def __contains__(self, digest: bytes) -> bool:
+        # Unseen keys usually stop at the first or second unset bit
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        m = self.num_bits
+        bits = self._bits
+        for _ in range(self.num_hashes):
+            p = h1 % m
+            if not bits[p >> 3] & (1 << (p & 7)):
+                return False
+            h1 += h2
+        return True
+
+    def add(self, digest: bytes):
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        m = self.num_bits
+        bits = self._bits
+        for _ in range(self.num_hashes):
+            p = h1 % m
+            bits[p >> 3] |= 1 << (p & 7)
+            h1 += h2
+        self.count += 1
+
+
+class RecentKeys:
+    """Two rotating Bloom filter generations covering a sliding time window.
+
+    The current generation is retired after half the window or once it
+    holds ``capacity`` keys, whichever comes first, so a key is remembered
+    for at least half the window and at most the full window.
+    """
+
+    def __init__(self, capacity: int, error_rate: float, window: float):
+        self._capacity = capacity
+        self._error_rate = error_rate
+        self._window = window
+        self._lock = threading.Lock()
+        self._current = BloomFilter(capacity, error_rate)
+        self._previous = BloomFilter(capacity, error_rate)
+        self._rotated_at = time.monotonic()
+        self.duplicates = 0
+        self.rotations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._window > 0
+
+    def _maybe_rotate(self):
+        now = time.monotonic()
+        if now - self._rotated_at >= self._window / 2 or self._current.count >= self._capacity:
+            self._previous = self._current
+            self._current = BloomFilter(self._capacity, self._error_rate)
+            self._rotated_at = now
+            self.rotations += 1
+
+    def unseen(self, keys: list[bytes | None]) -> list[int]:
+        """Indexes of keys not seen recently (nor earlier in ``keys``); does not record them."""
+        if not self.enabled:
+            return list(range(len(keys)))
+        fresh = []
+        batch_seen = set()
+        duplicates = 0
+        with self._lock:
+            self._maybe_rotate()
+            for i, key in enumerate(keys):
+                if key is None:
+                    fresh.append(i)
+                elif key in batch_seen or key in self._current or key in self._previous:
+                    duplicates += 1
+                else:
+                    batch_seen.add(key)
+                    fresh.append(i)
+            self.duplicates += duplicates
+        return fresh
+
+    def count_duplicates(self, count: int):
+        with self._lock:
+            self.duplicates += count
+
+    def add(self, keys):
+        """Record keys once their events have been accepted."""
+        if not self.enabled:
+            return
+        with self._lock:
+            for key in keys:
+                if key is not None:
+                    self._current.add(key)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "duplicates_dropped": self.duplicates,
+                "keys_current": self._current.count,
+                "keys_previous": self._previous.count,
+                "rotations": self.rotations,
+                "memory_bytes": 2 * len(self._current._bits),
+            }
+
+
+recent_events = RecentKeys(
+    capacity=TELEMETRY_DEDUP_CAPACITY,
+    error_rate=TELEMETRY_DEDUP_ERROR_RATE,
+    window=TELEMETRY_DEDUP_WINDOW,
+)
+
+
+_last_prune = 0.0
+
+
+def claim_keys(conn, rows: list[dict]) -> list[dict]:
+    """Store the rows' ``dedup_key``s and return the rows whose key was new.
+
+    Runs inside the group commit; rows without a key are always kept. The
+    rows are not modified (compact_rows ignores the extra field), so a
+    retried commit claims the same keys again.
+    """
+    global _last_prune
+    keys = [row.get("dedup_key") for row in rows]
+    if not (TELEMETRY_DEDUP_SHARED and recent_events.enabled) or not any(keys):
+        return rows
+
+    now = int(time.time())
+    unique = list(dict.fromkeys(key for key in keys if key is not None))
+    table = DedupKey.__table__
+    new: set[bytes] = set()
+    for start in range(0, len(unique), _CLAIM_CHUNK):
+        chunk = unique[start:start + _CLAIM_CHUNK]
+        stmt = (
+            upsert(conn, table)
+            .values([{"key": key, "seen_at": now} for key in chunk])
+            .on_conflict_do_nothing(index_elements=["key"])
+            .returning(table.c.key)
+        )
+        new.update(bytes(key) for key in conn.execute(stmt).scalars())
+
+    kept = []
+    for row, key in zip(rows, keys):
+        if key is None:
+            kept.append(row)
+        elif key in new:
+            new.discard(key)  # a key repeated within the commit counts once
+            kept.append(row)
+    if len(kept) < len(rows):
+        recent_events.count_duplicates(len(rows) - len(kept))
+
+    if time.monotonic() - _last_prune >= DEDUP_PRUNE_INTERVAL:
+        _last_prune = time.monotonic()
+        conn.execute(delete(table).where(table.c.seen_at < now - TELEMETRY_DEDUP_WINDOW))
+    return kept
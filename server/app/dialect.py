@@ -0,0 +1,112 @@
+"""SQL that differs between the SQLite and PostgreSQL backends.
+
+Expressions are SQLAlchemy constructs compiled per dialect, so queries are
+written once; ``upsert`` and ``bulk_insert`` pick the statement or
+protocol from the connection they run on.
+"""
+
+from sqlalchemy import DateTime, String, insert
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.functions import FunctionElement
+
+
+def is_postgres(conn) -> bool:
+    return conn.dialect.name == "postgresql"
+
+
+# ---------------------------------------------------------------------------
+# Expressions
+# ---------------------------------------------------------------------------
+
+
+class day_of(FunctionElement):
+    """UTC day of a naive-UTC datetime as 'YYYY-MM-DD' (the rollup ``day`` key)."""
+
+    type = String()
+    inherit_cache = True
+
+
+@compiles(day_of)
+def _day_of_sqlite(element, compiler, **kw):
+    return f"date({compiler.process(element.clauses, **kw)})"
+
+
+@compiles(day_of, "postgresql")
+def _day_of_postgres(element, compiler, **kw):
+    return f"to_char(date_trunc('day', {compiler.process(element.clauses, **kw)}), 'YYYY-MM-DD')"
+
+
+class epoch_to_datetime(FunctionElement):
+    """Naive UTC datetime from integer epoch seconds."""
+
+    type = DateTime()
+    inherit_cache = True
+
+
+@compiles(epoch_to_datetime)
+def _epoch_sqlite(element, compiler, **kw):
+    return f"datetime({compiler.process(element.clauses, **kw)}, 'unixepoch')"
+
+
+@compiles(epoch_to_datetime, "postgresql")
+def _epoch_postgres(element, compiler, **kw):
+    return f"(to_timestamp({compiler.process(element.clauses, **kw)}) AT TIME ZONE 'UTC')"
+
+
+class hex_digest(FunctionElement):
+    """Lower-case hex of a binary column."""
+
+    type = String()
+    inherit_cache = True
+
+
+@compiles(hex_digest)
+def _hex_sqlite(element, compiler, **kw):
+    return f"lower(hex({compiler.process(element.clauses, **kw)}))"
+
+
+@compiles(hex_digest, "postgresql")
+def _hex_postgres(element, compiler, **kw):
+    return f"encode({compiler.process(element.clauses, **kw)}, 'hex')"
+
+
+# ---------------------------------------------------------------------------
+# Statements
+# ---------------------------------------------------------------------------
+
+
+def upsert(conn, table):
+    """INSERT supporting ``on_conflict_do_update`` / ``on_conflict_do_nothing``."""
+    return postgresql.insert(table) if is_postgres(conn) else sqlite.insert(table)
+
+
+def bulk_insert(conn, table, rows: list[dict]):
+    """Insert many rows: COPY on PostgreSQL (psycopg 3), executemany elsewhere.
+
+    COPY streams every row in one protocol exchange instead of a prepared
+    INSERT per row; it runs on the connection's own DBAPI connection, so it
+    is part of the surrounding transaction.
+    """
+    if not rows:
+        return
+    if not is_postgres(conn):
+        conn.execute(insert(table), rows)
+        return
+    cursor = conn.connection.dbapi_connection.cursor()
+    if not hasattr(cursor, "copy"):  # psycopg2 or another driver
+        cursor.close()
+        conn.execute(insert(table), rows)
+        return
+    preparer = conn.dialect.identifier_preparer
+    columns = list(rows[0])
+    statement = (
+        f"COPY {preparer.format_table(table)} "
+        f"({', '.join(preparer.quote(column) for column in columns)}) FROM STDIN"
+    )
+    try:
+        with cursor.copy(statement) as copy:
+            for row in rows:
+                copy.write_row([row[column] for column in columns])
+    finally:
+        cursor.close()
@@ -0,0 +1,81 @@
+import os
+import threading
+from collections import OrderedDict
+
+from sqlalchemy import select
+
+from .dialect import upsert
+from .models import DimAppVersion, DimClient, DimEventType, DimOsVersion
+
+# Max ids remembered per dimension table
+DIMENSION_CACHE_SIZE = int(os.environ.get("DIMENSION_CACHE_SIZE", "100000"))
+
+
+class DimensionCache:
+    """In-process LRU of string -> id for one dimension table.
+
+    Misses are resolved in bulk: one SELECT for the missing names, one
+    INSERT .. ON CONFLICT DO NOTHING for names never seen, and a second
+    SELECT for the ids those inserts (or another worker) created.
+    """
+
+    def __init__(self, model, maxsize: int):
+        self._model = model
+        self._maxsize = maxsize
+        self._ids: OrderedDict[str, int] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def clear(self):
+        with self._lock:
+            self._ids.clear()
+
+    def _lookup(self, conn, names: list[str]) -> dict[str, int]:
+        model = self._model
+        return dict(conn.execute(select(model.name, model.id).where(model.name.in_(names))).all())
+
+    def resolve(self, conn, values) -> dict[str, int]:
+        """Ids for every non-null value, creating dimension rows as needed."""
+        result: dict[str, int] = {}
+        missing: list[str] = []
+        with self._lock:
+            for value in set(values):
+                if value is None:
+                    continue
+                cached = self._ids.get(value)
+                if cached is None:
+                    missing.append(value)
+                else:
+                    self._ids.move_to_end(value)
+                    result[value] = cached
+        if not missing:
+            return result
+
+        found = self._lookup(conn, missing)
+        new = [name for name in missing if name not in found]
+        if new:
+            conn.execute(
+                upsert(conn, self._model).on_conflict_do_nothing(),
+                [{"name": name} for name in new],
+            )
+            found.update(self._lookup(conn, new))
+
+        result.update(found)
+        with self._lock:
+            self._ids.update(found)
+            while len(self._ids) > self._maxsize:
+                self._ids.popitem(last=False)
+        return result
+
+
+clients = DimensionCache(DimClient, DIMENSION_CACHE_SIZE)
+event_types = DimensionCache(DimEventType, DIMENSION_CACHE_SIZE)
+app_versions = DimensionCache(DimAppVersion, DIMENSION_CACHE_SIZE)
+os_versions = DimensionCache(DimOsVersion, DIMENSION_CACHE_SIZE)
+
+ALL_CACHES = (clients, event_types, app_versions, os_versions)
+
+
+def clear_caches():
+    """Forget every cached id, e.g. after a rolled-back transaction created some."""
+    for cache in ALL_CACHES:
+        cache.clear()
@@ -0,0 +1,267 @@
+"""Incremental columnar (Parquet) export of raw telemetry, downloads and ad events.
+
+Rows are streamed out of the database in id order, CHUNK_ROWS at a time, and
+written as day-partitioned Parquet files:
+
+  data/export/<dataset>/day=YYYY-MM-DD/part-<table>-<first_id>.parquet
+
+Low-cardinality string columns are dictionary-encoded and known payload
+keys are decoded into typed columns. The last exported id per source
+table is kept in data/export/_state.json, so every run only exports new
+rows. Analyze the files with app.offline instead of the live database.
+Run ``python -m app.partitions migrate`` before the first export: migrated
+legacy and wide-partition rows get new ids in the compact partitions.
+Compact partitions are exported decoded (dimension names, datetime
+timestamps, hex IP hashes), so the Parquet schema does not change.
+
+The id watermark needs rows to become visible in id order. SQLite writers
+are serialized, so they do. On PostgreSQL several workers commit
+concurrently and a lower id can commit after a higher one, so each run
+exports only up to a horizon: the highest ids seen at its start, once every
+transaction that was writing at that moment has finished (see
+``commit_horizons``; the ingest writer takes its transaction id before it
+allocates row ids, so none slips past).
+
+Usage (from server/):
+  python -m app.export
+  python -m app.export --chunk-rows 20000
+"""
+
+import argparse
+import json
+import sys
+import time
+from collections import defaultdict
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    print("ERROR: pyarrow required. Install: pip install -r requirements-analytics.txt")
+    sys.exit(1)
+
+from sqlalchemy import func, select, text
+
+from .database import DATA_DIR, engine
+from .dialect import is_postgres
+from .models import AdImpression, Download
+from .partitions import LEGACY_TABLE, decoded_select, list_partitions, partition_table
+
+EXPORT_DIR = DATA_DIR / "export"
+STATE_FILE = EXPORT_DIR / "_state.json"
+CHUNK_ROWS = 50_000
+# PostgreSQL: seconds to wait for the transactions that were writing when
+# the export started
+EXPORT_SETTLE_TIMEOUT = 30.0
+
+# Payload keys sent by the desktop client (src-tauri/src/commands.rs)
+PAYLOAD_COLUMNS = {
+    "type": pa.string(),
+    "break_type": pa.string(),
+    "duration_sec": pa.int64(),
+    "glasses": pa.int64(),
+    "sound_type": pa.string(),
+    "name": pa.string(),
+}
+
+DICTIONARY_COLUMNS = {
+    "telemetry": ["event_type", "app_version", "os_version", "type", "break_type", "sound_type"],
+    "downloads": ["platform", "source", "language"],
+    "ad_events": ["event_type"],
+}
+
+
+# ---------------------------------------------------------------------------
+# Row -> column conversion
+# ---------------------------------------------------------------------------
+
+
+def _coerce(value, type_):
+    if value is None:
+        return None
+    if pa.types.is_integer(type_):
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
+    return str(value)
+
+
+def _telemetry_columns(rows) -> dict[str, list]:
+    columns: dict[str, list] = defaultdict(list)
+    for row in rows:
+        columns["id"].append(row.id)
+        columns["client_uuid"].append(row.client_uuid)
+        columns["event_type"].append(row.event_type)
+        columns["app_version"].append(row.app_version)
+        columns["os_version"].append(row.os_version)
+        columns["timestamp"].append(row.timestamp)
+        columns["payload"].append(row.payload)
+        try:
+            payload = json.loads(row.payload) if row.payload else {}
+        except ValueError:
+            payload = {}
+        if not isinstance(payload, dict):
+            payload = {}
+        for key, type_ in PAYLOAD_COLUMNS.items():
+            columns[key].append(_coerce(payload.get(key), type_))
+    return columns
+
+
+def _plain_columns(rows, names: list[str]) -> dict[str, list]:
+    columns: dict[str, list] = {name: [] for name in names}
+    for row in rows:
+        for name in names:
+            columns[name].append(getattr(row, name))
+    return columns
+
+
+def _to_table(columns: dict[str, list], dictionary: list[str]) -> pa.Table:
+    arrays = {}
+    for name, values in columns.items():
+        type_ = PAYLOAD_COLUMNS.get(name)
+        if name == "timestamp":
+            type_ = pa.timestamp("us", tz="UTC")
+        array = pa.array(values, type=type_)
+        if pa.types.is_null(array.type):
+            array = array.cast(pa.string())
+        if name in dictionary:
+            array = array.dictionary_encode()
+        arrays[name] = array
+    return pa.table(arrays)
+
+
+# ---------------------------------------------------------------------------
+# Export
+# ---------------------------------------------------------------------------
+
+
+def _load_state() -> dict:
+    if STATE_FILE.exists():
+        return json.loads(STATE_FILE.read_text(encoding="utf-8"))
+    return {}
+
+
+def _save_state(state: dict):
+    tmp = STATE_FILE.with_suffix(".tmp")
+    tmp.write_text(json.dumps(state, indent=2), encoding="utf-8")
+    tmp.replace(STATE_FILE)
+
+
+def _write_chunk(dataset: str, source: str, rows: list, to_columns, state: dict):
+    by_day: dict[str, list] = defaultdict(list)
+    for row in rows:
+        by_day[row.timestamp.strftime("%Y-%m-%d")].append(row)
+    for day, day_rows in by_day.items():
+        out_dir = EXPORT_DIR / dataset / f"day={day}"
+        out_dir.mkdir(parents=True, exist_ok=True)
+        table = _to_table(to_columns(day_rows), DICTIONARY_COLUMNS[dataset])
+        pq.write_table(
+            table,
+            out_dir / f"part-{source}-{day_rows[0].id}.parquet",
+            use_dictionary=DICTIONARY_COLUMNS[dataset],
+            compression="zstd",
+        )
+    # Commit progress only after the chunk's files are on disk
+    state[source] = rows[-1].id
+    _save_state(state)
+
+
+def commit_horizons(
+    conn, tables, timeout: float = EXPORT_SETTLE_TIMEOUT
+) -> dict[str, int] | None:
+    """Highest id per table at or below which no row can still appear (PostgreSQL).
+
+    Takes the current max ids, then waits until every transaction that held
+    a transaction id right after that has finished: any row with a lower id was
+    written by one of them or is already visible. None on SQLite, where
+    commits are serialized and the whole table is safe.
+    """
+    if not is_postgres(conn):
+        return None
+    horizons = {
+        table.name: conn.execute(select(func.coalesce(func.max(table.c.id), 0))).scalar()
+        for table in tables
+    }
+    # Every transaction holding a transaction id locks it until it ends
+    running = text(
+        "SELECT transactionid::text FROM pg_locks "
+        "WHERE locktype = 'transactionid' AND mode = 'ExclusiveLock' AND granted"
+    )
+    writers = set(conn.execute(running).scalars())
+    deadline = time.monotonic() + timeout
+    while writers:
+        if time.monotonic() >= deadline:
+            raise RuntimeError(
+                f"Transactions open since the export started did not finish within {timeout:g}s"
+            )
+        time.sleep(0.1)
+        writers &= set(conn.execute(running).scalars())
+    return horizons
+
+
+def export_table(
+    conn, dataset: str, table, to_columns, state: dict, chunk_rows: int, query=None,
+    horizon: int | None = None,
+) -> int:
+    """Stream rows with last exported id < id <= horizon into Parquet, chunk by chunk."""
+    query = select(table) if query is None else query
+    if horizon is not None:
+        query = query.where(table.c.id <= horizon)
+    exported = 0
+    while True:
+        last_id = state.get(table.name, 0)
+        rows = conn.execute(
+            query.where(table.c.id > last_id).order_by(table.c.id).limit(chunk_rows)
+        ).all()
+        if not rows:
+            return exported
+        _write_chunk(dataset, table.name, rows, to_columns, state)
+        exported += len(rows)
+
+
+def run_export(chunk_rows: int = CHUNK_ROWS) -> dict[str, int]:
+    EXPORT_DIR.mkdir(parents=True, exist_ok=True)
+    state = _load_state()
+    counts: dict[str, int] = defaultdict(int)
+
+    download_cols = ["id", "platform", "source", "language", "timestamp"]
+    ad_cols = ["id", "ad_id", "event_type", "client_uuid", "timestamp"]
+
+    with engine.connect() as conn:
+        tables = [LEGACY_TABLE] + [partition_table(name) for name in list_partitions(conn)]
+        horizons = commit_horizons(conn, tables + [Download.__table__, AdImpression.__table__])
+
+        def horizon(table):
+            return horizons[table.name] if horizons is not None else None
+
+        for table in tables:
+            counts["telemetry"] += export_table(
+                conn, "telemetry", table, _telemetry_columns, state, chunk_rows,
+                query=decoded_select(table), horizon=horizon(table),
+            )
+        counts["downloads"] += export_table(
+            conn, "downloads", Download.__table__,
+            lambda rows: _plain_columns(rows, download_cols), state, chunk_rows,
+            horizon=horizon(Download.__table__),
+        )
+        counts["ad_events"] += export_table(
+            conn, "ad_events", AdImpression.__table__,
+            lambda rows: _plain_columns(rows, ad_cols), state, chunk_rows,
+            horizon=horizon(AdImpression.__table__),
+        )
+    return dict(counts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export telemetry to day-partitioned Parquet")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help="Rows read per chunk")
+    args = parser.parse_args()
+
+    counts = run_export(args.chunk_rows)
+    for dataset, n in counts.items():
+        print(f"{dataset}: {n} new rows")
+
+
+if __name__ == "__main__":
+    main()
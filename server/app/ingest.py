@@ -0,0 +1,346 @@
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+
+from fastapi import HTTPException, status
+from sqlalchemy import DateTime, text
+from sqlalchemy.exc import DBAPIError, OperationalError
+
+from . import dedup, dimensions, metrics, partitions
+from .database import DATA_DIR, Base, engine
+from .dialect import bulk_insert, is_postgres
+from .models import TelemetryEvent
+from .partitions import insert_events
+from .rollups import apply_rollups
+
+log = logging.getLogger("healthdesk.ingest")
+
+# ---------------------------------------------------------------------------
+# Configuration
+# ---------------------------------------------------------------------------
+
+# Max number of pending submissions before clients get 503 (backpressure)
+INGEST_QUEUE_SIZE = int(os.environ.get("INGEST_QUEUE_SIZE", "10000"))
+# Max rows written per group commit
+INGEST_BATCH_SIZE = int(os.environ.get("INGEST_BATCH_SIZE", "500"))
+# Max seconds a row waits in the queue before its group is committed
+INGEST_FLUSH_INTERVAL = float(os.environ.get("INGEST_FLUSH_INTERVAL", "0.5"))
+# How long a request may wait for queue space before it is rejected
+INGEST_PUT_TIMEOUT = float(os.environ.get("INGEST_PUT_TIMEOUT", "0.05"))
+# Pause before the single retry of a group commit that hit a transient error
+INGEST_RETRY_DELAY = float(os.environ.get("INGEST_RETRY_DELAY", "0.5"))
+# Acknowledged rows whose group commit failed for good are appended here
+INGEST_DEAD_LETTER_PATH = Path(
+    os.environ.get("INGEST_DEAD_LETTER_PATH", DATA_DIR / "ingest_dead_letter.jsonl")
+)
+
+
+class QueueFull(Exception):
+    pass
+
+
+# ---------------------------------------------------------------------------
+# Write-behind queue
+# ---------------------------------------------------------------------------
+
+
+class IngestQueue:
+    """In-process write-behind queue with a single background writer thread.
+
+    Request handlers submit ``(model, rows)`` pairs and return immediately.
+    The writer drains the queue and writes everything collected within
+    ``flush_interval`` seconds (or up to ``batch_size`` rows) in one
+    transaction, so many client pings share a single SQLite fsync.
+    """
+
+    def __init__(self, maxsize: int, batch_size: int, flush_interval: float):
+        self._queue: queue.Queue = queue.Queue(maxsize=maxsize)
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+        # Metrics
+        self.submitted_rows = 0
+        self.rejected_rows = 0
+        self.committed_rows = 0
+        self.failed_rows = 0
+        self.retried_commits = 0
+        self.dead_lettered_rows = 0
+        self.commits = 0
+        self.last_commit_ms = 0.0
+        self.max_commit_ms = 0.0
+        self._total_commit_ms = 0.0
+
+    # -- lifecycle ----------------------------------------------------------
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="ingest-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """Stop the writer after flushing everything still queued."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+        # Anything submitted after the writer exited
+        self._drain_remaining()
+
+    # -- producer side ------------------------------------------------------
+
+    def put(self, model, rows: list[dict], timeout: float = INGEST_PUT_TIMEOUT):
+        """Queue rows for ``model``. Raises QueueFull when the queue stays full."""
+        if not rows:
+            return
+        try:
+            self._queue.put((model, rows), timeout=timeout)
+        except queue.Full:
+            with self._lock:
+                self.rejected_rows += len(rows)
+            raise QueueFull()
+        with self._lock:
+            self.submitted_rows += len(rows)
+
+    # -- consumer side ------------------------------------------------------
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._commit(self._collect())
+        self._drain_remaining()
+
+    def _collect(self) -> list[tuple]:
+        """Block for the first item, then gather more until size or time bound."""
+        try:
+            first = self._queue.get(timeout=self._flush_interval)
+        except queue.Empty:
+            return []
+        items = [first]
+        count = len(first[1])
+        deadline = time.monotonic() + self._flush_interval
+        while count < self._batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            items.append(item)
+            count += len(item[1])
+        return items
+
+    def _drain_remaining(self):
+        items = []
+        while True:
+            try:
+                items.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        for start in range(0, len(items), self._batch_size):
+            self._commit(items[start:start + self._batch_size])
+
+    def _commit(self, items: list[tuple]):
+        if not items:
+            return
+
+        by_model: dict = defaultdict(list)
+        for model, rows in items:
+            by_model[model].extend(rows)
+        total = sum(len(rows) for rows in by_model.values())
+
+        start = time.perf_counter()
+        for attempt in (1, 2):
+            try:
+                written = self._write(by_model)
+                break
+            except Exception as exc:
+                # Dimension ids and partitions created in the rolled-back
+                # transaction are gone
+                dimensions.clear_caches()
+                partitions.clear_caches()
+                if attempt == 1 and _is_transient(exc):
+                    log.warning("Group commit of %d rows failed, retrying: %s", total, exc)
+                    with self._lock:
+                        self.retried_commits += 1
+                    time.sleep(INGEST_RETRY_DELAY)
+                    continue
+                log.exception("Group commit of %d rows failed", total)
+                # The rows were already acknowledged with 202; keep them for replay
+                dead_lettered = _dead_letter(by_model, exc)
+                with self._lock:
+                    self.failed_rows += total
+                    self.dead_lettered_rows += dead_lettered
+                return
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        for model, rows in written.items():
+            metrics.record_ingested(model, rows)
+
+        with self._lock:
+            self.committed_rows += total
+            self.commits += 1
+            self.last_commit_ms = elapsed_ms
+            self.max_commit_ms = max(self.max_commit_ms, elapsed_ms)
+            self._total_commit_ms += elapsed_ms
+
+    @staticmethod
+    def _write(by_model: dict) -> dict:
+        """Write all rows in one transaction; returns the rows actually stored per model."""
+        written: dict = {}
+        with engine.begin() as conn:
+            if is_postgres(conn):
+                # Take the transaction id before any row id, so the export's
+                # commit horizon waits for this transaction (export.py)
+                conn.execute(text("SELECT pg_current_xact_id()"))
+            for model, rows in by_model.items():
+                if model is TelemetryEvent:
+                    # Drop events another worker already stored
+                    rows = dedup.claim_keys(conn, rows)
+                    insert_events(conn, rows)
+                else:
+                    bulk_insert(conn, model.__table__, rows)
+                apply_rollups(conn, model, rows)
+                if rows:
+                    written[model] = rows
+        return written
+
+    # -- metrics ------------------------------------------------------------
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "queue_capacity": self._queue.maxsize,
+                "submitted_rows": self.submitted_rows,
+                "rejected_rows": self.rejected_rows,
+                "committed_rows": self.committed_rows,
+                "failed_rows": self.failed_rows,
+                "retried_commits": self.retried_commits,
+                "dead_lettered_rows": self.dead_lettered_rows,
+                "commits": self.commits,
+                "last_commit_ms": round(self.last_commit_ms, 2),
+                "avg_commit_ms": round(self._total_commit_ms / self.commits, 2) if self.commits else 0.0,
+                "max_commit_ms": round(self.max_commit_ms, 2),
+            }
+
+
+# ---------------------------------------------------------------------------
+# Failed commits
+# ---------------------------------------------------------------------------
+
+
+def _is_transient(exc: Exception) -> bool:
+    """SQLite busy/locked or a dropped server connection: worth one more try."""
+    if isinstance(exc, OperationalError):
+        return True
+    return isinstance(exc, DBAPIError) and exc.connection_invalidated
+
+
+def _encode(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, bytes):
+        return value.hex()
+    return value
+
+
+def _dead_letter(by_model: dict, exc: Exception) -> int:
+    """Append the rows of a failed group commit to the dead-letter file, one line per model."""
+    failed_at = datetime.now().isoformat(timespec="seconds")
+    try:
+        INGEST_DEAD_LETTER_PATH.parent.mkdir(parents=True, exist_ok=True)
+        with open(INGEST_DEAD_LETTER_PATH, "a", encoding="utf-8") as f:
+            for model, rows in by_model.items():
+                record = {
+                    "table": model.__tablename__,
+                    "failed_at": failed_at,
+                    "error": repr(exc),
+                    "rows": [{k: _encode(v) for k, v in row.items()} for row in rows],
+                }
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+    except OSError:
+        log.exception("Could not write %s; rows are lost", INGEST_DEAD_LETTER_PATH)
+        return 0
+    return sum(len(rows) for rows in by_model.values())
+
+
+def _decode_rows(model, rows: list[dict]) -> list[dict]:
+    datetime_columns = {c.name for c in model.__table__.columns if isinstance(c.type, DateTime)}
+    for row in rows:
+        for name in datetime_columns & row.keys():
+            if row[name] is not None:
+                row[name] = datetime.fromisoformat(row[name])
+        if row.get("dedup_key") is not None:
+            row["dedup_key"] = bytes.fromhex(row["dedup_key"])
+    return rows
+
+
+def replay_dead_letter(path: Path = INGEST_DEAD_LETTER_PATH) -> tuple[int, int]:
+    """Commit the rows of the dead-letter file again; returns (committed, failed) rows.
+
+    The file is moved aside first, so rows that fail again end up in a
+    fresh dead-letter file instead of being replayed twice.
+    """
+    if not path.exists():
+        return 0, 0
+    replaying = path.with_suffix(path.suffix + ".replaying")
+    path.replace(replaying)
+
+    models = {m.class_.__tablename__: m.class_ for m in Base.registry.mappers}
+    writer = IngestQueue(maxsize=0, batch_size=INGEST_BATCH_SIZE, flush_interval=0)
+    with open(replaying, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            model = models[record["table"]]
+            writer._commit([(model, _decode_rows(model, record["rows"]))])
+    replaying.unlink()
+    return writer.committed_rows, writer.failed_rows
+
+
+ingest_queue = IngestQueue(
+    maxsize=INGEST_QUEUE_SIZE,
+    batch_size=INGEST_BATCH_SIZE,
+    flush_interval=INGEST_FLUSH_INTERVAL,
+)
+
+
+def enqueue(model, rows: list[dict], wait: bool = True):
+    """Submit rows from a request handler; maps a full queue to HTTP 503.
+
+    Async handlers pass ``wait=False``: they run on the event loop, so a
+    full queue is rejected at once instead of blocking every other request.
+    """
+    try:
+        ingest_queue.put(model, rows, timeout=INGEST_PUT_TIMEOUT if wait else 0)
+    except QueueFull:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Ingest queue full, retry later",
+            headers={"Retry-After": "1"},
+        )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    if command == "replay":
+        committed, failed = replay_dead_letter()
+        print(f"Replayed {committed} rows, {failed} failed again")
+    else:
+        print("Usage: python -m app.ingest replay")
+        sys.exit(1)
@@ -1,11 +1,18 @@
 from contextlib import asynccontextmanager
 from pathlib import Path
 
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 
-from .database import DATA_DIR, Base, engine
-from .routers import admin, ads, downloads, telemetry
+from . import metrics
+from .auth import get_metrics_access
+from .database import DATA_DIR, Base, async_engine, engine, wal_checkpointer
+from .ingest import ingest_queue
+from .partitions import create_parent, retention_job
+from .rollups import backfill_if_empty
+from .slowlog import SLOW_QUERY_LOG
+from .routers import admin, admin_api, ads, downloads, telemetry
 
 
 @asynccontextmanager
@@ -13,7 +20,18 @@ async def lifespan(app: FastAPI):
     # Startup: ensure data directory exists and create tables
     DATA_DIR.mkdir(parents=True, exist_ok=True)
     Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        create_parent(conn)
+        backfill_if_empty(conn)
+    ingest_queue.start()
+    wal_checkpointer.start()
+    retention_job.start()
     yield
+    # Shutdown: flush queued events before the process exits
+    ingest_queue.stop()
+    wal_checkpointer.stop()
+    retention_job.stop()
+    await async_engine.dispose()
 
 
 app = FastAPI(title="HealthDesk API", lifespan=lifespan)
@@ -30,6 +48,13 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if metrics.METRICS_ENABLED or SLOW_QUERY_LOG:
+    # Added last so it wraps CORS too and times the whole request; the
+    # slow-query log needs it as well, to know which route ran a statement
+    app.add_middleware(metrics.MetricsMiddleware)
+    metrics.instrument_engine(engine)
+    metrics.instrument_engine(async_engine.sync_engine)
+
 # ---------------------------------------------------------------------------
 # Routers
 # ---------------------------------------------------------------------------
@@ -38,6 +63,7 @@ app.include_router(ads.router)
 app.include_router(downloads.router)
 app.include_router(telemetry.router)
 app.include_router(admin.router)
+app.include_router(admin_api.router)
 
 # ---------------------------------------------------------------------------
 # Health check
@@ -47,3 +73,12 @@ app.include_router(admin.router)
 @app.get("/")
 def health_check():
     return {"status": "ok", "service": "HealthDesk API"}
+
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def metrics_endpoint(_access=Depends(get_metrics_access)):
+    """Prometheus text exposition of the in-process metrics."""
+    return PlainTextResponse(
+        metrics.render({"sync": engine, "async": async_engine.sync_engine}),
+        media_type="text/plain; version=0.0.4; charset=utf-8",
+    )
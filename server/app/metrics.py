@@ -0,0 +1,333 @@
+"""Prometheus-style metrics for the API.
+
+Collected in-process and rendered in the Prometheus text exposition
+format by GET /metrics:
+
+- per-route request latency histograms and status counters (ASGI middleware)
+- DB statement counts and durations, overall and per request (engine hooks)
+- rows ingested per table / event type (ingest writer)
+- connection pool, ingest queue and dedup filter gauges (read at scrape time)
+
+The same engine hooks feed the opt-in slow-query log (see slowlog.py).
+
+Routes are labelled by their path template (``/api/ads/get``), never the
+raw URL, so label cardinality stays bounded.
+
+Metrics are per process. Under ``uvicorn --workers N`` each worker keeps
+its own values and a scrape is answered by whichever worker accepts it,
+so every series carries a ``worker`` label (the process id): series from
+different workers never overwrite each other, and queries should
+aggregate it away, e.g. ``sum without (worker) (rate(...[5m]))``. A
+worker missed by a scrape keeps counting and is picked up by a later one;
+a restarted worker starts new series under its new pid.
+"""
+
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from sqlalchemy import event
+
+from .slowlog import SLOW_QUERY_LOG, slow_queries
+
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "1") != "0"
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+DB_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.1, 0.5, 1.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50)
+
+
+# ---------------------------------------------------------------------------
+# Metric types
+# ---------------------------------------------------------------------------
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: tuple[str, ...], values: tuple) -> str:
+    # Read per call rather than at import: workers may be forked after it
+    names, values = ("worker",) + names, (os.getpid(),) + values
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values)) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help_: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_
+        self.labelnames = labelnames
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: tuple = (), amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_: str, buckets: tuple, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_
+        self.buckets = buckets
+        self.labelnames = labelnames
+        # labels -> [per-bucket counts (+Inf last), sum, count]
+        self._series: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, labels: tuple = ()):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((labels, [list(s[0]), s[1], s[2]]) for labels, s in self._series.items())
+        names = self.labelnames + ("le",)
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + ("+Inf",), counts):
+                cumulative += n
+                lines.append(
+                    f"{self.name}_bucket{_format_labels(names, labels + (bound,))} {cumulative}"
+                )
+            label_str = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_str} {total:.6f}")
+            lines.append(f"{self.name}_count{label_str} {count}")
+        return lines
+
+
+def _sample_lines(name: str, help_: str, type_: str, samples: list[tuple[dict, float]]) -> list[str]:
+    """Lines for a metric whose values are read at scrape time."""
+    lines = [f"# HELP {name} {help_}", f"# TYPE {name} {type_}"]
+    for labels, value in samples:
+        lines.append(f"{name}{_format_labels(tuple(labels), tuple(labels.values()))} {value:g}")
+    return lines
+
+
+# ---------------------------------------------------------------------------
+# Registry
+# ---------------------------------------------------------------------------
+
+http_requests = Counter(
+    "healthdesk_http_requests_total", "HTTP requests by route and status", ("method", "route", "status")
+)
+http_latency = Histogram(
+    "healthdesk_http_request_duration_seconds", "Request latency by route", LATENCY_BUCKETS,
+    ("method", "route"),
+)
+db_statements = Histogram(
+    "healthdesk_db_statement_duration_seconds", "Duration of every DB statement", DB_BUCKETS
+)
+db_time_per_request = Histogram(
+    "healthdesk_db_request_duration_seconds", "DB time spent per request by route", LATENCY_BUCKETS,
+    ("route",),
+)
+db_queries_per_request = Histogram(
+    "healthdesk_db_request_queries", "DB statements per request by route", QUERY_COUNT_BUCKETS,
+    ("route",),
+)
+ingested_rows = Counter(
+    "healthdesk_ingested_rows_total", "Rows committed by the ingest writer", ("table", "event_type")
+)
+
+COLLECTORS = [http_requests, http_latency, db_statements, db_time_per_request,
+              db_queries_per_request, ingested_rows]
+
+# [statements, seconds, ASGI scope] for the request being handled; copied
+# into the threadpool with the context, so sync endpoints add to the same list
+_request_db: ContextVar[list | None] = ContextVar("request_db", default=None)
+
+
+def current_route() -> str | None:
+    """Path template of the route handling the current request, if any."""
+    request_db = _request_db.get()
+    if request_db is None:
+        return None
+    route = request_db[2].get("route")
+    return route.path if route is not None else request_db[2]["path"]
+
+
+# ---------------------------------------------------------------------------
+# Instrumentation
+# ---------------------------------------------------------------------------
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware timing every HTTP request."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status_holder = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status_holder[0] = message["status"]
+            await send(message)
+
+        db = [0, 0.0, scope]
+        token = _request_db.set(db)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            _request_db.reset(token)
+            route = scope.get("route")
+            route_label = route.path if route is not None else "unmatched"
+            method = scope["method"]
+            http_latency.observe(elapsed, (method, route_label))
+            http_requests.inc((method, route_label, status_holder[0]))
+            db_queries_per_request.observe(db[0], (route_label,))
+            if db[0]:
+                db_time_per_request.observe(db[1], (route_label,))
+
+
+def _record_statement(elapsed: float):
+    db_statements.observe(elapsed)
+    request_db = _request_db.get()
+    if request_db is not None:
+        request_db[0] += 1
+        request_db[1] += elapsed
+
+
+# Dialect-level hooks: they run the statement themselves (through the
+# dialect's own method) and return True. Connection-level cursor events
+# would cost ~10x more, since SQLAlchemy joins engine listeners into every
+# new Connection and then dispatches begin/commit/rollback as well.
+
+
+def _do_execute(cursor, statement, parameters, context):
+    start = time.perf_counter()
+    context.dialect.do_execute(cursor, statement, parameters, context)
+    elapsed = time.perf_counter() - start
+    if SLOW_QUERY_LOG and elapsed >= slow_queries.threshold:
+        slow_queries.record(elapsed, cursor, statement, parameters, context, current_route())
+    _record_statement(elapsed)
+    return True
+
+
+def _do_execute_no_params(cursor, statement, context):
+    start = time.perf_counter()
+    context.dialect.do_execute_no_params(cursor, statement, context)
+    elapsed = time.perf_counter() - start
+    if SLOW_QUERY_LOG and elapsed >= slow_queries.threshold:
+        slow_queries.record(elapsed, cursor, statement, (), context, current_route())
+    _record_statement(elapsed)
+    return True
+
+
+def _do_executemany(cursor, statement, parameters, context):
+    start = time.perf_counter()
+    context.dialect.do_executemany(cursor, statement, parameters, context)
+    elapsed = time.perf_counter() - start
+    if SLOW_QUERY_LOG and elapsed >= slow_queries.threshold:
+        slow_queries.record(
+            elapsed, cursor, statement, parameters, context, current_route(), executemany=True
+        )
+    _record_statement(elapsed)
+    return True
+
+
+def instrument_engine(engine):
+    event.listen(engine, "do_execute", _do_execute)
+    event.listen(engine, "do_execute_no_params", _do_execute_no_params)
+    event.listen(engine, "do_executemany", _do_executemany)
+
+
+def record_ingested(model, rows: list[dict]):
+    """Count committed rows; telemetry rows are split by event type."""
+    table = model.__tablename__
+    if "event_type" in rows[0]:
+        per_type: dict[str, int] = {}
+        for row in rows:
+            per_type[row["event_type"]] = per_type.get(row["event_type"], 0) + 1
+        for event_type, n in per_type.items():
+            ingested_rows.inc((table, event_type), n)
+    else:
+        ingested_rows.inc((table, ""), len(rows))
+
+
+# ---------------------------------------------------------------------------
+# Exposition
+# ---------------------------------------------------------------------------
+
+
+def _state_gauges(engines: dict) -> list[str]:
+    from .dedup import recent_events
+    from .ingest import ingest_queue
+
+    pools = [({"pool": name}, engine.pool) for name, engine in engines.items()]
+    queue = ingest_queue.stats()
+    dedup = recent_events.stats()
+    lines = []
+    lines += _sample_lines(
+        "healthdesk_db_pool_size", "Configured pool size", "gauge",
+        [(labels, pool.size()) for labels, pool in pools],
+    )
+    lines += _sample_lines(
+        "healthdesk_db_pool_checked_out", "Connections in use", "gauge",
+        [(labels, pool.checkedout()) for labels, pool in pools],
+    )
+    lines += _sample_lines(
+        "healthdesk_db_pool_overflow", "Overflow connections open", "gauge",
+        [(labels, max(pool.overflow(), 0)) for labels, pool in pools],
+    )
+    lines += _sample_lines(
+        "healthdesk_ingest_queue_depth", "Batches waiting for the writer", "gauge",
+        [({}, queue["queue_depth"])],
+    )
+    lines += _sample_lines(
+        "healthdesk_ingest_rows_total", "Rows seen by the ingest writer by outcome", "counter",
+        [({"outcome": key.removesuffix("_rows")}, queue[key])
+         for key in ("submitted_rows", "rejected_rows", "committed_rows", "failed_rows",
+                     "dead_lettered_rows")],
+    )
+    lines += _sample_lines(
+        "healthdesk_ingest_commits_total", "Group commits", "counter", [({}, queue["commits"])]
+    )
+    lines += _sample_lines(
+        "healthdesk_ingest_last_commit_seconds", "Latency of the last group commit", "gauge",
+        [({}, queue["last_commit_ms"] / 1000)],
+    )
+    lines += _sample_lines(
+        "healthdesk_dedup_duplicates_dropped_total", "Batch events dropped as duplicates", "counter",
+        [({}, dedup["duplicates_dropped"])],
+    )
+    lines += _sample_lines(
+        "healthdesk_dedup_keys", "Keys in the dedup filter generations", "gauge",
+        [({"generation": "current"}, dedup["keys_current"]),
+         ({"generation": "previous"}, dedup["keys_previous"])],
+    )
+    return lines
+
+
+def render(engines: dict) -> str:
+    """Exposition of every collector plus the gauges; ``engines`` maps a
+    ``pool`` label to the engine whose connection pool it reports."""
+    lines = []
+    for collector in COLLECTORS:
+        lines += collector.render()
+    lines += _state_gauges(engines)
+    return "\n".join(lines) + "\n"
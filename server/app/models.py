@@ -1,6 +1,17 @@
 from datetime import datetime, timezone
 
-from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String, Text
+from sqlalchemy import (
+    Boolean,
+    Column,
+    DateTime,
+    Float,
+    ForeignKey,
+    Index,
+    Integer,
+    LargeBinary,
+    String,
+    Text,
+)
 from sqlalchemy.orm import relationship
 
 from .database import Base
@@ -28,8 +39,18 @@ class Ad(Base):
     impressions = relationship("AdImpression", back_populates="ad", lazy="dynamic")
 
 
+# Append-only tables are physically ordered by time, so on PostgreSQL their
+# timestamp indexes are BRIN (a few pages per table instead of a B-tree
+# entry per row). The SQLite schema is unchanged.
+
+
 class AdImpression(Base):
     __tablename__ = "ad_impressions"
+    __table_args__ = (
+        Index("ix_ad_impressions_timestamp", "timestamp", postgresql_using="brin").ddl_if(
+            dialect="postgresql"
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     ad_id = Column(Integer, ForeignKey("ads.id"), nullable=False, index=True)
@@ -43,17 +64,21 @@ class AdImpression(Base):
 
 class Download(Base):
     __tablename__ = "downloads"
+    __table_args__ = (Index("ix_downloads_timestamp", "timestamp", postgresql_using="brin"),)
 
     id = Column(Integer, primary_key=True, index=True)
     platform = Column(String(20), nullable=False)  # windows, macos, linux
     source = Column(String(50), nullable=True)  # utm_source or referrer
     language = Column(String(10), nullable=True)  # browser language
     ip_hash = Column(String(64), nullable=False)
-    timestamp = Column(DateTime, default=_utcnow, nullable=False, index=True)
+    timestamp = Column(DateTime, default=_utcnow, nullable=False)
 
 
 class TelemetryEvent(Base):
     __tablename__ = "telemetry_events"
+    __table_args__ = (
+        Index("ix_telemetry_events_timestamp", "timestamp", postgresql_using="brin"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     client_uuid = Column(String(64), nullable=False, index=True)
@@ -61,5 +86,119 @@ class TelemetryEvent(Base):
     payload = Column(Text, nullable=True)  # JSON text
     app_version = Column(String(20), nullable=True)
     os_version = Column(String(50), nullable=True)
-    timestamp = Column(DateTime, default=_utcnow, nullable=False, index=True)
+    timestamp = Column(DateTime, default=_utcnow, nullable=False)
     ip_hash = Column(String(64), nullable=False)
+
+
+# ---------------------------------------------------------------------------
+# Dashboard rollups (maintained at ingest time, see rollups.py)
+# ---------------------------------------------------------------------------
+
+
+class DailyEventCount(Base):
+    __tablename__ = "daily_event_counts"
+
+    day = Column(String(10), primary_key=True)  # YYYY-MM-DD (UTC)
+    event_type = Column(String(50), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class DailyDownloadCount(Base):
+    __tablename__ = "daily_download_counts"
+
+    day = Column(String(10), primary_key=True)
+    platform = Column(String(20), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+
+class DailyAdCount(Base):
+    __tablename__ = "daily_ad_counts"
+
+    day = Column(String(10), primary_key=True)
+    ad_id = Column(Integer, ForeignKey("ads.id"), primary_key=True)
+    impressions = Column(Integer, nullable=False, default=0)
+    clicks = Column(Integer, nullable=False, default=0)
+
+
+class DailyPayloadCount(Base):
+    """Events per value of an extracted payload field (PAYLOAD_FIELDS in rollups.py).
+
+    ``total`` sums numeric values (glasses logged); it stays 0 for text.
+    """
+
+    __tablename__ = "daily_payload_counts"
+
+    day = Column(String(10), primary_key=True)
+    event_type = Column(String(50), primary_key=True)
+    field = Column(String(50), primary_key=True)
+    value = Column(String(100), primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+    total = Column(Float, nullable=False, default=0)
+
+
+class DailySketch(Base):
+    """HyperLogLog sketch of the clients seen on one day (see hll.py).
+
+    ``dimension`` is "all", "event_type" or "app_version"; ``key`` is the
+    event type or version ("" for "all").
+    """
+
+    __tablename__ = "daily_sketches"
+
+    day = Column(String(10), primary_key=True)
+    dimension = Column(String(20), primary_key=True)
+    key = Column(String(50), primary_key=True)
+    registers = Column(LargeBinary, nullable=False)
+
+
+class DedupKey(Base):
+    """Batch event key stored by the group commit (see dedup.py), shared by
+    every worker process, so a retry that reaches another worker is still
+    recognised."""
+
+    __tablename__ = "telemetry_dedup_keys"
+
+    key = Column(LargeBinary(16), primary_key=True)
+    seen_at = Column(Integer, nullable=False, index=True)  # epoch seconds
+
+
+class AppMeta(Base):
+    """Key/value markers of one-off maintenance steps that already ran."""
+
+    __tablename__ = "app_meta"
+
+    key = Column(String(50), primary_key=True)
+    value = Column(String(100), nullable=False)
+
+
+# ---------------------------------------------------------------------------
+# Interned dimensions for compact telemetry partitions (see dimensions.py)
+# ---------------------------------------------------------------------------
+
+
+class DimClient(Base):
+    __tablename__ = "dim_clients"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(64), nullable=False, unique=True)  # client_uuid
+
+
+class DimEventType(Base):
+    __tablename__ = "dim_event_types"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(50), nullable=False, unique=True)
+
+
+class DimAppVersion(Base):
+    __tablename__ = "dim_app_versions"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(20), nullable=False, unique=True)
+
+
+class DimOsVersion(Base):
+    __tablename__ = "dim_os_versions"
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String(50), nullable=False, unique=True)
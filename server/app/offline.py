@@ -0,0 +1,134 @@
+"""Answer the telemetry dashboard's questions from the Parquet export.
+
+Reads the files written by app.export (never the live database). Only the
+needed columns are read and ``day=`` directories outside the requested
+window are pruned.
+
+Usage (from server/):
+  python -m app.offline
+  python -m app.offline --days 90
+"""
+
+import argparse
+import sys
+from datetime import datetime, timedelta, timezone
+
+try:
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+except ImportError:
+    print("ERROR: pyarrow required. Install: pip install -r requirements-analytics.txt")
+    sys.exit(1)
+
+from .export import EXPORT_DIR
+
+
+def _dataset(name: str):
+    path = EXPORT_DIR / name
+    if not path.exists():
+        return None
+    return ds.dataset(path, format="parquet", partitioning="hive")
+
+
+def _day(days_ago: int) -> str:
+    today = datetime.now(timezone.utc).date()
+    return (today - timedelta(days=days_ago)).isoformat()
+
+
+def _read(name: str, columns: list[str], since_day: str | None = None, filter_=None):
+    dataset = _dataset(name)
+    if dataset is None:
+        return None
+    expr = filter_
+    if since_day:
+        day_expr = ds.field("day") >= since_day
+        expr = day_expr if expr is None else expr & day_expr
+    return dataset.to_table(columns=columns, filter=expr)
+
+
+def _count_by(table, column: str, limit: int | None = None) -> list[tuple[str, int]]:
+    """(value, rows) pairs, most frequent first; dictionary columns are decoded."""
+    index = table.schema.get_field_index(column)
+    table = table.set_column(index, column, pc.cast(table[column], "string"))
+    grouped = table.group_by(column).aggregate([(column, "count")])
+    pairs = zip(grouped[column].to_pylist(), grouped[f"{column}_count"].to_pylist())
+    return sorted(pairs, key=lambda kv: -kv[1])[:limit]
+
+
+def unique_clients(since_day: str) -> int:
+    table = _read("telemetry", ["client_uuid"], since_day)
+    if table is None or table.num_rows == 0:
+        return 0
+    return pc.count_distinct(table["client_uuid"]).as_py()
+
+
+def events_per_day(since_day: str) -> list[tuple[str, int]]:
+    table = _read("telemetry", ["day"], since_day)
+    if table is None:
+        return []
+    return sorted(_count_by(table, "day"))
+
+
+def common_events(limit: int = 10) -> list[tuple[str, int]]:
+    table = _read("telemetry", ["event_type"])
+    if table is None:
+        return []
+    return _count_by(table, "event_type", limit)
+
+
+def app_versions(since_day: str | None = None, limit: int = 10) -> list[tuple[str, int]]:
+    table = _read(
+        "telemetry", ["app_version", "client_uuid"], since_day, ds.field("app_version").is_valid()
+    )
+    if table is None:
+        return []
+    index = table.schema.get_field_index("app_version")
+    table = table.set_column(index, "app_version", pc.cast(table["app_version"], "string"))
+    grouped = table.group_by("app_version").aggregate([("client_uuid", "count_distinct")])
+    users = grouped["client_uuid_count_distinct"].to_pylist()
+    pairs = zip(grouped["app_version"].to_pylist(), users)
+    return sorted(pairs, key=lambda kv: -kv[1])[:limit]
+
+
+def downloads_by_platform() -> list[tuple[str, int]]:
+    table = _read("downloads", ["platform"])
+    if table is None:
+        return []
+    return _count_by(table, "platform")
+
+
+def payload_values(event_type: str, column: str, since_day: str | None = None) -> list[tuple]:
+    """Counts of a decoded payload column, e.g. ("audio_play", "sound_type")."""
+    table = _read("telemetry", [column], since_day, ds.field("event_type") == event_type)
+    if table is None:
+        return []
+    return _count_by(table, column)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline telemetry summary from Parquet export")
+    parser.add_argument("--days", type=int, default=30, help="Window for daily series and MAU")
+    args = parser.parse_args()
+
+    print(f"DAU: {unique_clients(_day(0))}")
+    print(f"WAU: {unique_clients(_day(7))}")
+    print(f"MAU ({args.days}d): {unique_clients(_day(args.days))}")
+    print("\nEvents per day:")
+    for day, count in events_per_day(_day(args.days)):
+        print(f"  {day}  {count}")
+    print("\nMost common events:")
+    for event_type, count in common_events():
+        print(f"  {event_type:<15} {count}")
+    print("\nApp versions (users):")
+    for version, users in app_versions(_day(args.days)):
+        print(f"  {version:<10} {users}")
+    print("\nDownloads by platform:")
+    for platform, count in downloads_by_platform():
+        print(f"  {platform:<10} {count}")
+    print("\nAudio by sound_type:")
+    for sound_type, count in payload_values("audio_play", "sound_type", _day(args.days)):
+        print(f"  {sound_type:<10} {count}")
+
+
+if __name__ == "__main__":
+    main()
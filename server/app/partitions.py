@@ -0,0 +1,517 @@
+"""Monthly partitions for telemetry events.
+
+New events are written to one table per UTC month
+(``telemetry_events_YYYY_MM``) in a compact layout: client, event type,
+app version and OS are integer ids into the dim_* tables (see
+dimensions.py), the timestamp is integer epoch seconds and the IP hash is
+the raw 32-byte digest. The original wide ``telemetry_events`` table is
+kept as the "legacy" partition for rows ingested before partitioning.
+
+Range queries go through ``events_between``, which only touches the
+partitions overlapping the range and decodes rows back to the
+TelemetryEvent column names, and retention drops whole partitions instead
+of running a DELETE.
+
+On PostgreSQL the monthly tables are native range partitions (on ``ts``)
+of ``telemetry_events_by_month``: rows are COPYed into the parent, range
+queries hit the parent and rely on partition pruning, and ``ts`` has a
+BRIN index. Expired partitions are archived into the ``archive`` schema.
+
+Maintenance commands:
+  python -m app.partitions list
+  python -m app.partitions migrate     # convert legacy/wide rows to compact partitions
+  python -m app.partitions retention   # archive + drop expired partitions
+"""
+
+import calendar
+import logging
+import os
+import re
+import sys
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    Identity,
+    Index,
+    Integer,
+    LargeBinary,
+    MetaData,
+    Table,
+    Text,
+    func,
+    inspect,
+    literal,
+    literal_column,
+    select,
+    text,
+    union_all,
+)
+
+from . import dimensions
+from .database import DATA_DIR, engine
+from .dialect import bulk_insert, epoch_to_datetime, hex_digest, is_postgres, upsert
+from .models import AppMeta, DimAppVersion, DimClient, DimEventType, DimOsVersion, TelemetryEvent
+
+log = logging.getLogger("healthdesk.partitions")
+
+# Months of raw telemetry kept online (current month included); 0 keeps all
+TELEMETRY_RETENTION_MONTHS = int(os.environ.get("TELEMETRY_RETENTION_MONTHS", "13"))
+# Copy expired partitions to data/archive/<partition>.db (PostgreSQL: the
+# archive schema) before dropping them
+TELEMETRY_ARCHIVE = os.environ.get("TELEMETRY_ARCHIVE", "1") == "1"
+ARCHIVE_DIR = DATA_DIR / "archive"
+# Seconds between background retention runs
+TELEMETRY_RETENTION_INTERVAL = float(os.environ.get("TELEMETRY_RETENTION_INTERVAL", "86400"))
+# app_meta key holding when retention last dropped a partition; writing it
+# first serializes the workers' retention runs
+RETENTION_MARKER = "retention_last_drop"
+
+LEGACY_TABLE = TelemetryEvent.__table__
+PARTITION_PREFIX = "telemetry_events_"
+# PostgreSQL: partitioned parent of the monthly tables
+PARENT_TABLE = "telemetry_events_by_month"
+_PARTITION_RE = re.compile(r"^telemetry_events_(\d{4})_(\d{2})$")
+
+# Rows copied per chunk by the migration
+MIGRATE_CHUNK_ROWS = 20_000
+
+_metadata = MetaData()
+_tables: dict[str, Table] = {}
+_created: set[str] = set()
+_lock = threading.Lock()
+
+
+# ---------------------------------------------------------------------------
+# Naming / table objects
+# ---------------------------------------------------------------------------
+
+
+def partition_name(ts: datetime) -> str:
+    return f"{PARTITION_PREFIX}{ts.year:04d}_{ts.month:02d}"
+
+
+def partition_month(name: str) -> tuple[int, int] | None:
+    match = _PARTITION_RE.match(name)
+    return (int(match.group(1)), int(match.group(2))) if match else None
+
+
+def _compact_table(name: str) -> Table:
+    return Table(
+        name,
+        _metadata,
+        Column("id", Integer, primary_key=True),
+        Column("client_id", Integer, nullable=False),
+        Column("event_type_id", Integer, nullable=False),
+        Column("app_version_id", Integer, nullable=True),
+        Column("os_version_id", Integer, nullable=True),
+        Column("ts", BigInteger, nullable=False),  # epoch seconds, UTC
+        Column("ip_hash", LargeBinary(32), nullable=False),  # raw SHA-256 digest
+        Column("payload", Text, nullable=True),  # JSON text
+        Index(f"ix_{name}_client_id", "client_id"),
+        Index(f"ix_{name}_event_type_id", "event_type_id"),
+        Index(f"ix_{name}_ts", "ts"),
+    )
+
+
+def partition_table(name: str) -> Table:
+    """Table object for a compact monthly partition."""
+    table = _tables.get(name)
+    if table is None:
+        with _lock:
+            table = _tables.get(name)
+            if table is None:
+                table = _compact_table(name)
+                _tables[name] = table
+    return table
+
+
+# PostgreSQL only. The partition key has to be part of the primary key, and
+# indexes declared here are created on every partition.
+parent_table = Table(
+    PARENT_TABLE,
+    _metadata,
+    Column("id", BigInteger, Identity(), primary_key=True),
+    Column("client_id", Integer, nullable=False),
+    Column("event_type_id", Integer, nullable=False),
+    Column("app_version_id", Integer, nullable=True),
+    Column("os_version_id", Integer, nullable=True),
+    Column("ts", BigInteger, primary_key=True),
+    Column("ip_hash", LargeBinary(32), nullable=False),
+    Column("payload", Text, nullable=True),
+    Index(f"ix_{PARENT_TABLE}_client_id", "client_id"),
+    Index(f"ix_{PARENT_TABLE}_event_type_id", "event_type_id"),
+    Index(f"ix_{PARENT_TABLE}_ts", "ts", postgresql_using="brin"),
+    postgresql_partition_by="RANGE (ts)",
+)
+
+
+def create_parent(conn):
+    """Create the partitioned parent table on PostgreSQL (no-op on SQLite)."""
+    if is_postgres(conn):
+        parent_table.create(conn, checkfirst=True)
+
+
+def _month_bounds(name: str) -> tuple[int, int]:
+    """Epoch seconds of the first second of the partition's month and the next."""
+    year, month = partition_month(name)
+    next_year, next_month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return (
+        calendar.timegm((year, month, 1, 0, 0, 0)),
+        calendar.timegm((next_year, next_month, 1, 0, 0, 0)),
+    )
+
+
+def ensure_partition(conn, name: str) -> Table:
+    table = partition_table(name)
+    if name in _created:
+        return table
+    if is_postgres(conn):
+        # Serialize creation across workers: concurrent CREATE .. PARTITION OF
+        # of the same table can fail instead of waiting
+        conn.execute(text("SELECT pg_advisory_xact_lock(hashtext(:name))"), {"name": name})
+        parent_table.create(conn, checkfirst=True)
+        lo, hi = _month_bounds(name)
+        conn.exec_driver_sql(
+            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {PARENT_TABLE} "
+            f"FOR VALUES FROM ({lo}) TO ({hi})"
+        )
+    else:
+        table.create(conn, checkfirst=True)
+    _created.add(name)
+    return table
+
+
+def clear_caches():
+    """Forget which partitions exist, e.g. after a rolled-back transaction created some."""
+    with _lock:
+        _created.clear()
+
+
+def list_partitions(conn) -> list[str]:
+    """Existing partition table names, oldest first."""
+    if is_postgres(conn):
+        query = text(
+            "SELECT tablename FROM pg_tables "
+            "WHERE schemaname = current_schema() AND tablename LIKE :prefix"
+        )
+    else:
+        query = text("SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE :prefix")
+    names = conn.execute(query, {"prefix": f"{PARTITION_PREFIX}%"}).scalars()
+    return sorted(name for name in names if partition_month(name))
+
+
+# ---------------------------------------------------------------------------
+# Write path
+# ---------------------------------------------------------------------------
+
+
+def _epoch(ts: datetime) -> int:
+    """Epoch seconds; naive datetimes are UTC, like everything stored here."""
+    return calendar.timegm(ts.utctimetuple())
+
+
+def compact_rows(conn, rows: list[dict]) -> list[dict]:
+    """Convert TelemetryEvent-shaped dicts into compact partition rows."""
+    client_ids = dimensions.clients.resolve(conn, (r["client_uuid"] for r in rows))
+    type_ids = dimensions.event_types.resolve(conn, (r["event_type"] for r in rows))
+    version_ids = dimensions.app_versions.resolve(conn, (r["app_version"] for r in rows))
+    os_ids = dimensions.os_versions.resolve(conn, (r["os_version"] for r in rows))
+    return [
+        {
+            "client_id": client_ids[r["client_uuid"]],
+            "event_type_id": type_ids[r["event_type"]],
+            "app_version_id": version_ids.get(r["app_version"]),
+            "os_version_id": os_ids.get(r["os_version"]),
+            "ts": _epoch(r["timestamp"]),
+            "ip_hash": bytes.fromhex(r["ip_hash"]),
+            "payload": r["payload"],
+        }
+        for r in rows
+    ]
+
+
+def insert_events(conn, rows: list[dict]):
+    """Insert TelemetryEvent-shaped rows into their compact monthly partitions."""
+    by_partition: dict[str, list[dict]] = {}
+    for row in rows:
+        by_partition.setdefault(partition_name(row["timestamp"]), []).append(row)
+    if is_postgres(conn):
+        # One COPY into the parent; PostgreSQL routes rows to their partition
+        for name in by_partition:
+            ensure_partition(conn, name)
+        bulk_insert(conn, parent_table, compact_rows(conn, rows))
+        return
+    for name, partition_rows in by_partition.items():
+        table = ensure_partition(conn, name)
+        bulk_insert(conn, table, compact_rows(conn, partition_rows))
+
+
+# ---------------------------------------------------------------------------
+# Query router
+# ---------------------------------------------------------------------------
+
+
+def _month_index(year: int, month: int) -> int:
+    return year * 12 + month - 1
+
+
+def partitions_for_range(
+    conn, start: datetime | None = None, end: datetime | None = None
+) -> list[Table]:
+    """Partitions that can hold rows with start <= timestamp < end."""
+    lo = _month_index(start.year, start.month) if start else None
+    hi = _month_index(end.year, end.month) if end else None
+    tables = []
+    for name in list_partitions(conn):
+        index = _month_index(*partition_month(name))
+        if (lo is None or index >= lo) and (hi is None or index <= hi):
+            tables.append(partition_table(name))
+    return tables
+
+
+def decoded_select(table: Table, with_partition: bool = True):
+    """SELECT over a partition (or the legacy table) with TelemetryEvent columns.
+
+    Compact partitions are joined back to their dimension tables; the
+    result has id, client_uuid, event_type, payload, app_version,
+    os_version, timestamp, ip_hash (hex) and, unless disabled, partition
+    (source table name; for the PostgreSQL parent, the partition each row
+    lives in).
+    """
+    if not with_partition:
+        extra = []
+    elif table is parent_table:
+        extra = [literal_column(f"{PARENT_TABLE}.tableoid::regclass::text").label("partition")]
+    else:
+        extra = [literal(table.name).label("partition")]
+    if table is LEGACY_TABLE:
+        return select(*table.c, *extra)
+    return select(
+        table.c.id,
+        DimClient.name.label("client_uuid"),
+        DimEventType.name.label("event_type"),
+        table.c.payload,
+        DimAppVersion.name.label("app_version"),
+        DimOsVersion.name.label("os_version"),
+        epoch_to_datetime(table.c.ts).label("timestamp"),
+        hex_digest(table.c.ip_hash).label("ip_hash"),
+        *extra,
+    ).select_from(
+        table.join(DimClient, DimClient.id == table.c.client_id)
+        .join(DimEventType, DimEventType.id == table.c.event_type_id)
+        .outerjoin(DimAppVersion, DimAppVersion.id == table.c.app_version_id)
+        .outerjoin(DimOsVersion, DimOsVersion.id == table.c.os_version_id)
+    )
+
+
+def events_between(conn, start: datetime | None = None, end: datetime | None = None):
+    """Subquery over the legacy table plus only the partitions in range.
+
+    Has the TelemetryEvent columns plus ``partition`` (source table name).
+    """
+    legacy = decoded_select(LEGACY_TABLE)
+    if start:
+        legacy = legacy.where(LEGACY_TABLE.c.timestamp >= start)
+    if end:
+        legacy = legacy.where(LEGACY_TABLE.c.timestamp < end)
+    selects = [legacy]
+    # PostgreSQL prunes partitions of the parent by the ts range itself
+    tables = [parent_table] if is_postgres(conn) else partitions_for_range(conn, start, end)
+    for table in tables:
+        query = decoded_select(table)
+        if start:
+            query = query.where(table.c.ts >= _epoch(start))
+        if end:
+            query = query.where(table.c.ts < _epoch(end))
+        selects.append(query)
+    return union_all(*selects).subquery("events")
+
+
+# ---------------------------------------------------------------------------
+# Maintenance
+# ---------------------------------------------------------------------------
+
+
+def _is_wide(conn, name: str) -> bool:
+    return "client_uuid" in {c["name"] for c in inspect(conn).get_columns(name)}
+
+
+def _copy_wide_rows(conn, source: Table) -> int:
+    """Stream rows of a wide table into compact partitions, chunk by chunk."""
+    columns = [c for c in source.c if c.name != "id"]
+    copied = 0
+    last_id = 0
+    while True:
+        chunk = conn.execute(
+            select(source.c.id, *columns)
+            .where(source.c.id > last_id)
+            .order_by(source.c.id)
+            .limit(MIGRATE_CHUNK_ROWS)
+        ).all()
+        if not chunk:
+            return copied
+        insert_events(conn, [row._asdict() for row in chunk])
+        last_id = chunk[-1].id
+        copied += len(chunk)
+
+
+def migrate_to_compact(conn) -> int:
+    """Convert the legacy table and any wide-schema partitions to compact partitions.
+
+    Wide partitions (created before the compact layout) are renamed out of
+    the way, their rows re-inserted through the normal write path, and the
+    old tables dropped. Returns the number of rows converted.
+    """
+    wide = []
+    for name in list_partitions(conn):
+        if _is_wide(conn, name):
+            conn.exec_driver_sql(f"ALTER TABLE {name} RENAME TO {name}_wide")
+            _created.discard(name)
+            wide.append(LEGACY_TABLE.to_metadata(MetaData(), name=f"{name}_wide"))
+
+    converted = _copy_wide_rows(conn, LEGACY_TABLE)
+    conn.execute(LEGACY_TABLE.delete())
+    for table in wide:
+        converted += _copy_wide_rows(conn, table)
+        table.drop(conn)
+    return converted
+
+
+def expired_partitions(conn, now: datetime | None = None) -> list[str]:
+    if TELEMETRY_RETENTION_MONTHS <= 0:
+        return []
+    now = now or datetime.now(timezone.utc)
+    cutoff = _month_index(now.year, now.month) - TELEMETRY_RETENTION_MONTHS + 1
+    return [
+        name for name in list_partitions(conn) if _month_index(*partition_month(name)) < cutoff
+    ]
+
+
+def _archive_select(conn, name: str) -> str:
+    """SELECT for an archived partition: decoded, so the archive needs no dim_* tables."""
+    if _is_wide(conn, name):
+        return f"SELECT * FROM main.{name}"
+    query = decoded_select(partition_table(name), with_partition=False)
+    return str(query.compile(conn, compile_kwargs={"literal_binds": True}))
+
+
+@contextmanager
+def _archive_attached(conn, name: str):
+    """ATTACH data/archive/<name>.db for ``_archive`` on SQLite.
+
+    Used around the transaction, since SQLite cannot detach a database
+    inside the transaction that wrote to it.
+    """
+    if is_postgres(conn) or not TELEMETRY_ARCHIVE:
+        yield
+        return
+    ARCHIVE_DIR.mkdir(parents=True, exist_ok=True)
+    conn.exec_driver_sql("ATTACH DATABASE ? AS archive", (str(ARCHIVE_DIR / f"{name}.db"),))
+    conn.commit()
+    try:
+        yield
+    finally:
+        conn.exec_driver_sql("DETACH DATABASE archive")
+        conn.commit()
+
+
+def _archive(conn, name: str):
+    """Copy a partition, decoded, to data/archive/<name>.db (SQLite, attached by
+    ``_archive_attached``) or the ``archive`` schema (PostgreSQL)."""
+    if is_postgres(conn):
+        conn.exec_driver_sql("CREATE SCHEMA IF NOT EXISTS archive")
+    conn.exec_driver_sql(
+        f"CREATE TABLE IF NOT EXISTS archive.{name} AS {_archive_select(conn, name)}"
+    )
+
+
+def apply_retention(now: datetime | None = None) -> list[str]:
+    """Archive (optionally) and drop every partition past the retention window.
+
+    Dropping a partition is a single DROP TABLE, independent of how many
+    index entries a row-by-row DELETE would have to maintain.
+
+    Every worker runs this at startup. Each drop first writes the
+    RETENTION_MARKER row, which holds the row (PostgreSQL) or database
+    (SQLite) write lock until commit, so concurrent runs take turns and
+    skip partitions another worker already dropped.
+    """
+    dropped = []
+    with engine.begin() as conn:
+        names = expired_partitions(conn, now)
+    for name in names:
+        with engine.connect() as conn, _archive_attached(conn, name):
+            with conn.begin():
+                stamp = datetime.now(timezone.utc).isoformat(timespec="seconds")
+                conn.execute(
+                    upsert(conn, AppMeta)
+                    .values(key=RETENTION_MARKER, value=stamp)
+                    .on_conflict_do_update(index_elements=["key"], set_={"value": stamp})
+                )
+                if name not in list_partitions(conn):
+                    continue
+                if TELEMETRY_ARCHIVE:
+                    _archive(conn, name)
+                # On PostgreSQL this detaches the partition from the parent too
+                conn.exec_driver_sql(f"DROP TABLE {name}")
+        _created.discard(name)
+        dropped.append(name)
+        log.info("Dropped telemetry partition %s (archived=%s)", name, TELEMETRY_ARCHIVE)
+    return dropped
+
+
+class RetentionJob:
+    """Background thread applying the retention policy periodically."""
+
+    def __init__(self, interval: float):
+        self._interval = interval
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self):
+        if self._interval <= 0 or TELEMETRY_RETENTION_MONTHS <= 0:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="telemetry-retention", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(5)
+            self._thread = None
+
+    def _run(self):
+        while True:
+            try:
+                apply_retention()
+            except Exception:
+                log.exception("Telemetry retention failed")
+            if self._stop.wait(self._interval):
+                break
+
+
+retention_job = RetentionJob(TELEMETRY_RETENTION_INTERVAL)
+
+
+if __name__ == "__main__":
+    command = sys.argv[1] if len(sys.argv) > 1 else "list"
+    if command == "list":
+        with engine.connect() as conn:
+            for name in list_partitions(conn):
+                count = conn.execute(
+                    select(func.count()).select_from(partition_table(name))
+                ).scalar()
+                print(f"{name}  {count} rows")
+    elif command == "migrate":
+        with engine.begin() as conn:
+            print(f"Converted {migrate_to_compact(conn)} rows into compact partitions")
+    elif command == "retention":
+        print("Dropped:", ", ".join(apply_retention()) or "nothing")
+    else:
+        print(f"Unknown command: {command}")
+        sys.exit(1)
@@ -0,0 +1,381 @@
+"""Incremental daily rollups behind the telemetry dashboard.
+
+The ingest writer calls ``apply_rollups`` inside the same transaction as
+the raw insert, so the rollup tables never drift from the raw tables.
+``rebuild_rollups`` recomputes everything from scratch (backfill of an
+existing database, or repair) and can be run as ``python -m app.rollups``.
+
+Payload fields listed in PAYLOAD_FIELDS are rolled up per value into
+daily_payload_counts at ingest, so payload questions ("which sound_type
+is played most", "glasses logged per day") read a few rows per day
+instead of parsing every event's JSON.
+"""
+
+import json
+import os
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+
+from sqlalchemy import case, delete, func, select, text, tuple_
+
+from .dialect import day_of, is_postgres, upsert
+from .hll import HyperLogLog
+from .models import (
+    AdImpression,
+    AppMeta,
+    DailyAdCount,
+    DailyDownloadCount,
+    DailyEventCount,
+    DailyPayloadCount,
+    DailySketch,
+    Download,
+    TelemetryEvent,
+)
+from .partitions import events_between, list_partitions
+
+ROLLUP_MODELS = (
+    DailyEventCount, DailyDownloadCount, DailyAdCount, DailySketch, DailyPayloadCount
+)
+
+
+def _parse_payload_fields(spec: str) -> dict[str, tuple[str, ...]]:
+    fields: dict[str, list[str]] = defaultdict(list)
+    for item in spec.split(","):
+        event_type, _, field = item.strip().partition(".")
+        if event_type and field:
+            fields[event_type].append(field)
+    return {event_type: tuple(names) for event_type, names in fields.items()}
+
+
+# "event_type.field" pairs rolled up per value (keys the desktop client
+# sends, see src-tauri/src/commands.rs). Changing the list affects new
+# events only; run ``python -m app.rollups`` to apply it to history.
+PAYLOAD_FIELDS = _parse_payload_fields(
+    os.environ.get(
+        "PAYLOAD_FIELDS",
+        "break_taken.break_type,break_skipped.break_type,exercise_done.type,"
+        "audio_play.sound_type,audio_play.name,water_logged.glasses",
+    )
+)
+# Longer values (free-form track names) are cut to the column size
+_MAX_VALUE_CHARS = 100
+# app_meta key set once the startup backfill has checked the database
+BACKFILL_MARKER = "rollups_backfilled"
+
+
+def _day(row: dict) -> str:
+    return row["timestamp"].strftime("%Y-%m-%d")
+
+
+def _add_counts(conn, model, key_columns: tuple[str, ...], counts: Counter):
+    if not counts:
+        return
+    stmt = upsert(conn, model)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(key_columns),
+        set_={"count": model.count + stmt.excluded.count},
+    )
+    conn.execute(
+        stmt,
+        [{**dict(zip(key_columns, key)), "count": n} for key, n in counts.items()],
+    )
+
+
+def _add_ad_counts(conn, rows: list[dict]):
+    counts: dict[tuple, list[int]] = defaultdict(lambda: [0, 0])
+    for r in rows:
+        index = 1 if r["event_type"] == "click" else 0
+        counts[(_day(r), r["ad_id"])][index] += 1
+    stmt = upsert(conn, DailyAdCount)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["day", "ad_id"],
+        set_={
+            "impressions": DailyAdCount.impressions + stmt.excluded.impressions,
+            "clicks": DailyAdCount.clicks + stmt.excluded.clicks,
+        },
+    )
+    conn.execute(
+        stmt,
+        [
+            {"day": day, "ad_id": ad_id, "impressions": impressions, "clicks": clicks}
+            for (day, ad_id), (impressions, clicks) in counts.items()
+        ],
+    )
+
+
+def _sketch_keys(day: str, event_type: str, app_version: str | None):
+    yield (day, "all", "")
+    yield (day, "event_type", event_type)
+    if app_version:
+        yield (day, "app_version", app_version)
+
+
+def _add_sketches(conn, groups: dict[tuple, set[str]]):
+    """Merge new client ids into the stored sketches (read-modify-write).
+
+    On PostgreSQL several workers commit concurrently, so each sketch is
+    locked for the rest of the transaction before it is read; otherwise the
+    later writer would overwrite the earlier one's clients. SQLite already
+    holds the database write lock here.
+    """
+    if not groups:
+        return
+    if is_postgres(conn):
+        # Acquired in sorted order, so two commits cannot deadlock on them
+        conn.execute(
+            text(
+                "SELECT pg_advisory_xact_lock(hashtext(k)) "
+                "FROM (SELECT unnest(CAST(:keys AS text[])) AS k ORDER BY 1) AS ordered"
+            ),
+            {"keys": ["daily_sketches/" + "/".join(key) for key in groups]},
+        )
+    sketches = {
+        (row.day, row.dimension, row.key): HyperLogLog.from_bytes(row.registers)
+        for row in conn.execute(
+            select(DailySketch).where(
+                tuple_(DailySketch.day, DailySketch.dimension, DailySketch.key).in_(list(groups))
+            )
+        )
+    }
+    for key, clients in groups.items():
+        sketches.setdefault(key, HyperLogLog()).update(clients)
+    _write_sketches(conn, {key: sketches[key] for key in groups})
+
+
+def _write_sketches(conn, sketches: dict[tuple, HyperLogLog]):
+    if not sketches:
+        return
+    stmt = upsert(conn, DailySketch)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["day", "dimension", "key"],
+        set_={"registers": stmt.excluded.registers},
+    )
+    conn.execute(
+        stmt,
+        [
+            {"day": day, "dimension": dimension, "key": key, "registers": hll.to_bytes()}
+            for (day, dimension, key), hll in sketches.items()
+        ],
+    )
+
+
+def _payload_values(event_type: str, payload: str | None):
+    """(field, value, numeric) for the configured fields present in a payload."""
+    fields = PAYLOAD_FIELDS.get(event_type)
+    if not fields or not payload:
+        return
+    try:
+        data = json.loads(payload)
+    except ValueError:
+        return
+    if not isinstance(data, dict):
+        return
+    for field in fields:
+        value = data.get(field)
+        if value is None or isinstance(value, (dict, list)):
+            continue
+        if isinstance(value, bool):
+            yield field, str(value).lower(), 0
+        elif isinstance(value, (int, float)):
+            yield field, str(value), value
+        else:
+            yield field, str(value)[:_MAX_VALUE_CHARS], 0
+
+
+def _count_payloads(counts: dict[tuple, list], day: str, event_type: str, payload: str | None):
+    for field, value, numeric in _payload_values(event_type, payload):
+        entry = counts[(day, event_type, field, value)]
+        entry[0] += 1
+        entry[1] += numeric
+
+
+def _add_payload_counts(conn, counts: dict[tuple, list]):
+    if not counts:
+        return
+    stmt = upsert(conn, DailyPayloadCount)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["day", "event_type", "field", "value"],
+        set_={
+            "count": DailyPayloadCount.count + stmt.excluded.count,
+            "total": DailyPayloadCount.total + stmt.excluded.total,
+        },
+    )
+    conn.execute(
+        stmt,
+        [
+            {"day": day, "event_type": event_type, "field": field, "value": value,
+             "count": count, "total": total}
+            for (day, event_type, field, value), (count, total) in counts.items()
+        ],
+    )
+
+
+def rebuild_payload_counts(conn):
+    """Recompute daily_payload_counts from the raw events of the configured types."""
+    conn.execute(delete(DailyPayloadCount))
+    if not PAYLOAD_FIELDS:
+        return
+    events = events_between(conn)
+    rows = conn.execute(
+        select(day_of(events.c.timestamp), events.c.event_type, events.c.payload)
+        .where(events.c.event_type.in_(list(PAYLOAD_FIELDS))),
+        execution_options={"yield_per": 10_000},
+    )
+    counts: dict[tuple, list] = defaultdict(lambda: [0, 0])
+    for day, event_type, payload in rows:
+        _count_payloads(counts, day, event_type, payload)
+    _add_payload_counts(conn, counts)
+
+
+def apply_rollups(conn, model, rows: list[dict]):
+    """Fold freshly inserted raw rows into the rollup tables."""
+    if model is TelemetryEvent:
+        event_counts = Counter((_day(r), r["event_type"]) for r in rows)
+        groups: dict[tuple, set[str]] = defaultdict(set)
+        for r in rows:
+            for key in _sketch_keys(_day(r), r["event_type"], r["app_version"]):
+                groups[key].add(r["client_uuid"])
+        _add_counts(conn, DailyEventCount, ("day", "event_type"), event_counts)
+        _add_sketches(conn, groups)
+        payload_counts: dict[tuple, list] = defaultdict(lambda: [0, 0])
+        for r in rows:
+            if r["event_type"] in PAYLOAD_FIELDS:
+                _count_payloads(payload_counts, _day(r), r["event_type"], r["payload"])
+        _add_payload_counts(conn, payload_counts)
+    elif model is Download:
+        download_counts = Counter((_day(r), r["platform"]) for r in rows)
+        _add_counts(conn, DailyDownloadCount, ("day", "platform"), download_counts)
+    elif model is AdImpression:
+        _add_ad_counts(conn, rows)
+
+
+def rebuild_rollups(conn):
+    """Recompute every rollup table from the raw tables."""
+    for model in ROLLUP_MODELS:
+        conn.execute(delete(model))
+
+    events = events_between(conn)
+    te_day = day_of(events.c.timestamp)
+    conn.execute(
+        upsert(conn, DailyEventCount).from_select(
+            ["day", "event_type", "count"],
+            select(te_day, events.c.event_type, func.count())
+            .group_by(te_day, events.c.event_type),
+        )
+    )
+
+    sketches: dict[tuple, HyperLogLog] = defaultdict(HyperLogLog)
+    # Streamed; the option is per statement, so the writes below use plain
+    # cursors (PostgreSQL cannot executemany on a server-side cursor)
+    distinct_rows = conn.execute(
+        select(te_day, events.c.event_type, events.c.app_version, events.c.client_uuid).distinct(),
+        execution_options={"yield_per": 10_000},
+    )
+    for day, event_type, app_version, client_uuid in distinct_rows:
+        for key in _sketch_keys(day, event_type, app_version):
+            sketches[key].add(client_uuid)
+    _write_sketches(conn, sketches)
+    rebuild_payload_counts(conn)
+
+    dl_day = day_of(Download.timestamp)
+    conn.execute(
+        upsert(conn, DailyDownloadCount).from_select(
+            ["day", "platform", "count"],
+            select(dl_day, Download.platform, func.count(Download.id))
+            .group_by(dl_day, Download.platform),
+        )
+    )
+
+    ad_day = day_of(AdImpression.timestamp)
+    conn.execute(
+        upsert(conn, DailyAdCount).from_select(
+            ["day", "ad_id", "impressions", "clicks"],
+            select(
+                ad_day,
+                AdImpression.ad_id,
+                func.sum(case((AdImpression.event_type == "impression", 1), else_=0)),
+                func.sum(case((AdImpression.event_type == "click", 1), else_=0)),
+            ).group_by(ad_day, AdImpression.ad_id),
+        )
+    )
+
+
+def unique_clients(
+    conn,
+    start_day: str,
+    end_day: str | None = None,
+    dimension: str = "all",
+    key: str = "",
+) -> int:
+    """Estimated distinct clients over [start_day, end_day] by merging daily sketches."""
+    query = select(DailySketch.registers).where(
+        DailySketch.dimension == dimension,
+        DailySketch.key == key,
+        DailySketch.day >= start_day,
+    )
+    if end_day:
+        query = query.where(DailySketch.day <= end_day)
+    return HyperLogLog.union(conn.execute(query).scalars()).count()
+
+
+def merged_sketches(
+    conn, dimension: str, start_day: str, end_day: str | None = None
+) -> dict[str, HyperLogLog]:
+    """Daily sketches of one dimension over [start_day, end_day], merged per key."""
+    merged: dict[str, HyperLogLog] = {}
+    query = select(DailySketch.key, DailySketch.registers).where(
+        DailySketch.dimension == dimension,
+        DailySketch.day >= start_day,
+    )
+    if end_day:
+        query = query.where(DailySketch.day <= end_day)
+    for key, registers in conn.execute(query):
+        sketch = HyperLogLog.from_bytes(registers)
+        if key in merged:
+            merged[key].merge(sketch)
+        else:
+            merged[key] = sketch
+    return merged
+
+
+def unique_clients_by_key(conn, start_day: str, dimension: str) -> dict[str, int]:
+    """Estimated distinct clients per event type / app version since start_day."""
+    return {key: hll.count() for key, hll in merged_sketches(conn, dimension, start_day).items()}
+
+
+def backfill_if_empty(conn):
+    """Build rollups once for databases created before they existed.
+
+    Runs at every startup; after the first check the BACKFILL_MARKER row
+    turns it into a single lookup, so a database without any payload
+    events is not rescanned each time.
+    """
+    if conn.execute(select(AppMeta.value).where(AppMeta.key == BACKFILL_MARKER)).first():
+        return
+    has_rollups = any(
+        conn.execute(select(model.day).limit(1)).first() for model in ROLLUP_MODELS
+    )
+    has_raw = bool(list_partitions(conn)) or any(
+        conn.execute(select(model.id).limit(1)).first()
+        for model in (TelemetryEvent, Download, AdImpression)
+    )
+    if has_raw and not has_rollups:
+        rebuild_rollups(conn)
+    elif has_raw and not conn.execute(select(DailyPayloadCount.day).limit(1)).first():
+        # Rollups from before payload fields were extracted
+        rebuild_payload_counts(conn)
+    conn.execute(
+        upsert(conn, AppMeta)
+        .values(key=BACKFILL_MARKER, value=datetime.now(timezone.utc).isoformat(timespec="seconds"))
+        .on_conflict_do_nothing(index_elements=["key"])
+    )
+
+
+if __name__ == "__main__":
+    from .dashboard import section_cache
+    from .database import engine
+
+    with engine.begin() as conn:
+        rebuild_rollups(conn)
+    section_cache.clear()
+    print("Rollups rebuilt")
@@ -1,19 +1,28 @@
-from datetime import datetime, timedelta, timezone
+from datetime import date, datetime
+from typing import Annotated
 
-from fastapi import APIRouter, Depends, Form, Request
+from fastapi import APIRouter, Depends, Form, Query, Request
 from fastapi.responses import HTMLResponse, RedirectResponse
 from fastapi.templating import Jinja2Templates
-from sqlalchemy import func
+from pydantic import BeforeValidator
+from sqlalchemy import func, select
 from sqlalchemy.orm import Session
 
+from ..ad_cache import ad_catalog
 from ..auth import (
     ADMIN_PASSWORD_HASH,
     create_access_token,
     get_current_admin,
     verify_password,
 )
+from ..dashboard import DASHBOARD_TODAY_TTL
 from ..database import get_db
-from ..models import Ad, AdImpression, Download, TelemetryEvent
+from ..dedup import recent_events
+from ..hll import HLL_ERROR
+from ..ingest import ingest_queue
+from ..models import Ad, DailyAdCount
+from ..partitions import events_between
+from ..slowlog import SLOW_QUERY_EXPLAIN, SLOW_QUERY_LOG, slow_queries
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
@@ -60,37 +69,70 @@ def logout():
 # ---------------------------------------------------------------------------
 
 
+ADS_PER_PAGE = 50
+
+# The filter form submits empty date inputs as ""
+FormDate = Annotated[date | None, BeforeValidator(lambda value: value or None)]
+
+
 @router.get("/ads", response_class=HTMLResponse)
 def ads_list(
     request: Request,
+    date_from: FormDate = None,
+    date_to: FormDate = None,
+    page: int = 1,
     db: Session = Depends(get_db),
     _admin=Depends(get_current_admin),
 ):
-    ads = db.query(Ad).order_by(Ad.created_at.desc()).all()
-
-    # Gather impression/click counts per ad
-    ads_data = []
-    for ad in ads:
-        impressions = (
-            db.query(func.count(AdImpression.id))
-            .filter(AdImpression.ad_id == ad.id, AdImpression.event_type == "impression")
-            .scalar()
-        )
-        clicks = (
-            db.query(func.count(AdImpression.id))
-            .filter(AdImpression.ad_id == ad.id, AdImpression.event_type == "click")
-            .scalar()
-        )
-        ads_data.append(
-            {
-                "ad": ad,
-                "impressions": impressions or 0,
-                "clicks": clicks or 0,
-            }
+    page = max(page, 1)
+
+    # Impression/click counts for all ads in one grouped aggregate over the
+    # daily_ad_counts rollup, optionally limited to a date range
+    stats_query = db.query(
+        DailyAdCount.ad_id,
+        func.sum(DailyAdCount.impressions).label("impressions"),
+        func.sum(DailyAdCount.clicks).label("clicks"),
+    )
+    if date_from:
+        stats_query = stats_query.filter(DailyAdCount.day >= date_from.isoformat())
+    if date_to:
+        stats_query = stats_query.filter(DailyAdCount.day <= date_to.isoformat())
+    stats = stats_query.group_by(DailyAdCount.ad_id).subquery()
+
+    rows = (
+        db.query(
+            Ad,
+            func.coalesce(stats.c.impressions, 0),
+            func.coalesce(stats.c.clicks, 0),
         )
+        .outerjoin(stats, stats.c.ad_id == Ad.id)
+        .order_by(Ad.created_at.desc())
+        .offset((page - 1) * ADS_PER_PAGE)
+        .limit(ADS_PER_PAGE)
+        .all()
+    )
+    total_ads = db.query(func.count(Ad.id)).scalar() or 0
+
+    ads_data = [
+        {
+            "ad": ad,
+            "impressions": impressions,
+            "clicks": clicks,
+            "ctr": round(clicks / impressions * 100, 2) if impressions else 0.0,
+        }
+        for ad, impressions, clicks in rows
+    ]
 
     return templates.TemplateResponse(
-        "ads_list.html", {"request": request, "ads_data": ads_data}
+        "ads_list.html",
+        {
+            "request": request,
+            "ads_data": ads_data,
+            "date_from": date_from.isoformat() if date_from else "",
+            "date_to": date_to.isoformat() if date_to else "",
+            "page": page,
+            "pages": max((total_ads + ADS_PER_PAGE - 1) // ADS_PER_PAGE, 1),
+        },
     )
 
 
@@ -129,6 +171,7 @@ def ads_create(
     )
     db.add(ad)
     db.commit()
+    ad_catalog.invalidate()
     return RedirectResponse(url="/admin/ads", status_code=303)
 
 
@@ -178,6 +221,7 @@ def ads_update(
     ad.is_affiliate = is_affiliate
     ad.weight = weight
     db.commit()
+    ad_catalog.invalidate()
 
     return RedirectResponse(url="/admin/ads", status_code=303)
 
@@ -192,143 +236,95 @@ def ads_delete(
     if ad:
         ad.is_active = False
         db.commit()
+        ad_catalog.invalidate()
     return RedirectResponse(url="/admin/ads", status_code=303)
 
 
 # ---------------------------------------------------------------------------
-# Telemetry dashboard
+# Ingest queue
 # ---------------------------------------------------------------------------
 
 
-@router.get("/telemetry", response_class=HTMLResponse)
-def telemetry_dashboard(
-    request: Request,
-    db: Session = Depends(get_db),
-    _admin=Depends(get_current_admin),
-):
-    now = datetime.now(timezone.utc)
-    today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-    week_ago = today_start - timedelta(days=7)
-    month_ago = today_start - timedelta(days=30)
-
-    # DAU — distinct client_uuids today
-    dau = (
-        db.query(func.count(func.distinct(TelemetryEvent.client_uuid)))
-        .filter(TelemetryEvent.timestamp >= today_start)
-        .scalar()
-        or 0
-    )
+@router.get("/ingest/stats")
+def ingest_stats(_admin=Depends(get_current_admin)):
+    """Queue depth, throughput and group-commit latency of the ingest writer."""
+    return {**ingest_queue.stats(), "dedup": recent_events.stats()}
 
-    # WAU — distinct client_uuids last 7 days
-    wau = (
-        db.query(func.count(func.distinct(TelemetryEvent.client_uuid)))
-        .filter(TelemetryEvent.timestamp >= week_ago)
-        .scalar()
-        or 0
-    )
 
-    # MAU — distinct client_uuids last 30 days
-    mau = (
-        db.query(func.count(func.distinct(TelemetryEvent.client_uuid)))
-        .filter(TelemetryEvent.timestamp >= month_ago)
-        .scalar()
-        or 0
-    )
+# ---------------------------------------------------------------------------
+# Slow queries
+# ---------------------------------------------------------------------------
 
-    # Total events today
-    events_today = (
-        db.query(func.count(TelemetryEvent.id))
-        .filter(TelemetryEvent.timestamp >= today_start)
-        .scalar()
-        or 0
-    )
 
-    # Events per day (last 30 days) for chart
-    # SQLite date function: date(timestamp)
-    daily_events = (
-        db.query(
-            func.date(TelemetryEvent.timestamp).label("day"),
-            func.count(TelemetryEvent.id).label("count"),
-        )
-        .filter(TelemetryEvent.timestamp >= month_ago)
-        .group_by(func.date(TelemetryEvent.timestamp))
-        .order_by(func.date(TelemetryEvent.timestamp))
-        .all()
+@router.get("/slow-queries", response_class=HTMLResponse)
+def slow_queries_page(request: Request, _admin=Depends(get_current_admin)):
+    """Recent statements over SLOW_QUERY_MS with their query plans."""
+    return templates.TemplateResponse(
+        "slow_queries.html",
+        {
+            "request": request,
+            "enabled": SLOW_QUERY_LOG,
+            "explain": SLOW_QUERY_EXPLAIN,
+            "threshold_ms": round(slow_queries.threshold * 1000, 1),
+            "total": slow_queries.total,
+            "entries": slow_queries.entries(),
+        },
     )
-    chart_labels = [row.day for row in daily_events]
-    chart_values = [row.count for row in daily_events]
 
-    # Most common events
-    common_events = (
-        db.query(
-            TelemetryEvent.event_type,
-            func.count(TelemetryEvent.id).label("count"),
-        )
-        .group_by(TelemetryEvent.event_type)
-        .order_by(func.count(TelemetryEvent.id).desc())
-        .limit(10)
-        .all()
-    )
 
-    # Downloads stats
-    downloads_today = (
-        db.query(func.count(Download.id))
-        .filter(Download.timestamp >= today_start)
-        .scalar()
-        or 0
-    )
-    downloads_total = db.query(func.count(Download.id)).scalar() or 0
-    downloads_by_platform = (
-        db.query(
-            Download.platform,
-            func.count(Download.id).label("count"),
-        )
-        .group_by(Download.platform)
-        .order_by(func.count(Download.id).desc())
-        .all()
-    )
-    daily_downloads = (
-        db.query(
-            func.date(Download.timestamp).label("day"),
-            func.count(Download.id).label("count"),
-        )
-        .filter(Download.timestamp >= month_ago)
-        .group_by(func.date(Download.timestamp))
-        .order_by(func.date(Download.timestamp))
-        .all()
-    )
-    dl_chart_labels = [row.day for row in daily_downloads]
-    dl_chart_values = [row.count for row in daily_downloads]
+@router.post("/slow-queries/clear")
+def slow_queries_clear(_admin=Depends(get_current_admin)):
+    slow_queries.clear()
+    return RedirectResponse(url="/admin/slow-queries", status_code=303)
 
-    # App versions in use
-    app_versions = (
-        db.query(
-            TelemetryEvent.app_version,
-            func.count(func.distinct(TelemetryEvent.client_uuid)).label("users"),
-        )
-        .filter(TelemetryEvent.app_version.isnot(None))
-        .group_by(TelemetryEvent.app_version)
-        .order_by(func.count(func.distinct(TelemetryEvent.client_uuid)).desc())
-        .limit(10)
-        .all()
-    )
 
+# ---------------------------------------------------------------------------
+# Telemetry dashboard
+# ---------------------------------------------------------------------------
+
+
+@router.get("/telemetry/events")
+def telemetry_events(
+    start: date,
+    end: date | None = None,
+    event_type: str | None = None,
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db),
+    _admin=Depends(get_current_admin),
+):
+    """Raw events in [start, end) (YYYY-MM-DD), newest first.
+
+    Only the monthly partitions overlapping the range are queried.
+    """
+    start_dt = datetime.combine(start, datetime.min.time())
+    end_dt = datetime.combine(end, datetime.min.time()) if end else None
+    events = events_between(db.connection(), start_dt, end_dt)
+
+    query = select(events).order_by(events.c.timestamp.desc()).limit(limit)
+    if event_type:
+        query = query.where(events.c.event_type == event_type)
+    return [
+        {
+            "client_uuid": row.client_uuid,
+            "event_type": row.event_type,
+            "payload": row.payload,
+            "app_version": row.app_version,
+            "os_version": row.os_version,
+            "timestamp": row.timestamp.isoformat(),
+            "partition": row.partition,
+        }
+        for row in db.execute(query)
+    ]
+
+
+@router.get("/telemetry", response_class=HTMLResponse)
+def telemetry_dashboard(request: Request, _admin=Depends(get_current_admin)):
+    """Page shell; the panels load from /admin/api/ (see admin_api.py)."""
     return templates.TemplateResponse(
         "telemetry_dashboard.html",
         {
             "request": request,
-            "dau": dau,
-            "wau": wau,
-            "mau": mau,
-            "events_today": events_today,
-            "chart_labels": chart_labels,
-            "chart_values": chart_values,
-            "common_events": common_events,
-            "app_versions": app_versions,
-            "downloads_today": downloads_today,
-            "downloads_total": downloads_total,
-            "downloads_by_platform": downloads_by_platform,
-            "dl_chart_labels": dl_chart_labels,
-            "dl_chart_values": dl_chart_values,
+            "hll_error_pct": round(HLL_ERROR * 100, 1),
+            "poll_seconds": max(round(DASHBOARD_TODAY_TTL), 5),
         },
     )
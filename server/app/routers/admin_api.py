@@ -0,0 +1,119 @@
+"""JSON data of the telemetry dashboard, one endpoint per panel.
+
+The page loads every panel in parallel and then polls them. Responses
+carry an ETag of the cache sections they were built from, so a poll
+between section refreshes is a 304. The daily series take a ``since``
+cursor and return only the points from that day on (normally just today);
+the cursor also pins the history section, and once that is rebuilt the
+full series is sent again with ``"full": true``.
+"""
+
+from fastapi import APIRouter, Depends, Request, Response
+from fastapi.responses import JSONResponse
+
+from ..auth import get_current_admin
+from ..dashboard import (
+    Sections,
+    app_versions_panel,
+    common_events_panel,
+    downloads_daily_panel,
+    downloads_panel,
+    events_daily_panel,
+    load_sections,
+    panel,
+    payload_daily_panel,
+    payload_values_panel,
+    summary_panel,
+)
+
+router = APIRouter(prefix="/admin/api", tags=["admin"])
+
+
+def _respond(request: Request, sections: Sections, body: dict, tag: str = "") -> Response:
+    etag = f'"{sections.version}{tag}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return JSONResponse(body, headers=headers)
+
+
+def _series(request: Request, name: str, build, since: str | None) -> Response:
+    """Points from the cursor's day on, or the whole series for a missing or outdated cursor."""
+    sections = load_sections()
+    series = panel(name, build, sections)
+    day, _, history_version = (since or "").partition("_")
+    full = history_version != sections.history_version
+    points = series["points"] if full else [p for p in series["points"] if p[0] >= day]
+    body = {
+        **series,
+        "points": points,
+        "full": full,
+        "cursor": f"{sections.day}_{sections.history_version}",
+    }
+    return _respond(request, sections, body, f"-{since or ''}")
+
+
+# ---------------------------------------------------------------------------
+# Panels
+# ---------------------------------------------------------------------------
+
+
+@router.get("/summary")
+def summary(request: Request, _admin=Depends(get_current_admin)):
+    """DAU / WAU / MAU estimates and today's event count."""
+    sections = load_sections()
+    return _respond(request, sections, panel("summary", summary_panel, sections))
+
+
+@router.get("/downloads")
+def downloads(request: Request, _admin=Depends(get_current_admin)):
+    sections = load_sections()
+    return _respond(request, sections, panel("downloads", downloads_panel, sections))
+
+
+@router.get("/events-daily")
+def events_daily(request: Request, since: str | None = None, _admin=Depends(get_current_admin)):
+    """Events per day over the last 30 days."""
+    return _series(request, "events-daily", events_daily_panel, since)
+
+
+@router.get("/downloads-daily")
+def downloads_daily(
+    request: Request, since: str | None = None, _admin=Depends(get_current_admin)
+):
+    """Downloads per day over the last 30 days."""
+    return _series(request, "downloads-daily", downloads_daily_panel, since)
+
+
+@router.get("/common-events")
+def common_events(request: Request, _admin=Depends(get_current_admin)):
+    """Top event types by all-time count, with unique users over the last 30 days."""
+    sections = load_sections()
+    return _respond(request, sections, panel("common-events", common_events_panel, sections))
+
+
+@router.get("/app-versions")
+def app_versions(request: Request, _admin=Depends(get_current_admin)):
+    """App versions by unique users over the last 30 days."""
+    sections = load_sections()
+    return _respond(request, sections, panel("app-versions", app_versions_panel, sections))
+
+
+@router.get("/payload-values")
+def payload_values(request: Request, _admin=Depends(get_current_admin)):
+    """Top values of the extracted payload fields (PAYLOAD_FIELDS) over the last 30 days."""
+    sections = load_sections()
+    return _respond(request, sections, panel("payload-values", payload_values_panel, sections))
+
+
+@router.get("/payload-daily")
+def payload_daily(request: Request, since: str | None = None, _admin=Depends(get_current_admin)):
+    """Daily sums of the numeric payload fields (glasses of water) over the last 30 days."""
+    return _series(request, "payload-daily", payload_daily_panel, since)
+
+
+@router.post("/refresh")
+def refresh(_admin=Depends(get_current_admin)):
+    """Recompute both sections now instead of waiting for their TTLs."""
+    sections = load_sections(force=True)
+    return {"version": sections.version}
@@ -1,11 +1,14 @@
 import hashlib
-import random
+from datetime import datetime, timezone
 
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from ..database import get_db
+from ..ad_cache import ad_catalog, recent_impressions
+from ..database import get_async_db
+from ..ingest import enqueue
 from ..models import Ad, AdImpression
 
 router = APIRouter(prefix="/api/ads", tags=["ads"])
@@ -34,47 +37,89 @@ class AdOut(BaseModel):
         from_attributes = True
 
 
+class DesktopAdOut(BaseModel):
+    """Ad in the shape the Tauri client deserializes (src-tauri/src/ads.rs)."""
+
+    ad_id: str
+    title: str
+    description: str
+    image_url: str
+    click_url: str
+    bg_color: str
+    text_color: str
+
+    @classmethod
+    def from_ad(cls, ad: Ad) -> "DesktopAdOut":
+        return cls(
+            ad_id=str(ad.id),
+            title=ad.title,
+            description=ad.text,
+            image_url="",
+            click_url=ad.url,
+            bg_color=ad.bg,
+            text_color=ad.accent,
+        )
+
+
+class AdClickIn(BaseModel):
+    ad_id: str
+    client_id: str
+
+
 # ---------------------------------------------------------------------------
 # Helpers
 # ---------------------------------------------------------------------------
 
+# How long the desktop client may reuse a served ad without asking again
+AD_CLIENT_MAX_AGE = 300
+
 
 def _ip_hash(request: Request) -> str:
     ip = request.client.host if request.client else "unknown"
     return hashlib.sha256(ip.encode()).hexdigest()
 
 
+def _log_ad_event(ad_id: int, event_type: str, client_uuid: str, request: Request):
+    enqueue(
+        AdImpression,
+        [
+            {
+                "ad_id": ad_id,
+                "event_type": event_type,
+                "client_uuid": client_uuid,
+                "timestamp": datetime.now(timezone.utc),
+                "ip_hash": _ip_hash(request),
+            }
+        ],
+        wait=False,
+    )
+
+
 # ---------------------------------------------------------------------------
 # Endpoints
 # ---------------------------------------------------------------------------
 
 
 @router.get("", response_model=list[AdOut])
-def get_active_ads(db: Session = Depends(get_db)):
-    """Return active ads in weighted random order."""
-    ads = db.query(Ad).filter(Ad.is_active == True).all()  # noqa: E712
-    if not ads:
-        return []
-
-    # Weighted shuffle: build weighted list then shuffle
-    weighted: list[Ad] = []
-    for ad in ads:
-        weighted.extend([ad] * max(ad.weight, 1))
-    random.shuffle(weighted)
-
-    # Deduplicate while preserving weighted-random order
-    seen: set[int] = set()
-    result: list[Ad] = []
-    for ad in weighted:
-        if ad.id not in seen:
-            seen.add(ad.id)
-            result.append(ad)
-
-    return result
-
-
-@router.post("/event")
-def log_ad_event(event: AdEventIn, request: Request, db: Session = Depends(get_db)):
+async def get_active_ads(request: Request):
+    """Return active ads in weighted random order.
+
+    Served from the in-memory catalog with pre-serialized ads; the ETag
+    identifies the catalog contents, so clients can revalidate cheaply.
+    """
+    catalog = await ad_catalog.get()
+    headers = {"ETag": catalog.etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == catalog.etag:
+        return Response(status_code=304, headers=headers)
+
+    body = b"[" + b",".join(catalog.weighted_order()) + b"]"
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@router.post("/event", status_code=202)
+async def log_ad_event(
+    event: AdEventIn, request: Request, db: AsyncSession = Depends(get_async_db)
+):
     """Log an ad impression or click event."""
     if event.event_type not in ("impression", "click"):
         raise HTTPException(
@@ -83,17 +128,61 @@ def log_ad_event(event: AdEventIn, request: Request, db: Session = Depends(get_d
         )
 
     # Verify ad exists
-    ad = db.query(Ad).filter(Ad.id == event.ad_id).first()
-    if not ad:
+    ad_id = await db.scalar(select(Ad.id).where(Ad.id == event.ad_id))
+    if ad_id is None:
         raise HTTPException(status_code=404, detail="Ad not found")
 
-    impression = AdImpression(
-        ad_id=event.ad_id,
-        event_type=event.event_type,
-        client_uuid=event.client_uuid,
-        ip_hash=_ip_hash(request),
+    _log_ad_event(event.ad_id, event.event_type, event.client_uuid, request)
+    return {"status": "accepted"}
+
+
+@router.get("/get")
+async def get_ad_for_client(client_id: str, request: Request, platform: str = "desktop"):
+    """Pick one weighted ad for a desktop client and log it as an impression.
+
+    Ads the client has already seen AD_FREQUENCY_CAP times recently are
+    skipped. The pick is made on every request, revalidations included; when
+    it is the ad named by If-None-Match the answer is 304 and the client
+    shows its cached copy, which still counts as an impression.
+    """
+    catalog = await ad_catalog.get()
+    if not catalog.ids:
+        raise HTTPException(status_code=404, detail="No active ads")
+
+    index = catalog.weighted_pick(exclude=recent_impressions.capped(client_id))
+    if index is None:
+        # Every ad is capped for this client: fall back to plain weighted choice
+        index = catalog.weighted_pick()
+    ad_id = catalog.ids[index]
+
+    recent_impressions.record(client_id, ad_id)
+    _log_ad_event(ad_id, "impression", client_id, request)
+
+    headers = {
+        "ETag": catalog.ad_etag(ad_id),
+        "Cache-Control": f"private, max-age={AD_CLIENT_MAX_AGE}",
+    }
+    if request.headers.get("if-none-match") == headers["ETag"]:
+        return Response(status_code=304, headers=headers)
+    return Response(
+        content=catalog.desktop_payloads[index], media_type="application/json", headers=headers
     )
-    db.add(impression)
-    db.commit()
 
-    return {"status": "ok"}
+
+@router.post("/click", status_code=202)
+async def log_ad_click(
+    click: AdClickIn, request: Request, db: AsyncSession = Depends(get_async_db)
+):
+    """Log a click reported by the desktop client (ad_id is sent as a string)."""
+    if not click.ad_id.isdigit():
+        # Built-in fallback ads ("fallback_1", ...) are not stored server-side
+        return {"status": "ignored"}
+
+    ad_id = int(click.ad_id)
+    if ad_id not in (await ad_catalog.get()).ids and (
+        await db.scalar(select(Ad.id).where(Ad.id == ad_id))
+    ) is None:
+        raise HTTPException(status_code=404, detail="Ad not found")
+
+    _log_ad_event(ad_id, "click", click.client_id, request)
+    return {"status": "accepted"}
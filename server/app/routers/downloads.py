@@ -1,10 +1,10 @@
 import hashlib
+from datetime import datetime, timezone
 
-from fastapi import APIRouter, Depends, Request
+from fastapi import APIRouter, Request
 from pydantic import BaseModel
-from sqlalchemy.orm import Session
 
-from ..database import get_db
+from ..ingest import enqueue
 from ..models import Download
 
 router = APIRouter(prefix="/api", tags=["downloads"])
@@ -21,15 +21,20 @@ def _ip_hash(request: Request) -> str:
     return hashlib.sha256(ip.encode()).hexdigest()
 
 
-@router.post("/downloads")
-def log_download(data: DownloadIn, request: Request, db: Session = Depends(get_db)):
+@router.post("/downloads", status_code=202)
+async def log_download(data: DownloadIn, request: Request):
     """Log a download event from the landing page."""
-    dl = Download(
-        platform=data.platform,
-        source=data.source,
-        language=data.language,
-        ip_hash=_ip_hash(request),
+    enqueue(
+        Download,
+        [
+            {
+                "platform": data.platform,
+                "source": data.source,
+                "language": data.language,
+                "ip_hash": _ip_hash(request),
+                "timestamp": datetime.now(timezone.utc),
+            }
+        ],
+        wait=False,
     )
-    db.add(dl)
-    db.commit()
-    return {"status": "ok"}
+    return {"status": "accepted"}
@@ -0,0 +1,207 @@
+"""Opt-in slow-query log with automatic EXPLAIN capture.
+
+With SLOW_QUERY_LOG=1 every statement slower than SLOW_QUERY_MS (timed by
+the metrics engine hooks) is kept in an in-memory ring buffer together
+with its parameters, row count, the route and source line that ran it and
+the query plan (``EXPLAIN QUERY PLAN`` on SQLite, ``EXPLAIN`` on
+PostgreSQL). The buffer is shown on /admin/slow-queries.
+
+A plan line starting with ``SCAN`` (rather than ``SEARCH ... USING INDEX``)
+means SQLite walks the whole table; on PostgreSQL that is ``Seq Scan``.
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+
+try:
+    import greenlet
+except ImportError:  # only installed alongside the async engine
+    greenlet = None
+
+SLOW_QUERY_LOG = os.environ.get("SLOW_QUERY_LOG", "0") == "1"
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", "100"))
+SLOW_QUERY_BUFFER = int(os.environ.get("SLOW_QUERY_BUFFER", "200"))
+SLOW_QUERY_EXPLAIN = os.environ.get("SLOW_QUERY_EXPLAIN", "1") == "1"
+
+# Longest parameter repr kept per entry
+_MAX_PARAMS_CHARS = 500
+
+_APP_DIR = os.path.dirname(os.path.abspath(__file__))
+_SKIP_FILES = {os.path.join(_APP_DIR, "metrics.py"), os.path.abspath(__file__)}
+
+
+@dataclass
+class SlowQuery:
+    at: datetime
+    duration_ms: float
+    statement: str
+    parameters: str
+    rows: int | None
+    route: str
+    source: str
+    plan: list[str] = field(default_factory=list)
+
+
+def _source_line() -> str:
+    """First stack frame inside app/ that is not the instrumentation itself."""
+    stacks = [sys._getframe(2)]
+    if greenlet is not None and greenlet.getcurrent().parent is not None:
+        # Async engine: the statement runs in a greenlet whose parent is
+        # suspended inside the awaiting handler's coroutine
+        stacks.append(greenlet.getcurrent().parent.gr_frame)
+    for frame in stacks:
+        while frame is not None:
+            filename = frame.f_code.co_filename
+            if filename.startswith(_APP_DIR) and filename not in _SKIP_FILES:
+                relative = os.path.relpath(filename, os.path.dirname(_APP_DIR))
+                return f"{relative}:{frame.f_lineno} {frame.f_code.co_name}"
+            frame = frame.f_back
+    return "?"
+
+
+def _format_parameters(parameters, executemany: bool) -> str:
+    if executemany:
+        parameters = list(parameters)
+        text = f"{len(parameters)} sets, first: {parameters[0]!r}" if parameters else "0 sets"
+    else:
+        text = repr(parameters)
+    if len(text) > _MAX_PARAMS_CHARS:
+        text = text[:_MAX_PARAMS_CHARS] + "..."
+    return text
+
+
+# Statements EXPLAIN accepts; DDL, PRAGMA/SHOW and the like are skipped
+_EXPLAINABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "VALUES")
+
+
+def explain(context, statement: str, parameters) -> list[str]:
+    """Query plan lines for a statement, run on a fresh cursor of the same connection."""
+    dialect_name = context.dialect.name
+    if not statement.lstrip().upper().startswith(_EXPLAINABLE):
+        return []
+    if dialect_name == "sqlite":
+        prefix = "EXPLAIN QUERY PLAN "
+    elif dialect_name == "postgresql":
+        prefix = "EXPLAIN "
+    else:
+        return []
+    # Through the pooled connection: async driver cursors have no .connection
+    plan_cursor = context.root_connection.connection.cursor()
+    # A failed statement aborts the whole PostgreSQL transaction; the
+    # savepoint confines a failing EXPLAIN to itself
+    savepoint = dialect_name == "postgresql" and context.root_connection.in_transaction()
+    try:
+        if savepoint:
+            plan_cursor.execute("SAVEPOINT slow_query_explain")
+        try:
+            plan_cursor.execute(prefix + statement, parameters)
+            rows = plan_cursor.fetchall()
+        except Exception as exc:  # the plan is best-effort, never fail the query
+            if savepoint:
+                plan_cursor.execute("ROLLBACK TO SAVEPOINT slow_query_explain")
+            return [f"(EXPLAIN failed: {exc})"]
+        if savepoint:
+            plan_cursor.execute("RELEASE SAVEPOINT slow_query_explain")
+    finally:
+        plan_cursor.close()
+    if dialect_name == "sqlite":
+        # (id, parent, notused, detail): indent children under their parent
+        depth = {0: -1}
+        lines = []
+        for node_id, parent, _, detail in rows:
+            depth[node_id] = depth.get(parent, -1) + 1
+            lines.append("  " * depth[node_id] + detail)
+        return lines
+    return [row[0] for row in rows]
+
+
+class SlowQueryLog:
+    """Ring buffer of the most recent slow statements."""
+
+    def __init__(self, threshold_ms: float, maxlen: int):
+        self.threshold = threshold_ms / 1000
+        self._entries: deque[SlowQuery] = deque(maxlen=maxlen)
+        self._lock = threading.Lock()
+        self.total = 0
+
+    def record(
+        self,
+        elapsed: float,
+        cursor,
+        statement: str,
+        parameters,
+        context,
+        route: str | None,
+        executemany: bool = False,
+    ):
+        """Called by the engine hooks for statements over the threshold."""
+        rows = None
+        if cursor.description is None:
+            rows = cursor.rowcount if cursor.rowcount >= 0 else None
+        elif _can_buffer(context, executemany):
+            rows, fetch_elapsed = _buffer_result(cursor, context)
+            elapsed += fetch_elapsed
+        plan = []
+        if SLOW_QUERY_EXPLAIN and not executemany:
+            plan = explain(context, statement, parameters)
+        entry = SlowQuery(
+            at=datetime.now(timezone.utc),
+            duration_ms=round(elapsed * 1000, 2),
+            statement=statement,
+            parameters=_format_parameters(parameters, executemany),
+            rows=rows,
+            route=route or threading.current_thread().name,
+            source=_source_line(),
+            plan=plan,
+        )
+        with self._lock:
+            self._entries.append(entry)
+            self.total += 1
+
+    def entries(self) -> list[SlowQuery]:
+        """Newest first."""
+        with self._lock:
+            return list(reversed(self._entries))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def _can_buffer(context, executemany: bool) -> bool:
+    """Plain, non-streamed reads only: INSERT .. RETURNING rows are read
+    from the cursor by SQLAlchemy itself, and yield_per/stream_results
+    callers expect not to hold the whole result in memory."""
+    options = context.execution_options
+    return not (
+        executemany
+        or context.is_crud
+        or options.get("yield_per")
+        or options.get("stream_results")
+    )
+
+
+def _buffer_result(cursor, context) -> tuple[int, float]:
+    """Fetch a slow SELECT's rows up front to count them (and time the fetch).
+
+    SQLAlchemy then serves the result from the buffer, exactly as it does
+    for dialects that pre-buffer RETURNING rows.
+    """
+    from sqlalchemy.engine.cursor import FullyBufferedCursorFetchStrategy
+
+    description = cursor.description
+    start = time.perf_counter()
+    rows = cursor.fetchall()
+    elapsed = time.perf_counter() - start
+    context.cursor_fetch_strategy = FullyBufferedCursorFetchStrategy(
+        cursor, description, initial_buffer=rows
+    )
+    return len(rows), elapsed
+
+
+slow_queries = SlowQueryLog(SLOW_QUERY_MS, SLOW_QUERY_BUFFER)
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+Load test: sync (threadpool) vs async (event loop) request handlers.
+
+Serves the same two endpoints both ways from a uvicorn subprocess and hits
+them with thousands of concurrent clients:
+
+- POST /api/telemetry/batch: decode + dedup + rows, handed to a writer
+  thread that group-commits into SQLite (no DB access in the handler)
+- POST /api/ads/click: one primary-key lookup of the ad, the only DB read
+  on the public API hot path
+
+The sync stack is the previous one: ``def`` handlers with a SessionLocal
+session, run by Starlette in its 40-thread pool. The async stack is
+``async def`` handlers with an aiosqlite AsyncSession. Reports throughput,
+p50/p99 latency and errors per stack.
+
+Usage (from server/):
+  python bench/bench_async_load.py
+  python bench/bench_async_load.py --requests 20000 --concurrency 2000 --click-share 0.2
+"""
+
+import argparse
+import asyncio
+import json
+import queue
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi import Depends, FastAPI, HTTPException, Request  # noqa: E402
+from sqlalchemy import create_engine, event, insert, select  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine  # noqa: E402
+from sqlalchemy.orm import Session, sessionmaker  # noqa: E402
+from sqlalchemy.pool import AsyncAdaptedQueuePool  # noqa: E402
+
+from app.batch_formats import decode_batch  # noqa: E402
+from app.database import DB_POOL_SIZE, Base, apply_sqlite_profile  # noqa: E402
+from app.models import Ad, TelemetryEvent  # noqa: E402
+from app.routers.telemetry import _batch_body, _batch_rows, _drop_duplicates  # noqa: E402
+
+AD_COUNT = 20
+IP_HASH = "0" * 64
+
+
+# ---------------------------------------------------------------------------
+# Server side
+# ---------------------------------------------------------------------------
+
+
+def start_writer(engine) -> queue.Queue:
+    """Single writer thread group-committing queued rows, like the ingest queue."""
+    rows_queue: queue.Queue = queue.Queue(maxsize=10000)
+
+    def run():
+        while True:
+            rows = rows_queue.get()
+            deadline = time.monotonic() + 0.5
+            while len(rows) < 500 and time.monotonic() < deadline:
+                try:
+                    rows += rows_queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+            with engine.begin() as conn:
+                conn.execute(insert(TelemetryEvent), rows)
+
+    threading.Thread(target=run, name="bench-writer", daemon=True).start()
+    return rows_queue
+
+
+def make_app(db_path: str, stack: str) -> FastAPI:
+    engine = create_engine(f"sqlite:///{db_path}", pool_size=DB_POOL_SIZE)
+    event.listen(engine, "connect", lambda conn, _record: apply_sqlite_profile(conn))
+    rows_queue = start_writer(engine)
+    app = FastAPI()
+
+    def enqueue(rows: list[dict], wait: bool):
+        try:
+            rows_queue.put(rows, timeout=0.05 if wait else 0)
+        except queue.Full:
+            raise HTTPException(status_code=503, detail="Ingest queue full")
+
+    def batch_response(request: Request, body: bytes, wait: bool) -> dict:
+        batch = decode_batch(
+            body, request.headers.get("content-type"), request.headers.get("content-encoding")
+        )
+        batch, _ = _drop_duplicates(batch)
+        rows = _batch_rows(batch, IP_HASH)
+        enqueue(rows, wait)
+        return {"status": "accepted", "count": len(rows)}
+
+    if stack == "sync":
+        SessionLocal = sessionmaker(bind=engine)
+
+        def get_db():
+            db = SessionLocal()
+            try:
+                yield db
+            finally:
+                db.close()
+
+        @app.post("/api/telemetry/batch", status_code=202)
+        def batch_sync(request: Request, body: bytes = Depends(_batch_body)):
+            return batch_response(request, body, wait=True)
+
+        @app.post("/api/ads/click", status_code=202)
+        def click_sync(payload: dict, db: Session = Depends(get_db)):
+            if db.scalar(select(Ad.id).where(Ad.id == int(payload["ad_id"]))) is None:
+                raise HTTPException(status_code=404, detail="Ad not found")
+            return {"status": "accepted"}
+
+    else:
+        async_engine = create_async_engine(
+            f"sqlite+aiosqlite:///{db_path}", poolclass=AsyncAdaptedQueuePool, pool_size=DB_POOL_SIZE
+        )
+        event.listen(
+            async_engine.sync_engine, "connect", lambda conn, _record: apply_sqlite_profile(conn)
+        )
+        AsyncSessionLocal = async_sessionmaker(async_engine)
+
+        async def get_async_db():
+            async with AsyncSessionLocal() as db:
+                yield db
+
+        @app.post("/api/telemetry/batch", status_code=202)
+        async def batch_async(request: Request, body: bytes = Depends(_batch_body)):
+            return batch_response(request, body, wait=False)
+
+        @app.post("/api/ads/click", status_code=202)
+        async def click_async(payload: dict, db: AsyncSession = Depends(get_async_db)):
+            if await db.scalar(select(Ad.id).where(Ad.id == int(payload["ad_id"]))) is None:
+                raise HTTPException(status_code=404, detail="Ad not found")
+            return {"status": "accepted"}
+
+    @app.get("/")
+    def health():
+        return {"status": "ok"}
+
+    return app
+
+
+def serve(db_path: str, stack: str, port: int):
+    import uvicorn
+
+    uvicorn.run(make_app(db_path, stack), host="127.0.0.1", port=port, log_level="warning",
+                backlog=4096)
+
+
+# ---------------------------------------------------------------------------
+# Load generator
+# ---------------------------------------------------------------------------
+
+
+def seed(db_path: str):
+    engine = create_engine(f"sqlite:///{db_path}")
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(
+            insert(Ad),
+            [{"title": f"Ad {i}", "text": "", "url": "https://example.com"} for i in range(AD_COUNT)],
+        )
+    engine.dispose()
+
+
+def batch_body(client: int, batch: int) -> bytes:
+    events = [
+        {"event_type": "break_taken", "seq": i, "data": {"type": "micro", "duration_sec": 20}}
+        for i in range(10)
+    ]
+    return json.dumps(
+        {"client_id": f"client-{client}", "batch_id": f"{client}-{batch}", "app_version": "2.0.28",
+         "platform": "windows", "events": events}
+    ).encode()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def wait_ready(port: int):
+    for _ in range(100):
+        try:
+            _, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.close()
+            return
+        except OSError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError("server did not start")
+
+
+def http_request(path: str, body: bytes) -> bytes:
+    return (
+        f"POST {path} HTTP/1.1\r\nHost: bench\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n"
+    ).encode() + body
+
+
+async def read_status(reader: asyncio.StreamReader) -> int:
+    """Read one keep-alive response and return its status code."""
+    head = await reader.readuntil(b"\r\n\r\n")
+    status = int(head.split(b" ", 2)[1])
+    length = 0
+    for line in head.split(b"\r\n"):
+        if line.lower().startswith(b"content-length:"):
+            length = int(line.split(b":", 1)[1])
+    await reader.readexactly(length)
+    return status
+
+
+async def load(port: int, requests: int, concurrency: int, click_share: float) -> dict:
+    """Keep-alive clients on raw asyncio streams: a full HTTP client library
+    costs more CPU per request than the handlers being measured."""
+    latencies: list[float] = []
+    statuses: dict[int | str, int] = {}
+    counter = iter(range(requests))
+
+    async def worker(worker_id: int):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        try:
+            for n in counter:
+                if random.random() < click_share:
+                    request = http_request(
+                        "/api/ads/click", json.dumps({"ad_id": str(1 + n % AD_COUNT)}).encode()
+                    )
+                else:
+                    request = http_request("/api/telemetry/batch", batch_body(worker_id, n))
+                start = time.perf_counter()
+                try:
+                    writer.write(request)
+                    key = await read_status(reader)
+                except (OSError, asyncio.IncompleteReadError) as exc:
+                    key = type(exc).__name__
+                    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+                latencies.append(time.perf_counter() - start)
+                statuses[key] = statuses.get(key, 0) + 1
+        finally:
+            writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "rps": requests / elapsed,
+        "p50": statistics.median(latencies) * 1000,
+        "p99": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        "statuses": statuses,
+    }
+
+
+def run_stack(stack: str, args) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = str(Path(tmp) / "load.db")
+        seed(db_path)
+        port = free_port()
+        server = subprocess.Popen(
+            [sys.executable, __file__, "--serve", stack, "--db", db_path, "--port", str(port)]
+        )
+        try:
+            asyncio.run(wait_ready(port))
+            return asyncio.run(load(port, args.requests, args.concurrency, args.click_share))
+        finally:
+            server.terminate()
+            server.wait(10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sync vs async handler load test")
+    parser.add_argument("--requests", type=int, default=10000, help="Requests per stack")
+    parser.add_argument("--concurrency", type=int, default=1000, help="Concurrent clients")
+    parser.add_argument("--click-share", type=float, default=0.1,
+                        help="Share of requests that are ad clicks (DB read)")
+    parser.add_argument("--serve", choices=("sync", "async"), help=argparse.SUPPRESS)
+    parser.add_argument("--db", help=argparse.SUPPRESS)
+    parser.add_argument("--port", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.db, args.serve, args.port)
+        return
+
+    print(f"{args.requests} requests, {args.concurrency} concurrent clients, "
+          f"{args.click_share:.0%} ad clicks")
+    print(f"{'Stack':<6}  {'req/s':>8}  {'p50 ms':>8}  {'p99 ms':>8}  statuses")
+    for stack in ("sync", "async"):
+        result = run_stack(stack, args)
+        print(f"{stack:<6}  {result['rps']:>8.0f}  {result['p50']:>8.1f}  {result['p99']:>8.1f}  "
+              f"{result['statuses']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Benchmark: /api/telemetry/batch body formats — bytes on the wire and parse time.
+
+For every Content-Type x Content-Encoding combination reports the body
+size and the time to turn it into insert rows, per 1,000 events, next to
+the previous path (Pydantic BatchPayload from JSON). Both paths end in
+the same _batch_rows call (client timestamps, skew correction), so the
+difference is the decoding and validation alone.
+
+Usage (from server/):
+  python bench/bench_batch_formats.py
+  python bench/bench_batch_formats.py --batch 10 --rounds 2000
+"""
+
+import argparse
+import gzip
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.batch_formats import decode_batch, msgpack, zstandard  # noqa: E402
+from app.routers.telemetry import BatchPayload, _batch_rows  # noqa: E402
+
+IP_HASH = "0" * 64
+EVENT_TYPES = ["break_taken", "break_skipped", "water_logged", "audio_play", "app_start"]
+
+
+def make_batch(size: int) -> dict:
+    events = []
+    for i in range(size):
+        event_type = EVENT_TYPES[i % len(EVENT_TYPES)]
+        data = None
+        if event_type == "break_taken":
+            data = {"type": "micro", "duration_sec": 20 + i % 5}
+        elif event_type == "water_logged":
+            data = {"glasses": 1 + i % 3}
+        elif event_type == "audio_play":
+            data = {"sound_type": "rain", "name": "Deszcz"}
+        events.append(
+            {"event_type": event_type, "timestamp": f"2026-01-01T12:{i % 60:02d}:00+01:00", "data": data}
+        )
+    return {
+        "client_id": "3f2b8c1e-9a7d-4e55-b0c1-2d6f8e9a1b3c",
+        "app_version": "2.0.28",
+        "platform": "windows",
+        "events": events,
+    }
+
+
+def encodings():
+    yield "identity", lambda data: data
+    yield "gzip", lambda data: gzip.compress(data, compresslevel=6)
+    if zstandard:
+        compressor = zstandard.ZstdCompressor(level=3)
+        yield "zstd", compressor.compress
+
+
+def content_types(batch: dict):
+    yield "application/json", json.dumps(batch, separators=(",", ":")).encode()
+    if msgpack:
+        yield "application/msgpack", msgpack.packb(batch)
+
+
+def pydantic_path(body: bytes) -> list[dict]:
+    """The previous implementation: Pydantic models for the batch and every event."""
+    payload = BatchPayload.model_validate_json(body)
+    batch = {
+        "client_id": payload.client_id,
+        "batch_id": payload.batch_id,
+        "sent_at": payload.sent_at,
+        "app_version": payload.app_version,
+        "platform": payload.platform,
+        "events": [
+            {
+                "event_type": event.event_type,
+                "timestamp": event.timestamp,
+                "seq": i if event.seq is None else event.seq,
+                "payload": json.dumps(event.data) if event.data else None,
+            }
+            for i, event in enumerate(payload.events)
+        ],
+    }
+    return _batch_rows(batch, IP_HASH)
+
+
+def time_per_1000(fn, rounds: int, batch_size: int) -> float:
+    """Milliseconds of `fn` per 1,000 events."""
+    fn()  # warm-up
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn()
+    elapsed = time.perf_counter() - start
+    return elapsed * 1000 / (rounds * batch_size) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch body format benchmark")
+    parser.add_argument("--batch", type=int, default=10, help="Events per request (client BATCH_SIZE)")
+    parser.add_argument("--rounds", type=int, default=2000, help="Requests parsed per format")
+    args = parser.parse_args()
+
+    batch = make_batch(args.batch)
+    if not msgpack or not zstandard:
+        print("Note: install msgpack and zstandard to benchmark every format\n")
+
+    print(f"{args.batch} events per request, figures per 1,000 events")
+    print(f"{'Format':<32}  {'Bytes':>9}  {'Parse ms':>9}")
+
+    json_body = json.dumps(batch, separators=(",", ":")).encode()
+    scale = 1000 / args.batch
+    ms = time_per_1000(lambda: pydantic_path(json_body), args.rounds, args.batch)
+    print(f"{'json (Pydantic, previous)':<32}  {len(json_body) * scale:>9,.0f}  {ms:>9.2f}")
+
+    for content_type, raw in content_types(batch):
+        for encoding, compress in encodings():
+            body = compress(raw)
+            ms = time_per_1000(
+                lambda: _batch_rows(decode_batch(body, content_type, encoding), IP_HASH),
+                args.rounds,
+                args.batch,
+            )
+            label = f"{content_type.split('/')[1]} + {encoding}"
+            print(f"{label:<32}  {len(body) * scale:>9,.0f}  {ms:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Benchmark: /api/telemetry/batch write path — ORM unit of work vs Core executemany.
+
+Usage (from server/):
+  python bench/bench_batch_insert.py
+  python bench/bench_batch_insert.py --rounds 50
+"""
+
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import create_engine, insert  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app.batch_formats import validate_batch  # noqa: E402
+from app.database import Base  # noqa: E402
+from app.models import TelemetryEvent  # noqa: E402
+from app.routers.telemetry import (  # noqa: E402
+    VALID_EVENT_TYPES,
+    BatchPayload,
+    _batch_rows,
+)
+
+BATCH_SIZES = [10, 100, 1000]
+IP_HASH = "0" * 64
+
+
+def make_payload(size: int) -> BatchPayload:
+    return BatchPayload(
+        client_id="bench-client-0000",
+        app_version="2.0.28",
+        platform="windows",
+        events=[
+            {
+                "event_type": "break_taken",
+                "timestamp": "2026-01-01T12:00:00+01:00",
+                "data": {"type": "micro", "duration": 20 + i % 5},
+            }
+            for i in range(size)
+        ],
+    )
+
+
+def orm_path(Session, payload: BatchPayload):
+    """The previous implementation: one ORM object per event."""
+    db = Session()
+    try:
+        for event in payload.events:
+            if event.event_type not in VALID_EVENT_TYPES:
+                continue
+            db.add(
+                TelemetryEvent(
+                    client_uuid=payload.client_id,
+                    event_type=event.event_type,
+                    payload=json.dumps(event.data) if event.data else None,
+                    app_version=payload.app_version,
+                    os_version=payload.platform,
+                    ip_hash=IP_HASH,
+                )
+            )
+        db.commit()
+    finally:
+        db.close()
+
+
+def core_path(Session, payload: BatchPayload):
+    db = Session()
+    try:
+        rows = _batch_rows(validate_batch(payload.model_dump()), IP_HASH)
+        if rows:
+            db.execute(insert(TelemetryEvent), rows)
+            db.commit()
+    finally:
+        db.close()
+
+
+def measure(fn, Session, payload: BatchPayload, rounds: int) -> float:
+    """Return rows per second over `rounds` requests."""
+    fn(Session, payload)  # warm-up
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn(Session, payload)
+    elapsed = time.perf_counter() - start
+    return len(payload.events) * rounds / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch insert benchmark")
+    parser.add_argument("--rounds", type=int, default=20, help="Requests per batch size")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{Path(tmp) / 'bench.db'}")
+        Base.metadata.create_all(bind=engine)
+        Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+        print(f"{'Batch':>6}  {'ORM rows/s':>12}  {'Core rows/s':>12}  {'Speedup':>7}")
+        for size in BATCH_SIZES:
+            payload = make_payload(size)
+            orm = measure(orm_path, Session, payload, args.rounds)
+            core = measure(core_path, Session, payload, args.rounds)
+            print(f"{size:>6}  {orm:>12,.0f}  {core:>12,.0f}  {core / orm:>6.1f}x")
+
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Benchmark: cost of the /metrics instrumentation per request.
+
+Runs the same FastAPI routes with and without MetricsMiddleware and the
+engine hooks, alternating requests between the two so drift hits both
+equally, and reports the median added time per request as a share of
+request time. Two routes bracket the real API: one served from memory
+(like GET /api/ads from the catalog cache) and one running a few cheap
+SQLite queries (like the ad click lookup).
+
+Usage (from server/):
+  python bench/bench_metrics_overhead.py
+  python bench/bench_metrics_overhead.py --requests 20000
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import httpx  # noqa: E402
+from fastapi import FastAPI  # noqa: E402
+from sqlalchemy import create_engine, text  # noqa: E402
+
+from app import metrics  # noqa: E402
+
+QUERIES_PER_REQUEST = 3
+
+
+def make_app(engine, instrumented: bool) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/memory")
+    def memory():
+        return {"ads": [{"id": i, "title": f"Ad {i}"} for i in range(5)]}
+
+    @app.get("/db")
+    def db():
+        with engine.connect() as conn:
+            rows = [conn.execute(text("SELECT count(*) FROM t WHERE k < :k"), {"k": i * 100}).scalar()
+                    for i in range(QUERIES_PER_REQUEST)]
+        return {"counts": rows}
+
+    if instrumented:
+        app.add_middleware(metrics.MetricsMiddleware)
+    return app
+
+
+def make_engine(path: Path):
+    engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False})
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE t (k INTEGER PRIMARY KEY)"))
+        conn.execute(text("INSERT INTO t (k) VALUES (:k)"), [{"k": i} for i in range(1000)])
+    return engine
+
+
+async def paired_times(plain, instrumented, path: str, n: int) -> tuple[list[float], list[float]]:
+    """Alternate requests between the two apps so drift hits both equally."""
+    plain_times, instrumented_times = [], []
+    async with (
+        httpx.AsyncClient(transport=httpx.ASGITransport(app=plain), base_url="http://bench") as a,
+        httpx.AsyncClient(transport=httpx.ASGITransport(app=instrumented), base_url="http://bench") as b,
+    ):
+        await a.get(path)  # warm-up
+        await b.get(path)
+        for _ in range(n):
+            start = time.perf_counter()
+            await a.get(path)
+            middle = time.perf_counter()
+            await b.get(path)
+            plain_times.append(middle - start)
+            instrumented_times.append(time.perf_counter() - middle)
+    return plain_times, instrumented_times
+
+
+async def run(n: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        plain_engine = make_engine(Path(tmp) / "plain.db")
+        instrumented_engine = make_engine(Path(tmp) / "instrumented.db")
+        metrics.instrument_engine(instrumented_engine)
+        plain = make_app(plain_engine, instrumented=False)
+        instrumented = make_app(instrumented_engine, instrumented=True)
+
+        print(f"{n} paired requests per route (median per request)")
+        print(f"{'Route':<8}  {'plain us':>9}  {'added us':>9}  {'overhead':>9}")
+        for path in ("/memory", "/db"):
+            plain_times, instrumented_times = await paired_times(plain, instrumented, path, n)
+            base = statistics.median(plain_times) * 1e6
+            added = statistics.median(
+                [i - p for p, i in zip(plain_times, instrumented_times)]
+            ) * 1e6
+            print(f"{path:<8}  {base:>9.1f}  {added:>9.1f}  {100 * added / base:>8.2f}%")
+
+        plain_engine.dispose()
+        instrumented_engine.dispose()
+
+    # Isolated cost of the bookkeeping itself, independent of ASGI noise
+    loops = 100_000
+    start = time.perf_counter()
+    for _ in range(loops):
+        metrics.http_latency.observe(0.0042, ("GET", "/bench"))
+        metrics.http_requests.inc(("GET", "/bench", 200))
+        metrics.db_queries_per_request.observe(3, ("/bench",))
+    per_request = (time.perf_counter() - start) / loops * 1e6
+    start = time.perf_counter()
+    for _ in range(loops):
+        metrics.db_statements.observe(0.0002)
+    per_statement = (time.perf_counter() - start) / loops * 1e6
+    print(f"\nrecording cost: {per_request:.2f} us per request + {per_statement:.2f} us per statement")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Metrics instrumentation overhead")
+    parser.add_argument("--requests", type=int, default=5000, help="Request pairs per route")
+    args = parser.parse_args()
+    asyncio.run(run(args.requests))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Load test: reader/writer contention with SQLite defaults vs the tuned profile.
+
+Writers do group commits of telemetry rows (like the ingest queue of each
+uvicorn worker) while readers run dashboard-style aggregates. Reports
+writer throughput, reader latency and how often either side hit
+"database is locked".
+
+Usage (from server/):
+  python bench/bench_sqlite_contention.py
+  python bench/bench_sqlite_contention.py --seconds 20 --writers 2 --readers 4
+"""
+
+import argparse
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import create_engine, event, func, insert, select  # noqa: E402
+from sqlalchemy.exc import OperationalError  # noqa: E402
+
+from app.database import SQLITE_PROFILE, Base, apply_sqlite_profile  # noqa: E402
+from app.models import TelemetryEvent  # noqa: E402
+
+# What SQLite does when nothing is configured (busy_timeout is pysqlite's 5s default)
+DEFAULT_PROFILE = {"journal_mode": "DELETE", "synchronous": "FULL"}
+
+GROUP_SIZE = 100
+SEED_ROWS = 50_000
+
+
+def make_rows(n: int, base: datetime) -> list[dict]:
+    return [
+        {
+            "client_uuid": f"client-{i % 500}",
+            "event_type": "break_taken" if i % 3 else "app_start",
+            "payload": None,
+            "app_version": "2.0.28",
+            "os_version": "windows",
+            "timestamp": base - timedelta(minutes=i % 40_000),
+            "ip_hash": "0" * 64,
+        }
+        for i in range(n)
+    ]
+
+
+def run_profile(name: str, profile: dict, seconds: float, writers: int, readers: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{Path(tmp) / 'load.db'}", pool_size=writers + readers)
+
+        @event.listens_for(engine, "connect")
+        def _connect(dbapi_connection, _record):
+            apply_sqlite_profile(dbapi_connection, profile)
+
+        Base.metadata.create_all(bind=engine)
+        now = datetime.now(timezone.utc)
+        with engine.begin() as conn:
+            conn.execute(insert(TelemetryEvent), make_rows(SEED_ROWS, now))
+
+        stop = threading.Event()
+        lock = threading.Lock()
+        commit_ms: list[float] = []
+        read_ms: list[float] = []
+        errors = {"writer": 0, "reader": 0}
+        month_ago = now - timedelta(days=30)
+
+        def writer():
+            rows = make_rows(GROUP_SIZE, now)
+            while not stop.is_set():
+                start = time.perf_counter()
+                try:
+                    with engine.begin() as conn:
+                        conn.execute(insert(TelemetryEvent), rows)
+                except OperationalError:
+                    with lock:
+                        errors["writer"] += 1
+                    continue
+                with lock:
+                    commit_ms.append((time.perf_counter() - start) * 1000)
+
+        def reader():
+            query = (
+                select(func.date(TelemetryEvent.timestamp), func.count(TelemetryEvent.id))
+                .where(TelemetryEvent.timestamp >= month_ago)
+                .group_by(func.date(TelemetryEvent.timestamp))
+            )
+            while not stop.is_set():
+                start = time.perf_counter()
+                try:
+                    with engine.connect() as conn:
+                        conn.execute(query).all()
+                except OperationalError:
+                    with lock:
+                        errors["reader"] += 1
+                    continue
+                with lock:
+                    read_ms.append((time.perf_counter() - start) * 1000)
+
+        threads = [threading.Thread(target=writer) for _ in range(writers)]
+        threads += [threading.Thread(target=reader) for _ in range(readers)]
+        for t in threads:
+            t.start()
+        time.sleep(seconds)
+        stop.set()
+        for t in threads:
+            t.join()
+        engine.dispose()
+
+    def pct(values: list[float], q: float) -> float:
+        if not values:
+            return float("nan")
+        values = sorted(values)
+        return values[min(len(values) - 1, int(len(values) * q))]
+
+    return {
+        "name": name,
+        "rows_per_s": len(commit_ms) * GROUP_SIZE / seconds,
+        "commit_p99": pct(commit_ms, 0.99),
+        "reads_per_s": len(read_ms) / seconds,
+        "read_p50": statistics.median(read_ms) if read_ms else float("nan"),
+        "read_p99": pct(read_ms, 0.99),
+        "locked": errors["writer"] + errors["reader"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLite contention load test")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--writers", type=int, default=2)
+    parser.add_argument("--readers", type=int, default=4)
+    args = parser.parse_args()
+
+    print(f"{'Profile':<8}  {'rows/s':>9}  {'commit p99':>10}  {'reads/s':>8}  {'read p50':>8}  {'read p99':>8}  {'locked':>6}")
+    for name, profile in (("default", DEFAULT_PROFILE), ("tuned", SQLITE_PROFILE)):
+        r = run_profile(name, profile, args.seconds, args.writers, args.readers)
+        print(
+            f"{r['name']:<8}  {r['rows_per_s']:>9,.0f}  {r['commit_p99']:>8.1f}ms  {r['reads_per_s']:>8,.1f}"
+            f"  {r['read_p50']:>6.1f}ms  {r['read_p99']:>6.1f}ms  {r['locked']:>6}"
+        )
+
+
+if __name__ == "__main__":
+    main()
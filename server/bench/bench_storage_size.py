@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Benchmark: bytes per telemetry event — wide legacy table vs compact partitions.
+
+Writes the same synthetic events into two fresh SQLite files, one through
+the old wide TelemetryEvent table and one through partitions.insert_events
+(interned dimensions, epoch timestamps, binary IP hashes), then VACUUMs
+both and compares file size per event.
+
+Usage (from server/):
+  python bench/bench_storage_size.py
+  python bench/bench_storage_size.py --events 500000 --clients 20000
+"""
+
+import argparse
+import hashlib
+import json
+import random
+import sys
+import tempfile
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import create_engine, insert  # noqa: E402
+
+from app import dimensions, partitions  # noqa: E402
+from app.database import Base  # noqa: E402
+from app.models import TelemetryEvent  # noqa: E402
+
+CHUNK = 10_000
+EVENT_TYPES = ["app_start", "app_close", "break_taken", "break_skipped", "audio_play", "water_log"]
+APP_VERSIONS = ["2.0.25", "2.0.26", "2.0.27", "2.0.28"]
+OS_VERSIONS = ["Windows 10", "Windows 11", "macOS 14", "Ubuntu 24.04"]
+
+
+def make_events(n: int, n_clients: int, days: int, seed: int = 1):
+    rng = random.Random(seed)
+    clients = [str(uuid.UUID(int=rng.getrandbits(128))) for _ in range(n_clients)]
+    ip_hashes = [hashlib.sha256(f"ip-{i}".encode()).hexdigest() for i in range(n_clients)]
+    start = datetime(2026, 1, 1)
+    for _ in range(n):
+        c = rng.randrange(n_clients)
+        event_type = rng.choice(EVENT_TYPES)
+        payload = None
+        if event_type == "break_taken":
+            payload = json.dumps({"type": "micro", "duration_sec": 20})
+        elif event_type == "audio_play":
+            payload = json.dumps({"sound_type": "rain"})
+        yield {
+            "client_uuid": clients[c],
+            "event_type": event_type,
+            "payload": payload,
+            "app_version": rng.choice(APP_VERSIONS),
+            "os_version": rng.choice(OS_VERSIONS),
+            "timestamp": start + timedelta(seconds=rng.randrange(days * 86400)),
+            "ip_hash": ip_hashes[c],
+        }
+
+
+def chunks(events):
+    chunk = []
+    for event in events:
+        chunk.append(event)
+        if len(chunk) == CHUNK:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def file_size(engine, path: Path) -> int:
+    with engine.connect() as conn:
+        conn.exec_driver_sql("VACUUM")
+    engine.dispose()
+    return path.stat().st_size
+
+
+def run(n: int, n_clients: int, days: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        wide_path = Path(tmp) / "wide.db"
+        wide_engine = create_engine(f"sqlite:///{wide_path}")
+        TelemetryEvent.__table__.create(wide_engine)
+        with wide_engine.begin() as conn:
+            for chunk in chunks(make_events(n, n_clients, days)):
+                conn.execute(insert(TelemetryEvent), chunk)
+        wide = file_size(wide_engine, wide_path)
+
+        compact_path = Path(tmp) / "compact.db"
+        compact_engine = create_engine(f"sqlite:///{compact_path}")
+        Base.metadata.create_all(compact_engine)
+        dimensions.clear_caches()
+        with compact_engine.begin() as conn:
+            for chunk in chunks(make_events(n, n_clients, days)):
+                partitions.insert_events(conn, chunk)
+        compact = file_size(compact_engine, compact_path)
+
+    print(f"{n} events, {n_clients} clients, {days} days (file size after VACUUM, incl. indexes)")
+    print(f"  wide     {wide / 1e6:8.1f} MB  {wide / n:6.1f} B/event")
+    print(f"  compact  {compact / 1e6:8.1f} MB  {compact / n:6.1f} B/event")
+    print(f"  saved    {100 * (1 - compact / wide):5.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Telemetry storage size: wide vs compact")
+    parser.add_argument("--events", type=int, default=200_000)
+    parser.add_argument("--clients", type=int, default=5_000)
+    parser.add_argument("--days", type=int, default=60)
+    args = parser.parse_args()
+    run(args.events, args.clients, args.days)
+
+
+if __name__ == "__main__":
+    main()
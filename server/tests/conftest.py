@@ -0,0 +1,157 @@
+"""Test fixtures.
+
+``db`` runs a database test once on SQLite and once on PostgreSQL: an
+embedded server from pgserver (requirements-test.txt), or the database in
+TEST_DATABASE_URL, whose public schema is wiped after each test. Without
+either, the postgresql runs are skipped.
+
+``client`` / ``admin_client`` drive the whole app over HTTP. The app's own
+engines, caches and files live in a scratch directory, never in data/.
+"""
+
+import os
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+_APP_DIR = Path(tempfile.mkdtemp(prefix="healthdesk-tests-"))
+os.environ["DATABASE_URL"] = f"sqlite:///{_APP_DIR / 'healthdesk_api.db'}"
+os.environ["DASHBOARD_CACHE_PATH"] = str(_APP_DIR / "dashboard_cache.db")
+os.environ["INGEST_DEAD_LETTER_PATH"] = str(_APP_DIR / "ingest_dead_letter.jsonl")
+os.environ["SLOW_QUERY_LOG"] = "1"
+
+import pytest  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from sqlalchemy import create_engine, event  # noqa: E402
+
+from app import dedup, dimensions, ingest, partitions  # noqa: E402
+from app.ad_cache import ad_catalog  # noqa: E402
+from app.auth import create_access_token  # noqa: E402
+from app.dashboard import section_cache  # noqa: E402
+from app.database import CONNECT_ARGS, Base, apply_sqlite_profile, sync_url  # noqa: E402
+from app.database import engine as app_engine  # noqa: E402
+from app.main import app  # noqa: E402
+from app.models import Ad  # noqa: E402
+from app.routers import telemetry  # noqa: E402
+
+TEST_DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+
+
+@pytest.fixture(scope="session")
+def postgres_url(tmp_path_factory):
+    if TEST_DATABASE_URL:
+        yield TEST_DATABASE_URL
+        return
+    pgserver = pytest.importorskip("pgserver")
+    try:
+        server = pgserver.get_server(tmp_path_factory.mktemp("pgdata"), cleanup_mode="stop")
+    except Exception as exc:
+        pytest.skip(f"PostgreSQL unavailable: {exc}")
+    yield server.get_uri()
+    server.cleanup()
+
+
+def _reset_caches():
+    dimensions.clear_caches()
+    partitions.clear_caches()
+
+
+def _drop_all(engine):
+    with engine.begin() as conn:
+        conn.exec_driver_sql("DROP SCHEMA IF EXISTS archive CASCADE")
+        conn.exec_driver_sql("DROP SCHEMA public CASCADE")
+        conn.exec_driver_sql("CREATE SCHEMA public")
+
+
+@pytest.fixture(params=["sqlite", "postgresql"])
+def db(request, tmp_path, monkeypatch):
+    """Engine on a fresh schema; modules with their own transactions use it too."""
+    backend = request.param
+    if backend == "sqlite":
+        url = f"sqlite:///{tmp_path / 'test.db'}"
+    else:
+        url = request.getfixturevalue("postgres_url")
+    engine = create_engine(sync_url(url), connect_args=CONNECT_ARGS[backend])
+    if backend == "sqlite":
+        event.listen(engine, "connect", lambda dbapi_connection, _: apply_sqlite_profile(dbapi_connection))
+    else:
+        _drop_all(engine)
+
+    monkeypatch.setattr(ingest, "engine", engine)
+    monkeypatch.setattr(partitions, "engine", engine)
+    monkeypatch.setattr(partitions, "ARCHIVE_DIR", tmp_path / "archive")
+    monkeypatch.setattr(ingest, "INGEST_DEAD_LETTER_PATH", tmp_path / "ingest_dead_letter.jsonl")
+    monkeypatch.setattr(ingest, "INGEST_RETRY_DELAY", 0)
+    _reset_caches()
+
+    with engine.begin() as conn:
+        Base.metadata.create_all(conn)
+        partitions.create_parent(conn)
+        conn.execute(
+            Ad.__table__.insert(), {"id": 1, "title": "Ad", "text": "Text", "url": "https://example.com"}
+        )
+    yield engine
+
+    _reset_caches()
+    if backend == "postgresql":
+        _drop_all(engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def app_db(monkeypatch, tmp_path):
+    """The app's own SQLite engine on empty tables, with its caches reset."""
+    with app_engine.begin() as conn:
+        for name in partitions.list_partitions(conn):
+            conn.exec_driver_sql(f"DROP TABLE {name}")
+        Base.metadata.drop_all(conn)
+        Base.metadata.create_all(conn)
+    _reset_caches()
+    ad_catalog.invalidate()
+    section_cache.clear()
+    fresh = dedup.RecentKeys(capacity=10_000, error_rate=0.001, window=3600)
+    monkeypatch.setattr(dedup, "recent_events", fresh)
+    monkeypatch.setattr(telemetry, "recent_events", fresh)
+    monkeypatch.setattr(partitions, "ARCHIVE_DIR", tmp_path / "archive")
+    yield app_engine
+    # Rows a test queued but did not flush
+    ingest.ingest_queue._drain_remaining()
+
+
+@pytest.fixture
+def client(app_db):
+    """Client without the lifespan: the ingest writer is flushed with ``flush``."""
+    return TestClient(app)
+
+
+@pytest.fixture
+def admin_client(app_db):
+    return TestClient(app, cookies={"access_token": create_access_token({"sub": "admin"})})
+
+
+@pytest.fixture
+def flush():
+    """Commit everything the handlers queued so far."""
+    return ingest.ingest_queue._drain_remaining
+
+
+def add_ad(engine, **fields) -> int:
+    values = {"title": "Ad", "text": "Text", "url": "https://example.com", **fields}
+    with engine.begin() as conn:
+        return conn.execute(Ad.__table__.insert().values(values)).inserted_primary_key[0]
+
+
+def event_row(
+    client: str, event_type: str, timestamp: datetime, payload: str | None = None, **extra
+) -> dict:
+    """A TelemetryEvent-shaped row as the telemetry router queues it."""
+    return {
+        "client_uuid": client,
+        "event_type": event_type,
+        "payload": payload,
+        "app_version": "1.2.0",
+        "os_version": "windows",
+        "timestamp": timestamp,
+        "ip_hash": "ab" * 32,
+        **extra,
+    }
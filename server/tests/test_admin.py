@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta
+
+import pytest
+from conftest import add_ad, event_row
+from sqlalchemy import insert
+
+from app.models import DailyAdCount
+from app.partitions import insert_events
+
+
+def _add_counts(engine, ad_id: int, days: dict[str, tuple[int, int]]) -> None:
+    """days: {"YYYY-MM-DD": (impressions, clicks)}"""
+    with engine.begin() as conn:
+        conn.execute(
+            insert(DailyAdCount),
+            [
+                {"day": day, "ad_id": ad_id, "impressions": shown, "clicks": clicked}
+                for day, (shown, clicked) in days.items()
+            ],
+        )
+
+
+def test_ads_list_sums_counts_in_the_date_range(admin_client, app_db):
+    ad_id = add_ad(app_db, title="Standing desk")
+    _add_counts(
+        app_db, ad_id, {"2024-01-01": (10, 1), "2024-01-02": (20, 2), "2024-01-03": (40, 4)}
+    )
+    response = admin_client.get(
+        "/admin/ads", params={"date_from": "2024-01-02", "date_to": "2024-01-03"}
+    )
+    assert response.status_code == 200
+    assert ">60<" in response.text and ">6<" in response.text
+    assert 'value="2024-01-02"' in response.text
+
+
+def test_ads_list_accepts_the_empty_filter_form(admin_client, app_db):
+    ad_id = add_ad(app_db)
+    _add_counts(app_db, ad_id, {"2024-01-01": (10, 1), "2024-01-02": (20, 2)})
+    response = admin_client.get("/admin/ads", params={"date_from": "", "date_to": ""})
+    assert response.status_code == 200
+    assert ">30<" in response.text
+
+
+def test_ads_list_rejects_invalid_dates(admin_client, app_db):
+    assert admin_client.get("/admin/ads", params={"date_from": "garbage"}).status_code == 422
+
+
+@pytest.fixture
+def five_events(app_db):
+    start = datetime(2026, 3, 14, 9, 0)
+    with app_db.begin() as conn:
+        insert_events(
+            conn, [event_row(f"client-{i}", "app_start", start + timedelta(minutes=i)) for i in range(5)]
+        )
+
+
+def test_telemetry_events_returns_the_newest_first(admin_client, five_events):
+    response = admin_client.get(
+        "/admin/telemetry/events", params={"start": "2026-03-14", "limit": 2}
+    )
+    assert response.status_code == 200
+    assert [row["client_uuid"] for row in response.json()] == ["client-4", "client-3"]
+
+
+@pytest.mark.parametrize("limit", [0, -1, 1001])
+def test_telemetry_events_rejects_out_of_range_limits(admin_client, five_events, limit):
+    response = admin_client.get(
+        "/admin/telemetry/events", params={"start": "2026-03-14", "limit": limit}
+    )
+    assert response.status_code == 422
@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import insert
+
+from app.models import DailyEventCount
+
+
+def _day(days_ago: int) -> str:
+    return (datetime.now(timezone.utc) - timedelta(days=days_ago)).strftime("%Y-%m-%d")
+
+
+@pytest.fixture
+def event_counts(app_db):
+    with app_db.begin() as conn:
+        conn.execute(insert(DailyEventCount), [
+            {"day": _day(2), "event_type": "app_start", "count": 5},
+            {"day": _day(1), "event_type": "app_start", "count": 4},
+            {"day": _day(0), "event_type": "app_start", "count": 3},
+        ])
+
+
+def test_panels_require_a_login(client):
+    response = client.get("/admin/api/summary", follow_redirects=False)
+    assert response.status_code == 303
+
+
+def test_unchanged_panel_is_304(admin_client, event_counts):
+    response = admin_client.get("/admin/api/summary")
+    assert response.json()["events_today"] == 3
+    etag = response.headers["etag"]
+    assert response.headers["cache-control"] == "private, no-cache"
+
+    response = admin_client.get("/admin/api/summary", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+
+
+def test_refresh_changes_the_etag(admin_client, app_db, event_counts):
+    etag = admin_client.get("/admin/api/summary").headers["etag"]
+    with app_db.begin() as conn:
+        conn.execute(insert(DailyEventCount).values(day=_day(0), event_type="app_stop", count=2))
+    assert admin_client.post("/admin/api/refresh").status_code == 200
+
+    response = admin_client.get("/admin/api/summary", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert response.json()["events_today"] == 5
+
+
+def test_series_cursor_returns_only_new_points(admin_client, event_counts):
+    full = admin_client.get("/admin/api/events-daily").json()
+    assert full["full"] is True
+    assert full["points"] == [[_day(2), 5], [_day(1), 4], [_day(0), 3]]
+    assert full["cursor"].startswith(_day(0) + "_")
+
+    response = admin_client.get("/admin/api/events-daily", params={"since": full["cursor"]})
+    assert response.json()["full"] is False
+    assert response.json()["points"] == [[_day(0), 3]]
+    # The cursor is part of the ETag: it selects a different body
+    assert response.headers["etag"] != admin_client.get("/admin/api/events-daily").headers["etag"]
+
+
+def test_outdated_cursor_gets_the_full_series(admin_client, event_counts):
+    cursor = admin_client.get("/admin/api/events-daily").json()["cursor"]
+    admin_client.post("/admin/api/refresh")
+
+    response = admin_client.get("/admin/api/events-daily", params={"since": cursor})
+    assert response.json()["full"] is True
+    assert len(response.json()["points"]) == 3
+    assert response.json()["cursor"] != cursor
@@ -0,0 +1,121 @@
+import pytest
+from conftest import add_ad
+from sqlalchemy import func, select
+
+from app.ad_cache import RecentImpressions
+from app.models import AdImpression
+from app.routers import ads
+
+
+@pytest.fixture
+def cap_one(monkeypatch):
+    """Every ad is capped after one impression per client."""
+    monkeypatch.setattr(ads, "recent_impressions", RecentImpressions(1, 3600, 100))
+
+
+def _impressions(engine, event_type: str = "impression") -> int:
+    with engine.connect() as conn:
+        return conn.execute(
+            select(func.count(AdImpression.id)).where(AdImpression.event_type == event_type)
+        ).scalar()
+
+
+def test_list_returns_active_ads_with_an_etag(client, app_db):
+    shown = add_ad(app_db, title="Shown")
+    add_ad(app_db, title="Hidden", is_active=False)
+    response = client.get("/api/ads")
+    assert response.status_code == 200
+    assert [ad["id"] for ad in response.json()] == [shown]
+    assert response.headers["etag"].startswith('"')
+    assert response.headers["cache-control"] == "no-cache"
+
+
+def test_list_revalidation_is_304_until_an_ad_changes(admin_client, app_db):
+    ad_id = add_ad(app_db, title="Before")
+    etag = admin_client.get("/api/ads").headers["etag"]
+    response = admin_client.get("/api/ads", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+
+    admin_client.post(
+        f"/admin/ads/{ad_id}/edit",
+        data={"title": "After", "text": "Text", "url": "https://example.com"},
+        follow_redirects=False,
+    )
+    response = admin_client.get("/api/ads", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert response.json()[0]["title"] == "After"
+
+
+def test_list_is_in_weighted_random_order(client, app_db):
+    light, heavy = add_ad(app_db, weight=1), add_ad(app_db, weight=1000)
+    firsts = [client.get("/api/ads").json()[0]["id"] for _ in range(50)]
+    assert firsts.count(heavy) >= 45
+    assert sorted(ad["id"] for ad in client.get("/api/ads").json()) == [light, heavy]
+
+
+def test_get_ad_returns_one_ad_and_logs_an_impression(client, app_db, flush):
+    ad_id = add_ad(app_db, title="Standing desk")
+    response = client.get("/api/ads/get", params={"client_id": "c1"})
+    assert response.status_code == 200
+    assert response.json()["ad_id"] == str(ad_id)
+    assert response.json()["title"] == "Standing desk"
+    assert response.headers["etag"].endswith(f'-{ad_id}"')
+    assert response.headers["cache-control"] == f"private, max-age={ads.AD_CLIENT_MAX_AGE}"
+    flush()
+    assert _impressions(app_db) == 1
+
+
+def test_get_ad_without_active_ads_is_404(client, app_db):
+    add_ad(app_db, is_active=False)
+    assert client.get("/api/ads/get", params={"client_id": "c1"}).status_code == 404
+
+
+def test_revalidation_of_the_picked_ad_is_304_and_counted(client, app_db, flush):
+    add_ad(app_db)
+    etag = client.get("/api/ads/get", params={"client_id": "c1"}).headers["etag"]
+    response = client.get(
+        "/api/ads/get", params={"client_id": "c1"}, headers={"If-None-Match": etag}
+    )
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+    flush()
+    assert _impressions(app_db) == 2
+
+
+def test_revalidation_rotates_to_another_ad_once_capped(client, app_db, cap_one):
+    first, second = add_ad(app_db, title="First"), add_ad(app_db, title="Second")
+    served = client.get("/api/ads/get", params={"client_id": "c1"})
+    response = client.get(
+        "/api/ads/get", params={"client_id": "c1"}, headers={"If-None-Match": served.headers["etag"]}
+    )
+    assert response.status_code == 200
+    assert {served.json()["ad_id"], response.json()["ad_id"]} == {str(first), str(second)}
+
+
+def test_capped_client_still_gets_an_ad(client, app_db, cap_one):
+    ad_id = add_ad(app_db)
+    for _ in range(3):
+        response = client.get("/api/ads/get", params={"client_id": "c1"})
+        assert response.json()["ad_id"] == str(ad_id)
+
+
+def test_click_is_logged_for_a_known_ad(client, app_db, flush):
+    ad_id = add_ad(app_db)
+    response = client.post("/api/ads/click", json={"ad_id": str(ad_id), "client_id": "c1"})
+    assert response.json() == {"status": "accepted"}
+    flush()
+    assert _impressions(app_db, "click") == 1
+
+
+def test_click_on_unknown_ad_is_404(client, app_db):
+    response = client.post("/api/ads/click", json={"ad_id": "999", "client_id": "c1"})
+    assert response.status_code == 404
+
+
+def test_click_on_builtin_fallback_ad_is_ignored(client, app_db, flush):
+    response = client.post("/api/ads/click", json={"ad_id": "fallback_1", "client_id": "c1"})
+    assert response.json() == {"status": "ignored"}
+    flush()
+    assert _impressions(app_db, "click") == 0
@@ -0,0 +1,108 @@
+import gzip
+import json
+
+import pytest
+
+from app import batch_formats
+from app.batch_formats import msgpack, zstandard
+from app.routers import telemetry
+
+URL = "/api/telemetry/batch"
+
+
+def _batch(*events, **fields) -> dict:
+    return {"client_id": "client-1", "platform": "linux", "events": list(events), **fields}
+
+
+def _post(client, body: bytes, content_type="application/json", encoding=None):
+    headers = {"Content-Type": content_type}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return client.post(URL, content=body, headers=headers)
+
+
+def _json(obj) -> bytes:
+    return json.dumps(obj).encode()
+
+
+@pytest.fixture
+def small_limit(monkeypatch):
+    monkeypatch.setattr(batch_formats, "TELEMETRY_MAX_BATCH_BYTES", 1024)
+    monkeypatch.setattr(telemetry, "TELEMETRY_MAX_BATCH_BYTES", 1024)
+
+
+def test_payload_text_matches_json_dumps():
+    data = {"name": "Deszcz", "volume": 0.5, "tags": ["rain", None, True], "nested": {"a": 1}}
+    batch = batch_formats.validate_batch(_batch({"event_type": "audio_play", "data": data}))
+    assert batch["events"][0]["payload"] == json.dumps(data)
+
+
+@pytest.mark.parametrize("encoding", ["identity", "gzip", "zstd"])
+def test_encodings_are_accepted(client, encoding):
+    body = _json(_batch({"event_type": "app_start"}, {"event_type": "app_stop"}))
+    if encoding == "gzip":
+        body = gzip.compress(body)
+    elif encoding == "zstd":
+        if not zstandard:
+            pytest.skip("zstandard not installed")
+        body = zstandard.ZstdCompressor().compress(body)
+    response = _post(client, body, encoding=encoding)
+    assert response.status_code == 202
+    assert response.json()["count"] == 2
+
+
+def test_msgpack_is_accepted(client):
+    if not msgpack:
+        pytest.skip("msgpack not installed")
+    body = msgpack.packb(_batch({"event_type": "water_logged", "data": {"glasses": 2}}))
+    assert _post(client, body, content_type="application/msgpack").status_code == 202
+
+
+@pytest.mark.parametrize(
+    "body, encoding",
+    [
+        (b"{not json", None),
+        (b"not gzip at all", "gzip"),
+        (gzip.compress(b'{"client_id": "c", "events": []}')[:-8], "gzip"),
+    ],
+    ids=["json", "gzip", "truncated-gzip"],
+)
+def test_undecodable_bodies_are_400(client, body, encoding):
+    assert _post(client, body, encoding=encoding).status_code == 400
+
+
+def test_oversized_bodies_are_413(client, small_limit):
+    assert _post(client, b" " * 2048).status_code == 413
+
+
+def test_decompression_past_the_limit_is_413(client, small_limit):
+    bomb = gzip.compress(_json(_batch({"event_type": "app_start", "data": {"pad": "x" * 4096}})))
+    assert len(bomb) < 1024
+    assert _post(client, bomb, encoding="gzip").status_code == 413
+
+
+@pytest.mark.parametrize(
+    "content_type, encoding",
+    [("text/plain", None), ("application/json", "br")],
+)
+def test_unsupported_formats_are_415(client, content_type, encoding):
+    body = _json(_batch({"event_type": "app_start"}))
+    assert _post(client, body, content_type=content_type, encoding=encoding).status_code == 415
+
+
+@pytest.mark.parametrize(
+    "batch",
+    [
+        [],
+        {"events": []},
+        _batch({"event_type": 5}),
+        _batch({"event_type": "app_start", "timestamp": 1700000000}),
+        _batch({"event_type": "app_start", "data": [1, 2]}),
+        _batch({"event_type": "app_start", "seq": "1"}),
+        _batch({"event_type": "app_start", "seq": True}),
+        _batch({"event_type": "app_start"}, sent_at=5),
+    ],
+    ids=["not-object", "no-client", "event-type", "timestamp", "data", "seq", "bool-seq", "sent-at"],
+)
+def test_invalid_batches_are_422(client, batch):
+    assert _post(client, _json(batch)).status_code == 422
@@ -0,0 +1,115 @@
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from app import dashboard
+from app.dashboard import SectionCache
+
+TTL = 30.0
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """dashboard's time.time(), moved by hand."""
+    now = SimpleNamespace(value=1_000_000.0)
+    monkeypatch.setattr(dashboard, "time", SimpleNamespace(time=lambda: now.value))
+    monkeypatch.setattr(dashboard, "DASHBOARD_MAX_STALE", 600.0)
+    return now
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return SectionCache(tmp_path / "sections.db")
+
+
+class Computer:
+    """compute() returning {"n": <call number>}; ``gate`` holds calls back."""
+
+    def __init__(self, fail: bool = False):
+        self.calls = 0
+        self.fail = fail
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def __call__(self) -> dict:
+        self.gate.wait(5)
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError("query failed")
+        return {"n": self.calls}
+
+
+def _wait_for_refreshes():
+    for thread in threading.enumerate():
+        if thread.name == "dashboard-refresh":
+            thread.join(5)
+
+
+def test_fresh_section_is_computed_once(cache, clock):
+    compute = Computer()
+    assert cache.get("today", TTL, compute) == ({"n": 1}, clock.value)
+    clock.value += TTL - 1
+    assert cache.get("today", TTL, compute)[0] == {"n": 1}
+    assert compute.calls == 1
+
+
+def test_stale_section_is_served_while_one_refresh_runs(cache, clock):
+    compute = Computer()
+    cache.get("today", TTL, compute)
+    clock.value += TTL + 1
+    compute.gate.clear()
+    # Both requests get the stale value at once; only the first starts a refresh
+    assert cache.get("today", TTL, compute)[0] == {"n": 1}
+    assert cache.get("today", TTL, compute)[0] == {"n": 1}
+    compute.gate.set()
+    _wait_for_refreshes()
+    assert compute.calls == 2
+    value, computed_at = cache.get("today", TTL, compute)
+    assert value == {"n": 2}
+    assert computed_at == clock.value
+
+
+def test_refresh_is_shared_by_processes_using_the_same_file(cache, clock, tmp_path):
+    compute = Computer()
+    cache.get("today", TTL, compute)
+    clock.value += TTL + 1
+    compute.gate.clear()
+    other_worker = SectionCache(tmp_path / "sections.db")
+    cache.get("today", TTL, compute)
+    assert other_worker.get("today", TTL, compute)[0] == {"n": 1}
+    compute.gate.set()
+    _wait_for_refreshes()
+    assert compute.calls == 2
+    assert other_worker.get("today", TTL, compute)[0] == {"n": 2}
+
+
+def test_long_expired_section_is_computed_inline(cache, clock):
+    compute = Computer()
+    cache.get("today", TTL, compute)
+    clock.value += TTL + dashboard.DASHBOARD_MAX_STALE + 1
+    assert cache.get("today", TTL, compute)[0] == {"n": 2}
+
+
+def test_force_recomputes_inline(cache, clock):
+    compute = Computer()
+    cache.get("today", TTL, compute)
+    clock.value += 1
+    assert cache.get("today", TTL, compute, force=True)[0] == {"n": 2}
+
+
+def test_failed_refresh_keeps_the_stale_section_until_the_lease_ends(cache, clock):
+    cache.get("today", TTL, Computer())
+    clock.value += TTL + 1
+    failing = Computer(fail=True)
+    assert cache.get("today", TTL, failing)[0] == {"n": 1}
+    _wait_for_refreshes()
+    assert failing.calls == 1
+    # The lease spaces out retries
+    assert cache.get("today", TTL, failing)[0] == {"n": 1}
+    _wait_for_refreshes()
+    assert failing.calls == 1
+    clock.value += dashboard._REFRESH_LEASE + 1
+    cache.get("today", TTL, failing)
+    _wait_for_refreshes()
+    assert failing.calls == 2
@@ -0,0 +1,78 @@
+import threading
+import time
+from datetime import datetime
+
+import pytest
+from conftest import event_row
+from sqlalchemy import text
+
+pytest.importorskip("pyarrow")
+
+from app import export  # noqa: E402
+from app.models import Download  # noqa: E402
+from app.partitions import insert_events  # noqa: E402
+
+TS = datetime(2026, 3, 14, 9, 26)
+
+
+@pytest.fixture
+def exporter(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(export, "engine", db)
+    monkeypatch.setattr(export, "EXPORT_DIR", tmp_path / "export")
+    monkeypatch.setattr(export, "STATE_FILE", tmp_path / "export" / "_state.json")
+    return export.run_export
+
+
+def _download() -> dict:
+    return {"platform": "linux", "source": None, "language": "en", "ip_hash": "cd" * 32, "timestamp": TS}
+
+
+def test_export_is_incremental(db, exporter):
+    with db.begin() as conn:
+        insert_events(conn, [event_row(f"c{i}", "app_start", TS) for i in range(3)])
+        conn.execute(Download.__table__.insert(), [_download(), _download()])
+    assert exporter() == {"telemetry": 3, "downloads": 2, "ad_events": 0}
+    assert list((export.EXPORT_DIR / "telemetry").glob("day=2026-03-14/*.parquet"))
+
+    with db.begin() as conn:
+        conn.execute(Download.__table__.insert(), [_download()])
+    assert exporter() == {"telemetry": 0, "downloads": 1, "ad_events": 0}
+
+
+def _uncommitted_download(db):
+    """A connection holding an inserted but uncommitted download, as the ingest writer would."""
+    conn = db.connect()
+    conn.execute(text("SELECT pg_current_xact_id()"))
+    conn.execute(Download.__table__.insert(), [_download()])
+    return conn
+
+
+def test_export_waits_for_rows_committed_out_of_id_order(db, exporter):
+    if db.dialect.name != "postgresql":
+        pytest.skip("SQLite commits are serialized")
+    slow = _uncommitted_download(db)
+    # A higher id commits first
+    with db.begin() as conn:
+        conn.execute(Download.__table__.insert(), [_download()])
+
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(exporter()))
+    thread.start()
+    time.sleep(0.3)
+    assert thread.is_alive()
+    slow.commit()
+    slow.close()
+    thread.join(5)
+    assert result["downloads"] == 2
+
+
+def test_commit_horizons_give_up_on_long_transactions(db):
+    if db.dialect.name != "postgresql":
+        pytest.skip("SQLite commits are serialized")
+    slow = _uncommitted_download(db)
+    try:
+        with db.connect() as conn, pytest.raises(RuntimeError):
+            export.commit_horizons(conn, [Download.__table__], timeout=0.2)
+    finally:
+        slow.rollback()
+        slow.close()
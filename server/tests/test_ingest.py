@@ -0,0 +1,164 @@
+import json
+from datetime import datetime
+
+import pytest
+from conftest import event_row
+from sqlalchemy import func, select
+from sqlalchemy.exc import OperationalError
+
+from app import dialect, ingest, partitions
+from app.dedup import event_key
+from app.ingest import IngestQueue, replay_dead_letter
+from app.models import AdImpression, DailyEventCount, Download, TelemetryEvent
+from app.partitions import events_between
+
+TS = datetime(2026, 3, 14, 9, 26)
+
+
+def _queue() -> IngestQueue:
+    return IngestQueue(maxsize=100, batch_size=500, flush_interval=0.05)
+
+
+def _count_events(engine) -> int:
+    with engine.connect() as conn:
+        return conn.execute(select(func.count()).select_from(events_between(conn))).scalar()
+
+
+def _keyed_rows(batch_id: str, count: int = 5) -> list[dict]:
+    return [
+        event_row(
+            "client-1", "app_start", TS,
+            dedup_key=event_key("client-1", batch_id, seq, "app_start", None, None),
+        )
+        for seq in range(count)
+    ]
+
+
+def _fail(times: int, exc: Exception):
+    """insert_events that raises ``exc`` for the first ``times`` calls."""
+    real = ingest.insert_events
+    calls = {"left": times}
+
+    def insert_events(conn, rows):
+        if calls["left"]:
+            calls["left"] -= 1
+            raise exc
+        return real(conn, rows)
+
+    return insert_events
+
+
+def _locked() -> OperationalError:
+    return OperationalError("INSERT", {}, Exception("database is locked"))
+
+
+def test_writer_commits_queued_rows(db):
+    queue = _queue()
+    queue.start()
+    queue.put(TelemetryEvent, [event_row(f"client-{i}", "app_start", TS) for i in range(20)])
+    queue.put(Download, [{"platform": "linux", "source": None, "language": "en",
+                          "ip_hash": "cd" * 32, "timestamp": TS}])
+    queue.put(AdImpression, [{"ad_id": 1, "event_type": "click", "client_uuid": "client-1",
+                              "ip_hash": "ef" * 32, "timestamp": TS}])
+    queue.stop()
+
+    stats = queue.stats()
+    assert stats["committed_rows"] == stats["submitted_rows"] == 22
+    assert stats["failed_rows"] == 0
+    assert _count_events(db) == 20
+    with db.connect() as conn:
+        assert conn.execute(select(func.count(Download.id))).scalar() == 1
+        assert conn.execute(select(func.count(AdImpression.id))).scalar() == 1
+        assert conn.execute(select(DailyEventCount.count)).scalar() == 20
+
+
+def test_postgres_ingest_uses_copy(db, monkeypatch):
+    if db.dialect.name != "postgresql":
+        pytest.skip("COPY is the PostgreSQL write path")
+
+    def no_insert(table):
+        raise AssertionError(f"executemany INSERT into {table.name} instead of COPY")
+
+    monkeypatch.setattr(dialect, "insert", no_insert)
+    queue = _queue()
+    queue._commit([
+        (TelemetryEvent, [event_row(f"client-{i}", "app_start", TS) for i in range(50)]),
+        (Download, [{"platform": "linux", "source": None, "language": "en",
+                     "ip_hash": "cd" * 32, "timestamp": TS}]),
+    ])
+    assert queue.stats()["committed_rows"] == 51
+    assert _count_events(db) == 50
+
+
+def test_duplicate_batches_are_stored_once(db):
+    queue = _queue()
+    queue._commit([(TelemetryEvent, _keyed_rows("b1"))])
+    # The client's retry, possibly handled by another worker
+    queue._commit([(TelemetryEvent, _keyed_rows("b1")), (TelemetryEvent, _keyed_rows("b1"))])
+    queue._commit([(TelemetryEvent, _keyed_rows("b2"))])
+    assert _count_events(db) == 10
+    with db.connect() as conn:
+        assert conn.execute(select(DailyEventCount.count)).scalar() == 10
+
+
+def test_transient_failure_is_retried(db, monkeypatch):
+    monkeypatch.setattr(ingest, "insert_events", _fail(1, _locked()))
+    queue = _queue()
+    queue._commit([(TelemetryEvent, _keyed_rows("b1"))])
+
+    stats = queue.stats()
+    assert stats["retried_commits"] == 1
+    assert stats["committed_rows"] == 5
+    assert stats["failed_rows"] == 0
+    assert _count_events(db) == 5
+
+
+def test_failed_commit_forgets_created_partitions(db, monkeypatch):
+    real = ingest.insert_events
+    calls = []
+
+    def insert_events(conn, rows):
+        calls.append(rows)
+        if len(calls) == 1:
+            # The partition is created, then the transaction rolls back
+            partitions.ensure_partition(conn, partitions.partition_name(TS))
+            raise ValueError("boom")
+        return real(conn, rows)
+
+    monkeypatch.setattr(ingest, "insert_events", insert_events)
+    queue = _queue()
+    queue._commit([(TelemetryEvent, [event_row("client-1", "app_start", TS)])])
+    queue._commit([(TelemetryEvent, [event_row("client-1", "app_start", TS)])])
+    assert queue.stats()["committed_rows"] == 1
+    assert _count_events(db) == 1
+
+
+def test_failed_rows_are_dead_lettered_and_replayed(db, monkeypatch):
+    monkeypatch.setattr(ingest, "insert_events", _fail(2, _locked()))
+    queue = _queue()
+    queue._commit([(TelemetryEvent, _keyed_rows("b1"))])
+
+    stats = queue.stats()
+    assert stats["failed_rows"] == stats["dead_lettered_rows"] == 5
+    assert _count_events(db) == 0
+    path = ingest.INGEST_DEAD_LETTER_PATH
+    record = json.loads(path.read_text(encoding="utf-8"))
+    assert record["table"] == "telemetry_events"
+    assert len(record["rows"]) == 5
+
+    assert replay_dead_letter(path) == (5, 0)
+    assert not path.exists()
+    assert _count_events(db) == 5
+    # Replaying a batch the client also retried stores it once
+    queue._commit([(TelemetryEvent, _keyed_rows("b1"))])
+    assert _count_events(db) == 5
+
+
+def test_permanent_failure_is_not_retried(db, monkeypatch):
+    monkeypatch.setattr(ingest, "insert_events", _fail(1, ValueError("bad row")))
+    queue = _queue()
+    queue._commit([(TelemetryEvent, _keyed_rows("b1"))])
+
+    stats = queue.stats()
+    assert stats["retried_commits"] == 0
+    assert stats["dead_lettered_rows"] == 5
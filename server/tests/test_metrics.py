@@ -0,0 +1,43 @@
+import os
+
+import pytest
+
+from app import auth
+
+
+@pytest.fixture
+def metrics_token(monkeypatch):
+    monkeypatch.setattr(auth, "METRICS_TOKEN", "scrape-secret")
+    return "scrape-secret"
+
+
+def test_metrics_require_a_login(client):
+    response = client.get("/metrics", follow_redirects=False)
+    assert response.status_code == 303
+    assert response.headers["location"] == "/admin/login"
+
+
+def test_metrics_reject_a_wrong_token(client, metrics_token):
+    response = client.get(
+        "/metrics", headers={"Authorization": "Bearer wrong"}, follow_redirects=False
+    )
+    assert response.status_code == 303
+
+
+def test_metrics_accept_the_scrape_token(client, metrics_token):
+    response = client.get("/metrics", headers={"Authorization": f"Bearer {metrics_token}"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+
+
+def test_metrics_accept_an_admin_session(admin_client):
+    assert admin_client.get("/metrics").status_code == 200
+
+
+def test_metrics_are_labelled_by_worker_and_pool(admin_client):
+    admin_client.get("/")
+    text = admin_client.get("/metrics").text
+    worker = f'worker="{os.getpid()}"'
+    assert f'healthdesk_http_requests_total{{{worker},method="GET",route="/",status="200"}}' in text
+    assert f'healthdesk_db_pool_size{{{worker},pool="sync"}}' in text
+    assert f'healthdesk_db_pool_size{{{worker},pool="async"}}' in text
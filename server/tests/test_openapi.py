@@ -0,0 +1,13 @@
+import json
+
+from app.main import app
+
+
+def test_batch_request_schema_has_no_dangling_refs():
+    document = app.openapi()
+    content = document["paths"]["/api/telemetry/batch"]["post"]["requestBody"]["content"]
+    schema = content["application/json"]["schema"]
+    assert schema["properties"]["events"]["items"]["title"] == "BatchEventIn"
+    refs = [part.split('"')[0] for part in json.dumps(document).split('"$ref": "')[1:]]
+    components = document["components"]["schemas"]
+    assert all(ref.removeprefix("#/components/schemas/") in components for ref in refs)
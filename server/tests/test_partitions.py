@@ -0,0 +1,138 @@
+import sqlite3
+import threading
+from contextlib import closing
+from datetime import datetime
+
+from conftest import event_row
+from sqlalchemy import func, inspect, select
+
+from app import partitions
+from app.partitions import ensure_partition, events_between, insert_events, list_partitions
+
+JAN = datetime(2026, 1, 15, 12, 0)
+FEB = datetime(2026, 2, 10, 8, 30)
+MAR = datetime(2026, 3, 1, 0, 0)
+
+
+def _insert(engine, rows):
+    with engine.begin() as conn:
+        insert_events(conn, rows)
+
+
+def test_ensure_partition_is_idempotent(db):
+    with db.begin() as conn:
+        ensure_partition(conn, "telemetry_events_2026_01")
+    partitions.clear_caches()
+    with db.begin() as conn:
+        ensure_partition(conn, "telemetry_events_2026_01")
+        ensure_partition(conn, "telemetry_events_2026_02")
+        assert list_partitions(conn) == ["telemetry_events_2026_01", "telemetry_events_2026_02"]
+
+
+def test_insert_events_routes_rows_to_monthly_partitions(db):
+    _insert(db, [event_row("a", "app_start", JAN), event_row("b", "app_start", FEB)])
+    with db.connect() as conn:
+        assert list_partitions(conn) == ["telemetry_events_2026_01", "telemetry_events_2026_02"]
+        for name in list_partitions(conn):
+            count = conn.execute(select(func.count()).select_from(partitions.partition_table(name)))
+            assert count.scalar() == 1
+
+
+def test_events_between_decodes_rows(db):
+    row = event_row("client-1", "break_taken", JAN, payload='{"break_type": "micro"}')
+    _insert(db, [row])
+    with db.connect() as conn:
+        events = events_between(conn)
+        stored = conn.execute(select(events)).mappings().one()
+    assert stored["client_uuid"] == "client-1"
+    assert stored["event_type"] == "break_taken"
+    assert stored["payload"] == row["payload"]
+    assert stored["app_version"] == row["app_version"]
+    assert stored["os_version"] == row["os_version"]
+    assert stored["timestamp"] == JAN
+    assert stored["ip_hash"] == row["ip_hash"]
+    assert stored["partition"] == "telemetry_events_2026_01"
+
+
+def test_events_between_filters_by_range(db):
+    _insert(db, [
+        event_row("a", "app_start", JAN),
+        event_row("b", "app_start", FEB),
+        event_row("c", "app_start", MAR),
+    ])
+    with db.connect() as conn:
+        events = events_between(conn, datetime(2026, 2, 1), MAR)
+        assert conn.execute(select(events.c.client_uuid)).scalars().all() == ["b"]
+        events = events_between(conn, start=FEB)
+        assert sorted(conn.execute(select(events.c.client_uuid)).scalars()) == ["b", "c"]
+
+
+def test_apply_retention_drops_and_archives_expired_partitions(db, monkeypatch):
+    monkeypatch.setattr(partitions, "TELEMETRY_RETENTION_MONTHS", 2)
+    _insert(db, [
+        event_row("a", "app_start", JAN),
+        event_row("b", "app_start", FEB),
+        event_row("c", "app_start", MAR),
+    ])
+
+    assert partitions.apply_retention(now=MAR) == ["telemetry_events_2026_01"]
+
+    with db.connect() as conn:
+        assert list_partitions(conn) == ["telemetry_events_2026_02", "telemetry_events_2026_03"]
+        events = events_between(conn)
+        assert sorted(conn.execute(select(events.c.client_uuid)).scalars()) == ["b", "c"]
+        if conn.dialect.name == "postgresql":
+            assert inspect(conn).get_table_names(schema="archive") == ["telemetry_events_2026_01"]
+            archived = conn.exec_driver_sql("SELECT client_uuid FROM archive.telemetry_events_2026_01")
+            assert archived.scalars().all() == ["a"]
+    if db.dialect.name == "sqlite":
+        archive = sqlite3.connect(partitions.ARCHIVE_DIR / "telemetry_events_2026_01.db")
+        with closing(archive):
+            archived = archive.execute("SELECT client_uuid FROM telemetry_events_2026_01")
+            assert archived.fetchall() == [("a",)]
+
+    # A late event for the dropped month recreates its partition
+    _insert(db, [event_row("d", "app_start", JAN)])
+    with db.connect() as conn:
+        assert "telemetry_events_2026_01" in list_partitions(conn)
+
+
+def test_concurrent_retention_runs_drop_each_partition_once(db, monkeypatch):
+    monkeypatch.setattr(partitions, "TELEMETRY_RETENTION_MONTHS", 2)
+    _insert(db, [event_row("a", "app_start", JAN), event_row("b", "app_start", MAR)])
+    barrier = threading.Barrier(2)
+    expired = partitions.expired_partitions
+
+    def expired_together(conn, now=None):
+        # Both workers see the same expired partitions before either drops one
+        names = expired(conn, now)
+        barrier.wait()
+        return names
+
+    monkeypatch.setattr(partitions, "expired_partitions", expired_together)
+    dropped, errors = [], []
+
+    def worker():
+        try:
+            dropped.extend(partitions.apply_retention(now=MAR))
+        except Exception as exc:
+            errors.append(exc)
+            barrier.abort()
+
+    threads = [threading.Thread(target=worker) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    assert dropped == ["telemetry_events_2026_01"]
+    with db.connect() as conn:
+        assert list_partitions(conn) == ["telemetry_events_2026_03"]
+
+
+def test_timestamps_past_2038(db):
+    late = datetime(2040, 6, 1, 12, 0)
+    _insert(db, [event_row("a", "app_start", late)])
+    with db.connect() as conn:
+        events = events_between(conn, start=datetime(2040, 1, 1))
+        assert conn.execute(select(events.c.timestamp)).scalar_one() == late
@@ -0,0 +1,147 @@
+import json
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from conftest import event_row
+from sqlalchemy import select
+
+from app import rollups
+from app.dialect import bulk_insert
+from app.hll import HyperLogLog
+from app.models import AdImpression, DailySketch, Download, TelemetryEvent
+from app.partitions import insert_events
+from app.rollups import ROLLUP_MODELS, apply_rollups, backfill_if_empty, rebuild_rollups
+
+START = datetime(2026, 1, 30, 22, 0)
+
+
+def _batches(seed: int = 7, count: int = 6, size: int = 40):
+    """Random commits of events, downloads and ad events over a few days around a month end."""
+    rng = random.Random(seed)
+    event_types = ["app_start", "break_taken", "break_skipped", "water_logged", "audio_play"]
+    payloads = {
+        "break_taken": lambda: json.dumps({"break_type": rng.choice(["micro", "long"])}),
+        "break_skipped": lambda: json.dumps({"break_type": "micro"}),
+        "water_logged": lambda: json.dumps({"glasses": rng.randint(1, 3)}),
+        # Names past the 100-character value column get cut
+        "audio_play": lambda: json.dumps({"sound_type": "rain", "name": "x" * rng.randint(1, 150)}),
+    }
+    for _ in range(count):
+        events, downloads, ads = [], [], []
+        for _ in range(size):
+            ts = START + timedelta(minutes=rng.randint(0, 4 * 24 * 60))
+            event_type = rng.choice(event_types)
+            payload = payloads[event_type]() if event_type in payloads else None
+            events.append(event_row(f"client-{rng.randint(1, 30)}", event_type, ts, payload))
+            downloads.append({
+                "platform": rng.choice(["windows", "macos", "linux"]),
+                "source": None, "language": "pl", "ip_hash": "cd" * 32, "timestamp": ts,
+            })
+            ads.append({
+                "ad_id": 1, "event_type": rng.choice(["impression", "click"]),
+                "client_uuid": "client-1", "ip_hash": "ef" * 32, "timestamp": ts,
+            })
+        yield [(TelemetryEvent, events), (Download, downloads), (AdImpression, ads)]
+
+
+def _write(conn, model, rows):
+    if model is TelemetryEvent:
+        insert_events(conn, rows)
+    else:
+        bulk_insert(conn, model.__table__, rows)
+
+
+def _rollup_contents(conn) -> dict:
+    return {
+        model.__tablename__: sorted(tuple(row) for row in conn.execute(select(model.__table__)))
+        for model in ROLLUP_MODELS
+    }
+
+
+def test_incremental_rollups_match_rebuild(db):
+    for batch in _batches():
+        with db.begin() as conn:
+            for model, rows in batch:
+                _write(conn, model, rows)
+                apply_rollups(conn, model, rows)
+    with db.begin() as conn:
+        incremental = _rollup_contents(conn)
+        rebuild_rollups(conn)
+        rebuilt = _rollup_contents(conn)
+    assert all(incremental.values())
+    assert incremental == rebuilt
+
+
+def test_backfill_builds_rollups_for_raw_data(db):
+    with db.begin() as conn:
+        for batch in _batches(count=2):
+            for model, rows in batch:
+                _write(conn, model, rows)
+        backfill_if_empty(conn)
+        backfilled = _rollup_contents(conn)
+        rebuild_rollups(conn)
+        assert backfilled == _rollup_contents(conn)
+
+
+def test_backfill_runs_once(db, monkeypatch):
+    with db.begin() as conn:
+        insert_events(conn, [event_row("client-1", "app_start", START)])
+        backfill_if_empty(conn)
+
+    def fail(conn):
+        raise AssertionError("raw events rescanned")
+
+    # No payload events, so daily_payload_counts stays empty
+    monkeypatch.setattr(rollups, "rebuild_payload_counts", fail)
+    monkeypatch.setattr(rollups, "rebuild_rollups", fail)
+    with db.begin() as conn:
+        backfill_if_empty(conn)
+
+
+def test_concurrent_sketch_writers_keep_all_clients(db, monkeypatch):
+    if db.dialect.name != "postgresql":
+        pytest.skip("SQLite serializes writers with its database lock")
+    write_sketches = rollups._write_sketches
+
+    def slow_write(conn, sketches):
+        # Widen the window between reading and writing a sketch
+        time.sleep(0.02)
+        write_sketches(conn, sketches)
+
+    monkeypatch.setattr(rollups, "_write_sketches", slow_write)
+    barrier = threading.Barrier(2)
+    errors = []
+    clients = []
+
+    def writer(worker: int):
+        try:
+            for batch in range(10):
+                # Different event types, so only the "all" sketch is shared
+                event_type = ("app_start", "app_stop")[worker]
+                rows = [event_row(f"w{worker}-{batch}-{i}", event_type, START) for i in range(10)]
+                clients.extend(row["client_uuid"] for row in rows)
+                # Both group commits read the same stored sketch
+                barrier.wait()
+                with db.begin() as conn:
+                    apply_rollups(conn, TelemetryEvent, rows)
+        except Exception as exc:
+            errors.append(exc)
+            barrier.abort()
+
+    threads = [threading.Thread(target=writer, args=(worker,)) for worker in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+
+    expected = HyperLogLog()
+    expected.update(clients)
+    with db.connect() as conn:
+        stored = conn.execute(
+            select(DailySketch.registers).where(DailySketch.dimension == "all")
+        ).scalar_one()
+    assert bytes(stored) == expected.to_bytes()
@@ -0,0 +1,67 @@
+from datetime import datetime
+
+import pytest
+from conftest import add_ad, event_row
+
+from app.partitions import insert_events
+from app.slowlog import slow_queries
+
+
+@pytest.fixture
+def log_everything(monkeypatch):
+    """Every statement counts as slow, starting from an empty log."""
+    monkeypatch.setattr(slow_queries, "threshold", 0)
+    slow_queries.clear()
+    yield slow_queries
+    slow_queries.clear()
+
+
+def _entries(route: str) -> list:
+    return [entry for entry in slow_queries.entries() if entry.route == route]
+
+
+def test_slow_select_is_captured_with_its_plan(admin_client, app_db, log_everything):
+    with app_db.begin() as conn:
+        insert_events(
+            conn, [event_row(f"client-{i}", "app_start", datetime(2026, 3, 14, 9, i)) for i in range(3)]
+        )
+    response = admin_client.get(
+        "/admin/telemetry/events", params={"start": "2026-03-14", "event_type": "app_start"}
+    )
+    assert len(response.json()) == 3
+
+    (entry,) = [
+        e for e in _entries("/admin/telemetry/events") if "telemetry_events_2026_03" in e.statement
+    ]
+    assert entry.rows == 3
+    assert entry.source.startswith("app/routers/admin.py:")
+    assert entry.source.endswith(" telemetry_events")
+    assert "app_start" in entry.parameters
+    assert any(line.strip().startswith(("SCAN", "SEARCH")) for line in entry.plan)
+
+
+def test_async_handlers_are_traced_to_their_source(client, app_db, log_everything):
+    add_ad(app_db)
+    assert client.get("/api/ads").status_code == 200
+    (entry,) = _entries("/api/ads")
+    assert entry.source.startswith("app/ad_cache.py:")
+    assert entry.rows == 1
+
+
+def test_statements_under_the_threshold_are_not_kept(client, app_db, monkeypatch):
+    monkeypatch.setattr(slow_queries, "threshold", 60.0)
+    slow_queries.clear()
+    add_ad(app_db)
+    client.get("/api/ads")
+    assert slow_queries.entries() == []
+
+
+def test_slow_query_page_lists_and_clears_entries(admin_client, app_db, log_everything):
+    add_ad(app_db)
+    admin_client.get("/api/ads")
+    page = admin_client.get("/admin/slow-queries")
+    assert page.status_code == 200
+    assert "/api/ads" in page.text
+
+    admin_client.post("/admin/slow-queries/clear", follow_redirects=False)
+    assert slow_queries.entries() == []
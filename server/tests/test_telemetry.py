@@ -0,0 +1,114 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import select
+
+from app import dedup
+from app.partitions import events_between
+from app.routers import telemetry
+
+URL = "/api/telemetry/batch"
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _batch(*events, **fields) -> dict:
+    return {
+        "client_id": "client-1", "app_version": "1.2.0", "platform": "linux",
+        "events": list(events), **fields,
+    }
+
+
+def _stored(engine) -> list:
+    with engine.connect() as conn:
+        events = events_between(conn)
+        return conn.execute(
+            select(events.c.event_type, events.c.timestamp).order_by(events.c.timestamp)
+        ).all()
+
+
+def _stored_time(engine) -> datetime:
+    (row,) = _stored(engine)
+    return row.timestamp.replace(tzinfo=timezone.utc)
+
+
+# ---------------------------------------------------------------------------
+# Retries
+# ---------------------------------------------------------------------------
+
+
+@pytest.mark.parametrize("batch_id", ["batch-1", None], ids=["batch-id", "content"])
+def test_retried_batch_is_stored_once(client, app_db, flush, batch_id):
+    # Without a batch id, events are recognized by content and client timestamp
+    at = _now().isoformat()
+    batch = _batch(
+        {"event_type": "app_start", "timestamp": at},
+        {"event_type": "break_taken", "timestamp": at, "data": {"type": "micro"}},
+        batch_id=batch_id,
+    )
+    first = client.post(URL, json=batch).json()
+    retry = client.post(URL, json=batch).json()
+    assert (first["count"], first["duplicates"]) == (2, 0)
+    assert (retry["count"], retry["duplicates"]) == (0, 2)
+    flush()
+    assert len(_stored(app_db)) == 2
+
+
+def test_retry_seen_by_another_worker_is_dropped_at_commit(client, app_db, flush, monkeypatch):
+    batch = _batch({"event_type": "app_start"}, {"event_type": "app_stop"}, batch_id="batch-1")
+    client.post(URL, json=batch)
+    flush()
+    # The retry lands on a worker whose in-memory filter never saw the batch
+    other_worker = dedup.RecentKeys(capacity=10_000, error_rate=0.001, window=3600)
+    monkeypatch.setattr(telemetry, "recent_events", other_worker)
+    assert client.post(URL, json=batch).json()["count"] == 2
+    flush()
+    assert len(_stored(app_db)) == 2
+
+
+def test_same_event_in_another_batch_is_kept(client, app_db, flush):
+    event = {"event_type": "app_start", "seq": 0}
+    client.post(URL, json=_batch(event, batch_id="batch-1"))
+    client.post(URL, json=_batch(event, batch_id="batch-2"))
+    flush()
+    assert len(_stored(app_db)) == 2
+
+
+# ---------------------------------------------------------------------------
+# Client clock
+# ---------------------------------------------------------------------------
+
+
+def test_event_times_are_corrected_by_the_client_clock_skew(client, app_db, flush):
+    # The client clock runs an hour behind; the event happened 10 minutes ago
+    client_now = _now() - timedelta(hours=1)
+    event_time = client_now - timedelta(minutes=10)
+    client.post(URL, json=_batch(
+        {"event_type": "app_start", "timestamp": event_time.isoformat()},
+        sent_at=client_now.isoformat(),
+    ))
+    flush()
+    stored = _stored_time(app_db)
+    assert abs(stored - (_now() - timedelta(minutes=10))) < timedelta(seconds=30)
+
+
+@pytest.mark.parametrize(
+    "offset, expected",
+    [
+        (timedelta(days=30), -telemetry.TELEMETRY_MAX_EVENT_AGE),
+        (timedelta(days=-2), timedelta(0)),
+    ],
+    ids=["too-old", "future"],
+)
+def test_event_times_are_clamped(client, app_db, flush, offset, expected):
+    client.post(URL, json=_batch({"event_type": "app_start", "timestamp": (_now() - offset).isoformat()}))
+    flush()
+    assert abs(_stored_time(app_db) - (_now() + expected)) < timedelta(seconds=30)
+
+
+def test_missing_or_invalid_times_use_the_server_clock(client, app_db, flush):
+    client.post(URL, json=_batch({"event_type": "app_start", "timestamp": "yesterday"}))
+    flush()
+    assert abs(_stored_time(app_db) - _now()) < timedelta(seconds=30)
@@ -5,6 +5,7 @@ use tokio::sync::mpsc;
 const API_HOST: &str = "https://api.healthdesk.site";
 const BATCH_SIZE: usize = 10;
 const FLUSH_INTERVAL_SEC: u64 = 30;
+const SEND_ATTEMPTS: u32 = 3;
 
 #[derive(Debug, Clone, Serialize)]
 pub struct TelemetryEvent {
@@ -89,13 +90,25 @@ async fn send_batch(
     }
 
     let url = format!("{}/api/telemetry/batch", API_HOST);
-    let body = serde_json::json!({
-        "client_id": client_uuid,
-        "app_version": env!("CARGO_PKG_VERSION"),
-        "platform": std::env::consts::OS,
-        "events": batch,
-    });
+    // Same batch_id on every attempt: the server drops events it already has
+    let batch_id = uuid::Uuid::new_v4().to_string();
 
-    let _ = client.post(&url).json(&body).send().await;
+    for attempt in 0..SEND_ATTEMPTS {
+        let body = serde_json::json!({
+            "client_id": client_uuid,
+            "batch_id": batch_id,
+            "sent_at": chrono::Local::now().to_rfc3339(),
+            "app_version": env!("CARGO_PKG_VERSION"),
+            "platform": std::env::consts::OS,
+            "events": batch,
+        });
+        match client.post(&url).json(&body).send().await {
+            Ok(resp) if !resp.status().is_server_error() => break,
+            _ if attempt + 1 < SEND_ATTEMPTS => {
+                tokio::time::sleep(std::time::Duration::from_secs(2u64 << attempt)).await;
+            }
+            _ => {}
+        }
+    }
     batch.clear();
 }